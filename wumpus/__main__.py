@@ -1,14 +1,407 @@
+import asyncio
 import getopt
+import json
 import sys
 from wumpus.src.WumpusWorld import WumpusWorld
+from wumpus.src.Evaluation import evaluate
+from wumpus.src.environment.Worlds import generate_worlds, write_worlds, WorldCorpus
+from wumpus.src.environment.Rendering import replay_frames
+from wumpus.src.Trajectories import TrajectoryReader
+from wumpus.src import Benchmarks
+from wumpus.src.Tournament import TournamentServer, run_client
+from wumpus.src import ExactEvaluation
+from wumpus.src.ExactEvaluation import ExactEvaluator
+from wumpus.src.agent.Agents import create_agent
+
+
+def main_generate(argv):
+    count = 10000
+    seed = 0
+    grid_width = 4
+    grid_height = 4
+    pit_prob = 0.2
+    allow_climb_without_gold = False
+    output = "worlds.bin"
+    opts, args = getopt.getopt(argv, "n:s:o:", ["count=", "seed=", "output=",
+                                                "width=", "height=", "pit-prob=",
+                                                "allow-climb-without-gold"])
+    for opt, arg in opts:
+        if opt in ("-n", "--count"):
+            count = int(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt == "--width":
+            grid_width = int(arg)
+        elif opt == "--height":
+            grid_height = int(arg)
+        elif opt == "--pit-prob":
+            pit_prob = float(arg)
+        elif opt == "--allow-climb-without-gold":
+            allow_climb_without_gold = True
+
+    write_worlds(output, generate_worlds(count, grid_width, grid_height, pit_prob,
+                                         allow_climb_without_gold, seed))
+    print("Wrote", count, "worlds to", output)
+
+
+async def serve(server: TournamentServer, unix_path, host, port,
+                duration, report_every):
+    if unix_path is not None:
+        listener = await server.start_unix(unix_path)
+    else:
+        listener = await server.start_tcp(host, port)
+    print("Serving on", ", ".join(str(s.getsockname()) for s in listener.sockets))
+    loop = asyncio.get_running_loop()
+    end = None if duration is None else loop.time() + duration
+    try:
+        while end is None or loop.time() < end:
+            wait = report_every if end is None else min(report_every, end - loop.time())
+            await asyncio.sleep(max(wait, 0))
+            print("Active sessions:", server.active_sessions, "| Steps:", server.total_steps)
+            print(server.leaderboard.show())
+    finally:
+        listener.close()
+
+
+def main_serve(argv):
+    episodes = 10
+    seed = 0
+    grid_width = 4
+    grid_height = 4
+    pit_prob = 0.2
+    allow_climb_without_gold = False
+    max_steps = 1000
+    step_timeout = 1.0
+    unix_path = None
+    host = "127.0.0.1"
+    port = 7878
+    duration = None
+    report_every = 10.0
+    opts, args = getopt.getopt(argv, "n:s:", ["episodes=", "seed=", "width=", "height=",
+                                              "pit-prob=", "allow-climb-without-gold",
+                                              "max-steps=", "timeout=", "unix=", "host=",
+                                              "port=", "duration=", "report-every="])
+    for opt, arg in opts:
+        if opt in ("-n", "--episodes"):
+            episodes = int(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt == "--width":
+            grid_width = int(arg)
+        elif opt == "--height":
+            grid_height = int(arg)
+        elif opt == "--pit-prob":
+            pit_prob = float(arg)
+        elif opt == "--allow-climb-without-gold":
+            allow_climb_without_gold = True
+        elif opt == "--max-steps":
+            max_steps = int(arg)
+        elif opt == "--timeout":
+            step_timeout = float(arg)
+        elif opt == "--unix":
+            unix_path = arg
+        elif opt == "--host":
+            host = arg
+        elif opt == "--port":
+            port = int(arg)
+        elif opt == "--duration":
+            duration = float(arg)
+        elif opt == "--report-every":
+            report_every = float(arg)
+
+    server = TournamentServer(episodes, grid_width, grid_height, pit_prob,
+                              allow_climb_without_gold, seed, max_steps, step_timeout)
+    try:
+        asyncio.run(serve(server, unix_path, host, port, duration, report_every))
+    except KeyboardInterrupt:
+        pass
+    print(server.leaderboard.show())
+
+
+def main_play(argv):
+    agent_name = "knowledge"
+    name = None
+    sessions = 1
+    unix_path = None
+    host = "127.0.0.1"
+    port = 7878
+    opts, args = getopt.getopt(argv, "a:c:", ["agent=", "name=", "sessions=", "unix=",
+                                              "host=", "port="])
+    for opt, arg in opts:
+        if opt in ("-a", "--agent"):
+            agent_name = arg
+        elif opt == "--name":
+            name = arg
+        elif opt in ("-c", "--sessions"):
+            sessions = int(arg)
+        elif opt == "--unix":
+            unix_path = arg
+        elif opt == "--host":
+            host = arg
+        elif opt == "--port":
+            port = int(arg)
+
+    def agent_factory(grid_width, grid_height, pit_prob, allow_climb_without_gold):
+        return create_agent(agent_name, grid_width, grid_height, pit_prob,
+                            allow_climb_without_gold)
+
+    async def play_all():
+        return await asyncio.gather(*[run_client(agent_factory, name or agent_name, unix_path,
+                                                 host, port) for _ in range(sessions)],
+                                    return_exceptions=True)
+    results = asyncio.run(play_all())
+    failed = [r for r in results if isinstance(r, BaseException)]
+    rewards = [r for session in results if not isinstance(session, BaseException)
+               for r in session]
+    if failed:
+        print("Sessions failed:", len(failed), "| First error:", repr(failed[0]))
+    print("Episodes:", len(rewards), "| Mean reward:",
+          format(sum(rewards) / len(rewards) if rewards else 0.0, ".3f"))
+
+
+def main_exact(argv):
+    agent_names = []
+    grid_width = 4
+    grid_height = 4
+    pit_prob = 0.2
+    allow_climb_without_gold = False
+    horizon = 50
+    optimal = False
+    bounded = False
+    opts, args = getopt.getopt(argv, "a:", ["agent=", "width=", "height=", "pit-prob=",
+                                            "allow-climb-without-gold", "horizon=",
+                                            "optimal", "bounded"])
+    for opt, arg in opts:
+        if opt in ("-a", "--agent"):
+            agent_names.append(arg)
+        elif opt == "--width":
+            grid_width = int(arg)
+        elif opt == "--height":
+            grid_height = int(arg)
+        elif opt == "--pit-prob":
+            pit_prob = float(arg)
+        elif opt == "--allow-climb-without-gold":
+            allow_climb_without_gold = True
+        elif opt == "--horizon":
+            horizon = int(arg)
+        elif opt == "--optimal":
+            optimal = True
+        elif opt == "--bounded":
+            bounded = True
+
+    def usage_error(message):
+        print("exact: " + message, file=sys.stderr)
+        sys.exit(2)
+
+    if not agent_names and not optimal:
+        usage_error("nothing to compute, give agents with -a and/or --optimal")
+    for agent_name in agent_names:
+        try:
+            agent = create_agent(agent_name, grid_width, grid_height, pit_prob,
+                                 allow_climb_without_gold)
+            ExactEvaluator.check_agent(agent)
+        except ValueError as e:
+            usage_error(str(e))
+        if hasattr(agent, "action_distribution") \
+                and horizon > ExactEvaluation.MAX_DISTRIBUTION_HORIZON:
+            usage_error(agent_name + " can only be evaluated up to --horizon "
+                        + str(ExactEvaluation.MAX_DISTRIBUTION_HORIZON))
+    if optimal and grid_width * grid_height > ExactEvaluation.MAX_EPISODE_SEARCH_CELLS:
+        if not bounded:
+            usage_error("--optimal over whole episodes is only practical up to "
+                        + str(ExactEvaluation.MAX_EPISODE_SEARCH_CELLS)
+                        + " cells, add --bounded for a bounded search")
+        if horizon > ExactEvaluation.MAX_BOUNDED_SEARCH_HORIZON:
+            usage_error("--optimal --bounded on grids over "
+                        + str(ExactEvaluation.MAX_EPISODE_SEARCH_CELLS)
+                        + " cells is only practical up to --horizon "
+                        + str(ExactEvaluation.MAX_BOUNDED_SEARCH_HORIZON))
+
+    for agent_name in agent_names:
+        evaluator = ExactEvaluator(grid_width, grid_height, pit_prob,
+                                   allow_climb_without_gold, horizon)
+        value = evaluator.agent_value(
+            lambda: create_agent(agent_name, grid_width, grid_height, pit_prob,
+                                 allow_climb_without_gold))
+        print("Agent:", agent_name, "| Expected reward:", format(value, ".4f"),
+              "| Nodes:", evaluator.nodes)
+    if optimal:
+        evaluator = ExactEvaluator(grid_width, grid_height, pit_prob,
+                                   allow_climb_without_gold, horizon)
+        value = evaluator.optimal_value(bounded)
+        print("Optimal:", format(value, ".4f"), "| Nodes:", evaluator.nodes)
+
+
+def main_benchmark(argv):
+    sizes = Benchmarks.DEFAULT_SIZES
+    pit_probs = Benchmarks.DEFAULT_PIT_PROBS
+    min_time = 0.1
+    repeat = 3
+    output = None
+    baseline = None
+    tolerance = 0.2
+    opts, args = getopt.getopt(argv, "o:b:", ["output=", "baseline=", "sizes=", "pit-probs=",
+                                              "min-time=", "repeat=", "tolerance="])
+    for opt, arg in opts:
+        if opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-b", "--baseline"):
+            baseline = arg
+        elif opt == "--sizes":
+            sizes = [int(size) for size in arg.split(",")]
+        elif opt == "--pit-probs":
+            pit_probs = [float(pit_prob) for pit_prob in arg.split(",")]
+        elif opt == "--min-time":
+            min_time = float(arg)
+        elif opt == "--repeat":
+            repeat = int(arg)
+        elif opt == "--tolerance":
+            tolerance = float(arg)
+
+    results = Benchmarks.run_benchmarks(sizes, pit_probs, min_time, repeat, log=print)
+    if output is not None:
+        Benchmarks.save(results, output)
+    if baseline is not None:
+        regressions = Benchmarks.compare(results, Benchmarks.load(baseline), tolerance)
+        for (key, ratio) in regressions:
+            print("Regression:", key, format(ratio, ".2f") + "x baseline")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", baseline)
+
+
+def main_replay(argv):
+    frame_skip = 1
+    corpus_path = "worlds.bin"
+    episode = None
+    opts, args = getopt.getopt(argv, "k:e:", ["frame-skip=", "episode=", "corpus="])
+    for opt, arg in opts:
+        if opt in ("-k", "--frame-skip"):
+            frame_skip = int(arg)
+        elif opt in ("-e", "--episode"):
+            episode = int(arg)
+        elif opt == "--corpus":
+            corpus_path = arg
+
+    # episodes recorded while evaluating a corpus play its worlds in order
+    with WorldCorpus(corpus_path) as corpus:
+        for path in args:
+            for (world_id, actions, percepts) in TrajectoryReader(path).episodes():
+                if episode is not None and world_id != episode:
+                    continue
+                print("Episode", world_id)
+                for board in replay_frames(corpus[world_id % len(corpus)], actions, frame_skip):
+                    print(board)
+
+
+def main_evaluate(argv):
+    episodes = 10000
+    workers = None
+    seed = 0
+    grid_width = 4
+    grid_height = 4
+    pit_prob = 0.2
+    allow_climb_without_gold = False
+    max_steps = None
+    corpus_path = None
+    record_path = None
+    profile = False
+    metrics_output = None
+    lazy = False
+    wumpus_count = 1
+    gold_count = 1
+    opts, args = getopt.getopt(argv, "n:j:s:p", ["episodes=", "workers=", "seed=",
+                                                 "width=", "height=", "pit-prob=",
+                                                 "allow-climb-without-gold", "max-steps=",
+                                                 "corpus=", "record=", "profile",
+                                                 "metrics-output=", "lazy", "wumpuses=",
+                                                 "golds="])
+    for opt, arg in opts:
+        if opt in ("-n", "--episodes"):
+            episodes = int(arg)
+        elif opt in ("-j", "--workers"):
+            workers = int(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt == "--width":
+            grid_width = int(arg)
+        elif opt == "--height":
+            grid_height = int(arg)
+        elif opt == "--pit-prob":
+            pit_prob = float(arg)
+        elif opt == "--allow-climb-without-gold":
+            allow_climb_without_gold = True
+        elif opt == "--max-steps":
+            max_steps = int(arg)
+        elif opt == "--corpus":
+            corpus_path = arg
+        elif opt == "--record":
+            record_path = arg
+        elif opt in ("-p", "--profile"):
+            profile = True
+        elif opt == "--metrics-output":
+            profile = True
+            metrics_output = arg
+        elif opt == "--lazy":
+            lazy = True
+        elif opt == "--wumpuses":
+            wumpus_count = int(arg)
+        elif opt == "--golds":
+            gold_count = int(arg)
+
+    summary = evaluate(episodes, grid_width, grid_height, pit_prob, allow_climb_without_gold,
+                       seed, workers, max_steps=max_steps, corpus_path=corpus_path,
+                       record_path=record_path, profile=profile, lazy=lazy,
+                       wumpus_count=wumpus_count, gold_count=gold_count)
+    print(summary.show())
+    if summary.metrics is not None:
+        print(summary.metrics.show())
+        if metrics_output is not None:
+            with open(metrics_output, "w") as f:
+                json.dump(summary.metrics.summary(), f, indent=2)
+
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "evaluate":
+        main_evaluate(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "generate":
+        main_generate(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        main_replay(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        main_benchmark(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        main_serve(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "play":
+        main_play(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "exact":
+        main_exact(sys.argv[2:])
+        sys.exit(0)
+
     visualize = False
-    opts, args = getopt.getopt(sys.argv[1:],"v",["visualize="])
+    record = None
+    profile = False
+    opts, args = getopt.getopt(sys.argv[1:],"vr:p",["visualize=", "record=", "profile"])
     for opt, arg in opts:
         print(opt)
         if opt in ("-v", "--visualize"):
             visualize = True
-            
+        elif opt in ("-r", "--record"):
+            record = arg
+        elif opt in ("-p", "--profile"):
+            profile = True
+
+    if visualize and record is not None:
+        print("-v and -r cannot be combined: an episode is either printed or recorded",
+              file=sys.stderr)
+        sys.exit(2)
     w = WumpusWorld(4, 4, 0.2, False)
-    w.main(visualize)    
\ No newline at end of file
+    w.main(visualize, record, profile)
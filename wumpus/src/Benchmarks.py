@@ -0,0 +1,126 @@
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.Misc import Action, Coords
+from wumpus.src.agent.Agents import NaiveAgent
+from wumpus.src.WumpusWorld import run_episode
+
+DEFAULT_SIZES = (4, 16, 64, 256)
+DEFAULT_PIT_PROBS = (0.0, 0.2)
+# cap on NaiveAgent episodes, which can wander for a long time on large empty grids
+EPISODE_MAX_STEPS = 1000
+
+
+def measure(function: Callable[[], object], min_time: float = 0.1, repeat: int = 3) -> float:
+    """Time `function`, calling it in batches large enough to take at least
+    `min_time` seconds, and return the best of `repeat` batches
+
+    Returns:
+        float: nanoseconds per call
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        # aim for min_time straight away, growing by at most 100 times per try
+        wanted = int(number * min_time * 1.2 / max(elapsed, 1e-9))
+        number = min(number * 100, max(number + 1, wanted))
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, timer.timeit(number))
+    return best / number * 1e9
+
+
+def cases(grid_width: int, grid_height: int,
+          pit_prob: float) -> List[Tuple[str, Callable[[], object]]]:
+    """The benchmarked operations for one grid size and pit probability, each with
+    its name, on a world drawn from a fixed seed
+    """
+    rng = random.Random(0)
+    env = Environment(grid_width, grid_height, pit_prob, False, rng)
+    center = Coords(grid_width // 2, grid_height // 2)
+    # probe from the middle of the grid, with the wumpus in the line of fire
+    env.agent = env.agent.replace(location=center)
+    env.wumpus_location = Coords(grid_width - 1, center.y)
+    result = [
+        ("construct", lambda: Environment(grid_width, grid_height, pit_prob, False, rng)),
+        ("adjacent_cells", lambda: env.adjacent_cells(center)),
+        ("is_breeze", env.is_breeze),
+        ("is_stench", env.is_stench),
+    ]
+    for action in Action:
+        result.append(("apply_action." + action.name,
+                       lambda action=action: env.apply_action(action)))
+    agent = NaiveAgent(random.Random(0))
+    worlds = random.Random(1)
+
+    def episode():
+        (world, percept) = Environment.initialize(grid_width, grid_height, pit_prob, False,
+                                                  worlds)
+        return run_episode(world, agent, percept, max_steps=EPISODE_MAX_STEPS, in_place=True)
+    result.append(("episode", episode))
+    return result
+
+
+def run_benchmarks(sizes: Iterable[int] = DEFAULT_SIZES,
+                   pit_probs: Iterable[float] = DEFAULT_PIT_PROBS,
+                   min_time: float = 0.1, repeat: int = 3,
+                   log: Optional[Callable[[str], None]] = None) -> Dict:
+    """Measure every case for every square grid size and pit probability
+
+    Args:
+        sizes (Iterable[int], optional): grid widths (and heights). Defaults to 4 up to 256.
+        pit_probs (Iterable[float], optional): Defaults to 0.0 and 0.2.
+        min_time (float, optional): seconds each timed batch runs for at least. Defaults to 0.1.
+        repeat (int, optional): batches per case, the best is kept. Defaults to 3.
+        log (Callable[[str], None], optional): called with a line per result. Defaults to None.
+
+    Returns:
+        Dict: "meta" describing the machine, and "results" mapping names like
+        "is_breeze/16x16/p0.2" to nanoseconds per call
+    """
+    results = {}
+    for size in sizes:
+        for pit_prob in pit_probs:
+            for (name, function) in cases(size, size, pit_prob):
+                key = name + "/" + str(size) + "x" + str(size) + "/p" + str(pit_prob)
+                results[key] = measure(function, min_time, repeat)
+                if log is not None:
+                    log(key.ljust(40) + format(results[key], "14.1f") + " ns")
+    return {
+        "meta": {"python": sys.version.split()[0], "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Tuple[str, float]]:
+    """Find the cases that got slower than the baseline by more than `tolerance`
+    (0.2 meaning 20%). Cases missing from either side are ignored.
+
+    Returns:
+        List[Tuple[str, float]]: the regressed cases with their time relative to the baseline
+    """
+    regressions = []
+    for (key, value) in results["results"].items():
+        before = baseline["results"].get(key)
+        if before and value / before > 1 + tolerance:
+            regressions.append((key, value / before))
+    return regressions
+
+
+def save(results: Dict, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,232 @@
+import math
+import multiprocessing
+import random
+import time
+from typing import List, Optional, Self, Tuple
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.LazyEnvironments import LazyEnvironment
+from wumpus.src.environment.MultiEnvironments import MultiEnvironment
+from wumpus.src.environment.Worlds import WorldCorpus
+from wumpus.src.agent.Agents import NaiveAgent
+from wumpus.src.WumpusWorld import Termination, run_episode
+from wumpus.src.Trajectories import TrajectoryWriter
+from wumpus.src.environment.Metrics import Metrics
+
+
+class EvaluationSummary():
+    """A class to hold statistics aggregated over many episodes. Summaries of
+    separate chunks of episodes can be combined with `merge`.
+    """
+    episodes: int = 0
+    mean_reward: float = 0.0
+    m2_reward: float = 0.0
+    successes: int = 0
+    deaths: int = 0
+    total_steps: int = 0
+    elapsed: float = 0.0
+    metrics: Optional[Metrics] = None
+
+    def __init__(self) -> None:
+        self.episodes = 0
+        self.mean_reward = 0.0
+        self.m2_reward = 0.0
+        self.successes = 0
+        self.deaths = 0
+        self.total_steps = 0
+        self.elapsed = 0.0
+        self.metrics = None
+
+    def add(self, total_reward: float, steps: int, termination: Termination):
+        self.episodes += 1
+        delta = total_reward - self.mean_reward
+        self.mean_reward += delta / self.episodes
+        self.m2_reward += delta * (total_reward - self.mean_reward)
+        self.total_steps += steps
+        if termination == Termination.Escaped:
+            self.successes += 1
+        elif termination == Termination.Died:
+            self.deaths += 1
+
+    def merge(self, other: Self) -> Self:
+        """Combine the statistics of `other` into this summary (Chan et al. parallel variance)
+        """
+        n = self.episodes + other.episodes
+        if n == 0:
+            return self
+        delta = other.mean_reward - self.mean_reward
+        self.m2_reward += other.m2_reward + delta * delta * self.episodes * other.episodes / n
+        self.mean_reward += delta * other.episodes / n
+        self.episodes = n
+        self.successes += other.successes
+        self.deaths += other.deaths
+        self.total_steps += other.total_steps
+        if other.metrics is not None:
+            self.metrics = (self.metrics or Metrics()).merge(other.metrics)
+        return self
+
+    @property
+    def reward_variance(self) -> float:
+        return self.m2_reward / (self.episodes - 1) if self.episodes > 1 else 0.0
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.episodes if self.episodes else 0.0
+
+    @property
+    def death_rate(self) -> float:
+        return self.deaths / self.episodes if self.episodes else 0.0
+
+    @property
+    def mean_steps(self) -> float:
+        return self.total_steps / self.episodes if self.episodes else 0.0
+
+    @property
+    def episodes_per_second(self) -> float:
+        return self.episodes / self.elapsed if self.elapsed > 0 else math.inf
+
+    def show(self) -> str:
+        return "| Episodes: " + str(self.episodes) \
+            + "| Mean reward: " + format(self.mean_reward, ".3f") \
+            + "| Reward variance: " + format(self.reward_variance, ".3f") \
+            + "| Success rate: " + format(self.success_rate, ".4f") \
+            + "| Death rate: " + format(self.death_rate, ".4f") \
+            + "| Steps/episode: " + format(self.mean_steps, ".2f") \
+            + "| Episodes/sec: " + format(self.episodes_per_second, ".1f")
+
+
+# (seed, episodes, grid_width, grid_height, pit_prob, allow_climb_without_gold, max_steps,
+#  corpus_path, first_world, record_path, profile, lazy, wumpus_count, gold_count)
+ChunkSpec = Tuple[int, int, int, int, float, bool, Optional[int], Optional[str], int,
+                  Optional[str], bool, bool, int, int]
+
+
+def run_chunk(spec: ChunkSpec) -> EvaluationSummary:
+    """Run a chunk of episodes with its own RNG, seeded from `spec`. This is the
+    unit of work handed to each worker process. Worlds are either generated from
+    the RNG or, when a corpus is given, taken from it starting at `first_world`.
+    The corpus is only mapped while the chunk runs, so a file rewritten or
+    deleted afterwards is never read stale nor kept open. With a `record_path`,
+    the chunk's episodes are streamed into the trajectory file
+    `<record_path>.<first_world>`, each under its episode number. With
+    `profile`, the summary carries the chunk's `Metrics`. With `lazy`, generated
+    worlds are `LazyEnvironment`s seeded from the RNG, and with more than one
+    wumpus or gold piece they are `MultiEnvironment`s.
+    """
+    (seed, episodes, grid_width, grid_height, pit_prob, allow_climb_without_gold, max_steps,
+     corpus_path, first_world, record_path, profile, lazy, wumpus_count, gold_count) = spec
+    rng = random.Random(seed)
+    agent = NaiveAgent(rng)
+    corpus = WorldCorpus(corpus_path) if corpus_path is not None else None
+    writer = TrajectoryWriter(record_path + "." + str(first_world)) \
+        if record_path is not None else None
+    metrics = Metrics() if profile else None
+    summary = EvaluationSummary()
+    summary.metrics = metrics
+    try:
+        for i in range(episodes):
+            start = time.perf_counter_ns()
+            if corpus is None and lazy:
+                env = LazyEnvironment(grid_width, grid_height, pit_prob,
+                                      allow_climb_without_gold, rng.getrandbits(64))
+                percept = env.initial_percept()
+            elif corpus is None and (wumpus_count != 1 or gold_count != 1):
+                env = MultiEnvironment(grid_width, grid_height, pit_prob,
+                                       allow_climb_without_gold, wumpus_count, gold_count, rng)
+                percept = env.initial_percept()
+            elif corpus is None:
+                (env, percept) = Environment.initialize(grid_width, grid_height, pit_prob,
+                                                        allow_climb_without_gold, rng)
+            else:
+                env = corpus[(first_world + i) % len(corpus)]
+                percept = env.initial_percept()
+            if metrics is not None:
+                metrics.record("generate", time.perf_counter_ns() - start)
+            if writer is None:
+                result = run_episode(env, agent, percept, max_steps=max_steps, in_place=True,
+                                     metrics=metrics)
+            else:
+                writer.start_episode(first_world + i, percept)
+                result = run_episode(env, agent, percept,
+                                     on_step=writer.recorder(first_world + i),
+                                     max_steps=max_steps, in_place=True, metrics=metrics)
+            summary.add(result.total_reward, result.steps, result.termination)
+    finally:
+        if writer is not None:
+            writer.close()
+        if corpus is not None:
+            corpus.close()
+    return summary
+
+
+def chunk_specs(episodes: int, seed: int, chunk_size: int, grid_width: int, grid_height: int,
+                pit_prob: float, allow_climb_without_gold: bool,
+                max_steps: Optional[int], corpus_path: Optional[str] = None,
+                record_path: Optional[str] = None, profile: bool = False,
+                lazy: bool = False, wumpus_count: int = 1,
+                gold_count: int = 1) -> List[ChunkSpec]:
+    """Split `episodes` into chunks, each with a seed drawn from the master `seed`.
+    The split does not depend on the number of workers, so a given master seed
+    always gives the same results.
+    """
+    seeds = random.Random(seed)
+    specs = []
+    for start in range(0, episodes, chunk_size):
+        specs.append((seeds.getrandbits(64), min(chunk_size, episodes - start),
+                      grid_width, grid_height, pit_prob, allow_climb_without_gold, max_steps,
+                      corpus_path, start, record_path, profile, lazy, wumpus_count,
+                      gold_count))
+    return specs
+
+
+def evaluate(episodes: int, grid_width: int = 4, grid_height: int = 4,
+             pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+             seed: int = 0, workers: Optional[int] = None, chunk_size: int = 1000,
+             max_steps: Optional[int] = None,
+             corpus_path: Optional[str] = None,
+             record_path: Optional[str] = None, profile: bool = False,
+             lazy: bool = False, wumpus_count: int = 1,
+             gold_count: int = 1) -> EvaluationSummary:
+    """Run many `NaiveAgent` episodes over a pool of worker processes
+
+    Args:
+        episodes (int): number of episodes to run
+        grid_width (int, optional): Defaults to 4.
+        grid_height (int, optional): Defaults to 4.
+        pit_prob (float, optional): Defaults to 0.2.
+        allow_climb_without_gold (bool, optional): Defaults to False.
+        seed (int, optional): master seed the per-chunk seeds are drawn from. Defaults to 0.
+        workers (int, optional): number of processes, 1 runs in this process. Defaults to
+            None, meaning the number of CPUs.
+        chunk_size (int, optional): episodes per unit of work. Defaults to 1000.
+        max_steps (int, optional): cut episodes off after this many actions. Defaults to None.
+        corpus_path (str, optional): world file to play, in order, instead of generating
+            worlds. Each worker maps the file rather than loading it. Defaults to None.
+        record_path (str, optional): record every episode into trajectory files named
+            `<record_path>.<first episode of the chunk>`. Defaults to None.
+        profile (bool, optional): collect counters and timings into the summary's
+            `metrics`. Defaults to False.
+        lazy (bool, optional): generate `LazyEnvironment`s, whose pits are only drawn
+            near the agent, for very large grids. Defaults to False.
+        wumpus_count (int, optional): wumpuses in each generated world. Defaults to 1.
+        gold_count (int, optional): gold pieces in each generated world. Defaults to 1.
+
+    Returns:
+        EvaluationSummary: the statistics over all episodes
+    """
+    if lazy and (wumpus_count != 1 or gold_count != 1):
+        raise ValueError("lazy worlds have one wumpus and one gold piece")
+    specs = chunk_specs(episodes, seed, chunk_size, grid_width, grid_height,
+                        pit_prob, allow_climb_without_gold, max_steps, corpus_path, record_path,
+                        profile, lazy, wumpus_count, gold_count)
+    start = time.perf_counter()
+    if workers == 1 or len(specs) <= 1:
+        results = [run_chunk(spec) for spec in specs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(run_chunk, specs)
+    # merge in chunk order so floating point results do not depend on scheduling
+    summary = EvaluationSummary()
+    for result in results:
+        summary.merge(result)
+    summary.elapsed = time.perf_counter() - start
+    return summary
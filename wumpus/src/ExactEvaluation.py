@@ -0,0 +1,445 @@
+import copy
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+from wumpus.src.environment.Misc import Action, Percept, OrientationState
+from wumpus.src.environment.Misc import TURN_LEFT, TURN_RIGHT
+from wumpus.src.agent.Agents import Agent
+from wumpus.src.agent.Planning import moves
+from wumpus.src.agent.Probability import PitProbabilities
+
+# The dynamic state, the same in every world sharing a percept history:
+# (cell * 4 + heading, has_gold, has_arrow, wumpus_alive)
+State = Tuple[int, bool, bool, bool]
+
+# The worlds sharing a percept history, as independent parts: (bitmap of cells known
+# to be pit free, bitmap of cells where a breeze was sensed, bitmap of the wumpus'
+# possible cells, bitmap of the gold's possible cells or 0 once it is held), and the
+# bitmap of cells visited
+Belief = Tuple[int, int, int, int, int]
+
+# (probability, reward, terminated, next state, next belief, percept)
+Outcome = Tuple[float, int, bool, State, Belief, Optional[Percept]]
+
+# Practical limits, beyond which a search takes minutes to hours: the grid cells
+# up to which `optimal_value` searches whole episodes, the horizon of its bounded
+# search on larger grids, and the horizon for agents drawing from an
+# `action_distribution()`
+MAX_EPISODE_SEARCH_CELLS = 12
+MAX_BOUNDED_SEARCH_HORIZON = 12
+MAX_DISTRIBUTION_HORIZON = 16
+
+
+class ExactEvaluator():
+    """Exact expected rewards over every world `Environment.__init__` can generate
+    on a small grid, each weighted by its probability: a pit in each cell but the
+    origin with probability `pit_prob`, the wumpus and the gold uniformly in the
+    cells with x >= 1 and y >= 1. Episodes are cut off after `horizon` actions.
+
+    Worlds are never enumerated one by one. All the worlds giving the same percept
+    history are handled together as one `Belief`, and histories ending in the same
+    state and belief share their subtree, outcomes and values being memoized on
+    them. The wumpus, the gold and the pits are independent and each percept
+    depends on one of them, so each is conditioned separately: the wumpus and the
+    gold are uniform over their remaining cells, and the pits are summed over
+    exactly as by `PitProbabilities`, given only which cells are known to be pit
+    free and where breezes were sensed.
+    """
+    grid_width: int
+    grid_height: int
+    pit_prob: float
+    allow_climb_without_gold: bool
+    horizon: int
+    nodes: int = 0
+
+    def __init__(self, grid_width: int = 4, grid_height: int = 4, pit_prob: float = 0.2,
+                 allow_climb_without_gold: bool = False, horizon: int = 50) -> None:
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pit_prob = pit_prob
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.horizon = horizon
+        self.nodes = 0
+        (self._ahead, _) = moves(grid_width, grid_height)
+        cells = grid_width * grid_height
+        self._neighbors = []
+        for cell in range(cells):
+            mask = 0
+            for heading in range(4):
+                n = self._ahead[cell * 4 + heading]
+                if n >= 0:
+                    mask |= 1 << n
+            self._neighbors.append(mask)
+        self._line_of_fire = []
+        for position in range(cells * 4):
+            mask = 0
+            cell = self._ahead[position]
+            while cell >= 0:
+                mask |= 1 << cell
+                cell = self._ahead[cell * 4 + (position & 3)]
+            self._line_of_fire.append(mask)
+        self._probabilities = PitProbabilities(pit_prob)
+        self._weights: Dict[Tuple[int, ...], float] = {}
+        self._likelihoods: Dict[Tuple[int, int], float] = {}
+        self._outcomes: Dict[Tuple, List[Outcome]] = {}
+        self._values: Dict[Tuple, float] = {}
+        self._routes: Dict[Tuple[int, int], Dict[int, int]] = {}
+        self._merged: Dict[Tuple, List[Tuple[float, int, bool, State, Belief]]] = {}
+
+    def root(self, blind: bool = False) -> List[Tuple[float, State, Belief, Percept]]:
+        """The possible starts of an episode: the agent at the origin facing East,
+        split by the initial percept
+        """
+        placed = 0
+        for y in range(1, self.grid_height):
+            for x in range(1, self.grid_width):
+                placed |= 1 << (y * self.grid_width + x)
+        state = (int(OrientationState.East), False, True, True)
+        belief = (1, 0, placed, placed, 0)
+        return self._sense(state, belief, 0, blind=blind)
+
+    def _likelihood(self, no_pit: int, breezy: int) -> float:
+        """The prior probability that the cells of `no_pit` are pit free and that
+        every cell of `breezy` has a pit next to it
+        """
+        key = (no_pit, breezy)
+        likelihood = self._likelihoods.get(key)
+        if likelihood is not None:
+            return likelihood
+        constraints = set()
+        while breezy:
+            low = breezy & -breezy
+            breezy ^= low
+            constraints.add(self._neighbors[low.bit_length() - 1] & ~no_pit)
+        if 0 in constraints:
+            likelihood = 0.0
+        else:
+            # the origin is pit free in every world
+            likelihood = (1 - self.pit_prob) ** (no_pit & ~1).bit_count()
+            weights = self._weights
+            for component in self._probabilities.components(list(constraints)):
+                weight = weights.get(component)
+                if weight is None:
+                    weight = weights[component] = self._probabilities.weight(component)
+                likelihood *= weight
+        self._likelihoods[key] = likelihood
+        return likelihood
+
+    def _sense(self, state: State, belief: Belief, reward: int, bump: bool = False,
+               scream: bool = False,
+               blind: bool = False) -> List[Tuple[float, State, Belief, Percept]]:
+        """Split the worlds by the stench, breeze and glitter sensed in the agent's cell,
+        or if `blind` by the glitter alone
+        """
+        (position, has_gold, has_arrow, wumpus_alive) = state
+        cell = position >> 2
+        bit = 1 << cell
+        (no_pit, breezy, wumpus, gold, visited) = belief
+        around = self._neighbors[cell]
+        # no wumpus cells left once `_merged_outcomes` drops them: no stench to split on
+        stench = [] if wumpus and not blind else [(1.0, False, wumpus)]
+        close = wumpus & around
+        if close and not blind:
+            stench.append((close.bit_count() / wumpus.bit_count(), True, close))
+        if wumpus & ~around and not blind:
+            stench.append(((wumpus & ~around).bit_count() / wumpus.bit_count(), False,
+                           wumpus & ~around))
+        unknown = around & ~no_pit
+        if blind:
+            breeze = [(1.0, False, no_pit, breezy)]
+        elif breezy & bit:
+            breeze = [(1.0, True, no_pit, breezy)]
+        elif not unknown:
+            breeze = [(1.0, False, no_pit, breezy)]
+        else:
+            # no breeze: every neighbour is pit free
+            p_clear = self._likelihood(no_pit | unknown, breezy) \
+                / self._likelihood(no_pit, breezy)
+            breeze = []
+            if p_clear > 0:
+                breeze.append((p_clear, False, no_pit | unknown, breezy))
+            if p_clear < 1:
+                breeze.append((1 - p_clear, True, no_pit, breezy | bit))
+        if has_gold:
+            glitter = [(1.0, True, 0)]
+        else:
+            glitter = []
+            if gold & bit:
+                glitter.append((1 / gold.bit_count(), True, 0))
+            if gold & ~bit:
+                glitter.append(((gold & ~bit).bit_count() / gold.bit_count(), False, gold & ~bit))
+        result = []
+        for (p_stench, is_stench, next_wumpus) in stench:
+            for (p_breeze, is_breeze, next_no_pit, next_breezy) in breeze:
+                for (p_glitter, is_glitter, next_gold) in glitter:
+                    # walking onto the gold picks it up
+                    next_state = (position, has_gold or is_glitter, has_arrow, wumpus_alive)
+                    result.append((p_stench * p_breeze * p_glitter, next_state,
+                                   (next_no_pit, next_breezy, next_wumpus, next_gold,
+                                    visited | bit),
+                                   Percept(is_stench, is_breeze, is_glitter, bump, scream,
+                                           False, reward)))
+        return result
+
+    def outcomes(self, state: State, belief: Belief, action: Action,
+                 blind: bool = False) -> List[Outcome]:
+        """Every outcome of taking `action` in the worlds of `belief`, with its
+        probability given the belief. Terminal outcomes carry no next state.
+
+        If `blind`, the worlds are only split by what changes the state (dying, the
+        gold picked up, the wumpus shot) and the percepts only report the glitter,
+        bump and scream: the belief then ignores stenches and breezes.
+        """
+        key = (state, belief, action, blind)
+        cached = self._outcomes.get(key)
+        if cached is None:
+            cached = self._outcomes[key] = self._outcomes_of(state, belief, action, blind)
+        return cached
+
+    def _outcomes_of(self, state: State, belief: Belief, action: Action,
+                     blind: bool = False) -> List[Outcome]:
+        (position, has_gold, has_arrow, wumpus_alive) = state
+        cell = position >> 2
+        (no_pit, breezy, wumpus, gold, visited) = belief
+        result = []
+        if action == Action.Forward:
+            ahead = self._ahead[position]
+            if ahead < 0:
+                result = self._continue(self._sense(state, belief, -1, bump=True, blind=blind))
+            else:
+                bit = 1 << ahead
+                p_pit = 0.0 if no_pit & bit else \
+                    1 - self._likelihood(no_pit | bit, breezy) / self._likelihood(no_pit, breezy)
+                p_wumpus = (1 / wumpus.bit_count() if wumpus & bit else 0.0) \
+                    if wumpus_alive else 0.0
+                p_death = 1 - (1 - p_pit) * (1 - p_wumpus)
+                if p_death > 0:
+                    result.append((p_death, -1001, True, None, None, None))
+                if p_death < 1:
+                    next_wumpus = wumpus & ~bit if wumpus_alive else wumpus
+                    next_state = (ahead * 4 + (position & 3), has_gold, has_arrow, wumpus_alive)
+                    for (p, s, b, percept) in self._sense(
+                            next_state, (no_pit | bit, breezy, next_wumpus, gold, visited),
+                            -1, blind=blind):
+                        result.append((p * (1 - p_death), -1, False, s, b, percept))
+        elif action == Action.TurnLeft or action == Action.TurnRight:
+            table = TURN_LEFT if action == Action.TurnLeft else TURN_RIGHT
+            next_state = ((position & ~3) | table[position & 3], has_gold, has_arrow,
+                          wumpus_alive)
+            result = self._continue(self._sense(next_state, belief, -1, blind=blind))
+        elif action == Action.Grab:
+            # the agent holds the gold exactly when it senses glitter
+            result = self._continue(self._sense(state, belief, -1, blind=blind))
+        elif action == Action.Climb:
+            if cell == 0 and has_gold:
+                result = [(1.0, 999, True, None, None, None)]
+            elif cell == 0 and self.allow_climb_without_gold:
+                result = [(1.0, -1, True, None, None, None)]
+            else:
+                result = self._continue(self._sense(state, belief, -1, blind=blind))
+        elif action == Action.Shoot:
+            if has_arrow and wumpus_alive:
+                line = self._line_of_fire[position]
+                for (hit, candidates) in ((True, wumpus & line), (False, wumpus & ~line)):
+                    if candidates:
+                        p = candidates.bit_count() / wumpus.bit_count()
+                        next_state = (position, has_gold, False, not hit)
+                        for (q, s, b, percept) in self._sense(
+                                next_state, (no_pit, breezy, candidates, gold, visited), -11,
+                                scream=hit, blind=blind):
+                            result.append((p * q, -11, False, s, b, percept))
+            else:
+                next_state = (position, has_gold, False, wumpus_alive)
+                result = self._continue(self._sense(next_state, belief,
+                                                    -11 if has_arrow else -1, blind=blind))
+        else:
+            raise ValueError("unknown action " + str(action))
+        return result
+
+    @staticmethod
+    def _continue(sensed: List[Tuple[float, State, Belief, Percept]]) -> List[Outcome]:
+        return [(p, percept.reward, False, s, b, percept) for (p, s, b, percept) in sensed]
+
+    def optimal_value(self, bounded: bool = False) -> float:
+        """The best expected total reward any agent can achieve, over whole episodes
+        or, if `bounded`, within the horizon.
+
+        Every choice below either ends the episode or teaches something new (a new
+        cell, or the arrow spent), so whole episodes are searched without a step
+        count. An agent that never ends the episode is worth nothing here, so short
+        of the gold it steps into the least risky unknown cell eventually. The search
+        still grows quickly with the grid: whole episodes take seconds up to 3x4,
+        larger grids need `bounded` and a horizon of around a dozen steps.
+        """
+        steps = self.horizon if bounded else None
+        return sum(p * self._optimal(s, b, steps) for (p, s, b, _) in self.root())
+
+    def _optimal(self, state: State, belief: Belief, steps: Optional[int]) -> float:
+        """The best expected reward of the remaining `steps`, or of the rest of the
+        episode if None.
+
+        Moving between visited cells teaches nothing, so an optimal agent only ever
+        takes the shortest way through them to where it next steps into a new cell,
+        shoots or climbs out: any other way reaches the same state with fewer steps
+        left. The choices are those, rather than every action at every step.
+        """
+        if steps == 0:
+            return 0.0
+        key = (state, belief, steps)
+        value = self._values.get(key)
+        if value is not None:
+            return value
+        self.nodes += 1
+        (position, has_gold, has_arrow, wumpus_alive) = state
+        (_, _, wumpus, _, visited) = belief
+        ahead = self._ahead
+        distances = self._distances(position, visited)
+        # with nothing better, spend the steps left without learning anything
+        value = -steps if steps is not None else -math.inf
+        for (target, distance) in distances.items():
+            if steps is not None and distance >= steps:
+                continue
+            actions = []
+            if ahead[target] >= 0 and not visited >> ahead[target] & 1:
+                actions.append(Action.Forward)
+            if has_arrow and wumpus_alive and wumpus & self._line_of_fire[target]:
+                actions.append(Action.Shoot)
+            if target >> 2 == 0 and (has_gold or self.allow_climb_without_gold):
+                actions.append(Action.Climb)
+            moved = (target, has_gold, has_arrow, wumpus_alive)
+            left = steps - distance - 1 if steps is not None else None
+            for action in actions:
+                expected = -distance
+                for (p, reward, over, s, b) in self._merged_outcomes(moved, belief, action):
+                    expected += p * (reward if over else reward + self._optimal(s, b, left))
+                if expected > value:
+                    value = expected
+        self._values[key] = value
+        return value
+
+    def _merged_outcomes(self, state: State, belief: Belief,
+                         action: Action) -> List[Tuple[float, int, bool, State, Belief]]:
+        """The `outcomes` of an action, those an optimal agent cannot tell apart merged:
+        once the wumpus is dead, where it lies no longer matters
+        """
+        key = (state, belief, action)
+        merged = self._merged.get(key)
+        if merged is not None:
+            return merged
+        totals = {}
+        for (p, reward, over, s, b, _) in self._outcomes_of(state, belief, action):
+            if not over and not s[3]:
+                b = b[:2] + (0,) + b[3:]
+            outcome = (reward, over, s, b)
+            totals[outcome] = totals.get(outcome, 0.0) + p
+        merged = [(p, reward, over, s, b) for ((reward, over, s, b), p) in totals.items()]
+        self._merged[key] = merged
+        return merged
+
+    def _distances(self, position: int, visited: int) -> Dict[int, int]:
+        """The fewest actions from `position` to every position (cell * 4 + heading)
+        reachable through the `visited` cells
+        """
+        key = (position, visited)
+        distances = self._routes.get(key)
+        if distances is not None:
+            return distances
+        distances = {position: 0}
+        layer = [position]
+        ahead = self._ahead
+        steps = 0
+        while layer:
+            steps += 1
+            following = []
+            for current in layer:
+                heading = current & 3
+                forward = ahead[current]
+                for next_position in ((current & ~3) | TURN_LEFT[heading],
+                                      (current & ~3) | TURN_RIGHT[heading],
+                                      forward * 4 + heading if forward >= 0
+                                      and visited >> forward & 1 else -1):
+                    if next_position >= 0 and next_position not in distances:
+                        distances[next_position] = steps
+                        following.append(next_position)
+            layer = following
+        self._routes[key] = distances
+        return distances
+
+    def agent_value(self, agent_factory: Callable[[], Agent]) -> float:
+        """The expected total reward of an agent within the horizon.
+
+        An agent with an `action_distribution()` method is taken to draw every action
+        from that distribution, whatever it perceived: the probability of each state
+        and blind belief is then carried forward a step at a time. Any other agent
+        must be `deterministic`, and is followed through every percept history,
+        copied (by its `clone()` if it has one) where the histories part; if it
+        has a `memo_key()` that is not None, histories leaving it in the same
+        situation share their values.
+
+        Args:
+            agent_factory (Callable[[], Agent]): creates the agent for a new episode
+
+        Raises:
+            ValueError: if the agent's choices depend on a generator rather than only
+            on its percepts, as following one history would only sample them
+        """
+        agent = agent_factory()
+        self.check_agent(agent)
+        if hasattr(agent, "action_distribution"):
+            return self._blind(agent.action_distribution())
+        total = 0.0
+        values = {}
+        for (p, s, b, percept) in self.root():
+            total += p * self._follow(agent_factory(), percept, s, b, self.horizon, values)
+        return total
+
+    @staticmethod
+    def check_agent(agent: Agent):
+        """Raise ValueError unless `agent_value` can evaluate `agent` exactly
+        """
+        if not hasattr(agent, "action_distribution") and not getattr(agent, "deterministic",
+                                                                      True):
+            raise ValueError(type(agent).__name__ + " draws its choices from a generator, "
+                             "so its expected reward cannot be computed exactly")
+
+    def _blind(self, distribution: List[Tuple[Action, float]]) -> float:
+        total = 0.0
+        layer: Dict[Tuple[State, Belief], float] = {}
+        for (p, s, b, _) in self.root(blind=True):
+            layer[(s, b)] = layer.get((s, b), 0.0) + p
+        for _ in range(self.horizon):
+            following: Dict[Tuple[State, Belief], float] = {}
+            for ((state, belief), p) in layer.items():
+                self.nodes += 1
+                for (action, q) in distribution:
+                    for (r, reward, over, s, b, _) in self.outcomes(state, belief, action,
+                                                                    blind=True):
+                        total += p * q * r * reward
+                        if not over:
+                            following[(s, b)] = following.get((s, b), 0.0) + p * q * r
+            layer = following
+        return total
+
+    def _follow(self, agent: Agent, percept: Percept, state: State, belief: Belief,
+                steps: int, values: Dict[Tuple, float]) -> float:
+        if steps == 0:
+            return 0.0
+        memo_key = agent.memo_key() if hasattr(agent, "memo_key") else None
+        if memo_key is not None:
+            key = (state, belief, steps, percept.to_bits(), percept.reward, memo_key)
+            value = values.get(key)
+            if value is not None:
+                return value
+        self.nodes += 1
+        action = agent.next_action(percept)
+        outcomes = self.outcomes(state, belief, action)
+        value = 0.0
+        for (i, (p, reward, over, s, b, next_percept)) in enumerate(outcomes):
+            if not over:
+                # the last history carries on with the agent itself
+                child = agent if i == len(outcomes) - 1 else \
+                    agent.clone() if hasattr(agent, "clone") else copy.deepcopy(agent)
+                reward += self._follow(child, next_percept, s, b, steps - 1, values)
+            value += p * reward
+        if memo_key is not None:
+            values[key] = value
+        return value
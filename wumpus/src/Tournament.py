@@ -0,0 +1,223 @@
+import asyncio
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+from wumpus.src.environment.Misc import Action, Percept
+from wumpus.src.environment.Worlds import generate_worlds
+from wumpus.src.agent.Agents import Agent
+from wumpus.src.Evaluation import EvaluationSummary
+from wumpus.src.WumpusWorld import Termination
+
+# The protocol, all little-endian:
+#   client: HELLO (name length, then the UTF-8 name)
+#   server: WELCOME (grid width, grid height, pit probability, allow climb flag, episodes)
+#   then for every episode:
+#     server: EPISODE message with the initial percept
+#     client: one byte per action (the `Action` value), each answered by a PERCEPT
+#             message, or a FINAL one once the episode is over (no action expected)
+#   server: END message once every episode is played
+HELLO = struct.Struct("<B")
+WELCOME = struct.Struct("<HHfBI")
+MESSAGE = struct.Struct("<BBh")  # kind, percept bits (see `Percept.to_bits`), reward
+EPISODE = 1
+PERCEPT = 2
+FINAL = 3
+END = 4
+
+_ACTIONS = {int(action): action for action in Action}
+
+
+class Leaderboard():
+    """Results per agent name over every session played under it
+    """
+    summaries: Dict[str, EvaluationSummary]
+    sessions: Dict[str, int]
+    timeouts: Dict[str, int]
+    errors: Dict[str, int]
+
+    def __init__(self) -> None:
+        self.summaries = {}
+        self.sessions = {}
+        self.timeouts = {}
+        self.errors = {}
+
+    def start_session(self, name: str):
+        self.sessions[name] = self.sessions.get(name, 0) + 1
+        if name not in self.summaries:
+            self.summaries[name] = EvaluationSummary()
+
+    def add(self, name: str, total_reward: float, steps: int, termination: Termination):
+        self.summaries[name].add(total_reward, steps, termination)
+
+    def timeout(self, name: str):
+        self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+    def error(self, name: str):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def ranking(self) -> List[Tuple[str, EvaluationSummary]]:
+        """The agents ordered by mean reward, best first
+        """
+        return sorted(self.summaries.items(), key=lambda item: -item[1].mean_reward)
+
+    def show(self) -> str:
+        lines = []
+        for (rank, (name, summary)) in enumerate(self.ranking(), 1):
+            lines.append(str(rank) + ". " + name
+                         + "| Sessions: " + str(self.sessions.get(name, 0))
+                         + "| Episodes: " + str(summary.episodes)
+                         + "| Mean reward: " + format(summary.mean_reward, ".3f")
+                         + "| Success rate: " + format(summary.success_rate, ".4f")
+                         + "| Death rate: " + format(summary.death_rate, ".4f")
+                         + "| Timeouts: " + str(self.timeouts.get(name, 0))
+                         + "| Errors: " + str(self.errors.get(name, 0)))
+        return "\n".join(lines)
+
+
+class TournamentServer():
+    """Hosts game sessions for agents connecting over a socket, all on one asyncio
+    event loop. Every session plays the same seeded worlds, so agents can be
+    ranked against each other on the `leaderboard`. A session whose agent takes
+    longer than `step_timeout` seconds to answer is dropped.
+    """
+    episodes: int
+    grid_width: int = 4
+    grid_height: int = 4
+    pit_prob: float = 0.2
+    allow_climb_without_gold: bool = False
+    max_steps: int = 1000
+    step_timeout: float = 1.0
+    leaderboard: Leaderboard
+    active_sessions: int = 0
+    total_steps: int = 0
+
+    def __init__(self, episodes: int = 10, grid_width: int = 4, grid_height: int = 4,
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False, seed: int = 0,
+                 max_steps: int = 1000, step_timeout: float = 1.0) -> None:
+        self.episodes = episodes
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pit_prob = pit_prob
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.max_steps = max_steps
+        self.step_timeout = step_timeout
+        self.worlds = generate_worlds(episodes, grid_width, grid_height, pit_prob,
+                                      allow_climb_without_gold, seed)
+        self.leaderboard = Leaderboard()
+        self.active_sessions = 0
+        self.total_steps = 0
+
+    async def start_unix(self, path: str, backlog: int = 4096) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self.handle, path, backlog=backlog)
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0,
+                        backlog: int = 4096) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, backlog=backlog)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Play one session with the agent on the other end of the connection
+        """
+        name = "?"
+        self.active_sessions += 1
+        loop = asyncio.get_running_loop()
+        try:
+            # one deadline, pushed back before every read
+            async with asyncio.timeout(self.step_timeout) as deadline:
+                (length,) = HELLO.unpack(await reader.readexactly(HELLO.size))
+                name = (await reader.readexactly(length)).decode("utf-8", "replace")
+                self.leaderboard.start_session(name)
+                writer.write(WELCOME.pack(self.grid_width, self.grid_height, self.pit_prob,
+                                          self.allow_climb_without_gold, self.episodes))
+                for world in self.worlds:
+                    await self._play_episode(name, world.clone(), reader, writer,
+                                             deadline, loop)
+                writer.write(MESSAGE.pack(END, 0, 0))
+                await writer.drain()
+        except TimeoutError:
+            self.leaderboard.timeout(name)
+        except (asyncio.IncompleteReadError, ConnectionError, KeyError, struct.error):
+            # a disconnect, or an action that does not exist
+            self.leaderboard.error(name)
+        except asyncio.CancelledError:
+            # the server is shutting down, the session is left unfinished
+            pass
+        finally:
+            self.active_sessions -= 1
+            writer.close()
+
+    async def _play_episode(self, name, environment, reader, writer, deadline, loop):
+        percept = environment.initial_percept()
+        writer.write(MESSAGE.pack(EPISODE, percept.to_bits(), 0))
+        step = environment.step
+        timeout = self.step_timeout
+        total_reward = 0
+        steps = 0
+        action = None
+        while True:
+            deadline.reschedule(loop.time() + timeout)
+            action = _ACTIONS[(await reader.readexactly(1))[0]]
+            percept = step(action)
+            total_reward += percept.reward
+            steps += 1
+            over = percept.is_terminated or steps == self.max_steps
+            writer.write(MESSAGE.pack(FINAL if over else PERCEPT, percept.to_bits(),
+                                      percept.reward))
+            if over:
+                break
+        self.total_steps += steps
+        if not percept.is_terminated:
+            termination = Termination.StepLimit
+        elif action == Action.Climb:
+            termination = Termination.Escaped if environment.agent.has_gold \
+                else Termination.Climbed
+        else:
+            termination = Termination.Died
+        self.leaderboard.add(name, total_reward, steps, termination)
+
+
+AgentFactory = Callable[[int, int, float, bool], Agent]
+
+
+async def play(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name: str,
+               agent_factory: AgentFactory) -> List[int]:
+    """Play a whole session as a client
+
+    Args:
+        reader, writer: a connection to a `TournamentServer`
+        name (str): the name the results are recorded under
+        agent_factory (AgentFactory): called with the grid width, grid height, pit
+            probability and allow climb flag to create the agent for each episode
+
+    Returns:
+        List[int]: the total reward of each episode
+    """
+    encoded = name.encode("utf-8")[:255]
+    writer.write(HELLO.pack(len(encoded)) + encoded)
+    (grid_width, grid_height, pit_prob, allow_climb_without_gold, _) = \
+        WELCOME.unpack(await reader.readexactly(WELCOME.size))
+    rewards = []
+    agent = None
+    while True:
+        (kind, bits, reward) = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+        if kind == END:
+            break
+        if kind == EPISODE:
+            agent = agent_factory(grid_width, grid_height, pit_prob,
+                                  bool(allow_climb_without_gold))
+            rewards.append(0)
+        rewards[-1] += reward
+        if kind != FINAL:
+            writer.write(bytes((agent.next_action(Percept.from_bits(bits, reward)),)))
+    writer.close()
+    await writer.wait_closed()
+    return rewards
+
+
+async def run_client(agent_factory: AgentFactory, name: str, path: Optional[str] = None,
+                     host: str = "127.0.0.1", port: Optional[int] = None) -> List[int]:
+    """Connect to a server, over the Unix socket `path` or else TCP, and `play` a session
+    """
+    if path is not None:
+        (reader, writer) = await asyncio.open_unix_connection(path)
+    else:
+        (reader, writer) = await asyncio.open_connection(host, port)
+    return await play(reader, writer, name, agent_factory)
@@ -0,0 +1,128 @@
+import struct
+from typing import Callable, Iterator, List, Optional, Self, Tuple
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.Misc import Action, Percept
+
+# A trajectory file is a header followed by fixed-size records, one per step:
+#   header: magic, format version
+#   record: world id, step, action, percept bits (see `Percept.to_bits`), reward
+# Each episode starts with a step 0 record of the initial percept, with action 0.
+MAGIC = b"WMPT"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<IIBBh")
+
+# (world id, step, action, percept bits, reward)
+TrajectoryRecord = Tuple[int, int, int, int, int]
+
+
+class TrajectoryWriter():
+    """Streams episode steps into a trajectory file. Records are packed into a
+    fixed-size chunk that is written out whenever it fills up, so memory use does
+    not grow with the length of the run.
+    """
+    path: str
+    chunk_records: int
+    records: int = 0
+
+    def __init__(self, path: str, chunk_records: int = 4096) -> None:
+        if chunk_records < 1:
+            raise ValueError("chunk_records must be at least 1")
+        self.path = path
+        self.chunk_records = chunk_records
+        self.records = 0
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._chunk = bytearray(chunk_records * RECORD.size)
+        self._offset = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, world_id: int, step: int, action: int, percept: Percept):
+        RECORD.pack_into(self._chunk, self._offset, world_id, step, action,
+                         percept.to_bits(), percept.reward)
+        self._offset += RECORD.size
+        self.records += 1
+        if self._offset == len(self._chunk):
+            self.flush()
+
+    def start_episode(self, world_id: int, percept: Percept):
+        """Record the percept sensed before the first action of an episode
+        """
+        self.write(world_id, 0, 0, percept)
+
+    def recorder(self, world_id: int) -> Callable[[int, Action, Environment, Percept], None]:
+        """A `run_episode` step hook recording every step under `world_id`
+        """
+        write = self.write
+
+        def on_step(step: int, action: Action, environment: Environment, percept: Percept):
+            write(world_id, step, action, percept)
+        return on_step
+
+    def flush(self):
+        if self._offset:
+            self._file.write(memoryview(self._chunk)[:self._offset])
+            self._offset = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class TrajectoryReader():
+    """Reads a trajectory file back a chunk at a time, record by record or
+    episode by episode
+    """
+    path: str
+    chunk_records: int
+
+    def __init__(self, path: str, chunk_records: int = 4096) -> None:
+        self.path = path
+        self.chunk_records = chunk_records
+        with open(path, "rb") as f:
+            (magic, version) = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(path + " is not a trajectory file")
+        if version != VERSION:
+            raise ValueError("unsupported trajectory file version " + str(version))
+
+    def __iter__(self) -> Iterator[TrajectoryRecord]:
+        size = self.chunk_records * RECORD.size
+        with open(self.path, "rb") as f:
+            f.seek(HEADER.size)
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                # a partly written last record (e.g. after a crash) is dropped
+                yield from RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size])
+
+    def episodes(self) -> Iterator[Tuple[int, List[Optional[Action]], List[Percept]]]:
+        """Replay the file as episodes
+
+        Returns:
+            Iterator[Tuple[int, List[Optional[Action]], List[Percept]]]: for each episode,
+            its world id, the actions (None for the initial percept) and the percept
+            sensed after each
+        """
+        world = None
+        actions = []
+        percepts = []
+        for (world_id, step, action, bits, reward) in self:
+            if step == 0 or world_id != world:
+                if percepts:
+                    yield (world, actions, percepts)
+                world = world_id
+                actions = []
+                percepts = []
+            actions.append(Action(action) if action else None)
+            percepts.append(Percept.from_bits(bits, reward))
+        if percepts:
+            yield (world, actions, percepts)
@@ -1,6 +1,119 @@
+import time
+from enum import IntEnum
+from typing import Callable, Optional
 from wumpus.src.environment.Environments import Environment
 from wumpus.src.environment.Environments import Percept
-from wumpus.src.agent.Agents import NaiveAgent
+from wumpus.src.environment.Misc import Action
+from wumpus.src.environment.Metrics import Metrics
+from wumpus.src.agent.Agents import Agent, NaiveAgent
+from wumpus.src.Trajectories import TrajectoryWriter
+from wumpus.src.environment.Worlds import write_worlds
+
+
+class Termination(IntEnum):
+    """An enum for the reason an episode came to an end
+
+    Args:
+        Enum (_type_): For implementation of enum class
+    """
+    Escaped = 1
+    Climbed = 2
+    Died = 3
+    StepLimit = 4
+
+
+class EpisodeResult():
+    """A class to hold the outcome of a single episode
+    """
+    total_reward: float = 0.0
+    steps: int = 0
+    termination: Termination = Termination.StepLimit
+
+    def __init__(self, total_reward: float, steps: int, termination: Termination):
+        self.total_reward = total_reward
+        self.steps = steps
+        self.termination = termination
+
+    def show(self) -> str:
+        return "| Total reward: " + str(self.total_reward) + "| Steps: " + str(self.steps) \
+            + "| Termination: " + self.termination.name
+
+
+StepHook = Callable[[int, Action, Environment, Percept], None]
+
+
+def run_episode(environment: Environment, agent: Agent, percept: Percept,
+                on_step: Optional[StepHook] = None,
+                max_steps: Optional[int] = None,
+                in_place: bool = False,
+                metrics: Optional[Metrics] = None) -> EpisodeResult:
+    """Run an episode to termination with a flat loop, so the stack depth does
+    not grow with the number of actions taken. The environment is stepped in
+    place, so `on_step` sees the same (updated) environment object every call.
+
+    Args:
+        environment (Environment): the environment the episode starts from
+        agent (Agent): the agent choosing the actions
+        percept (Percept): the percept sensed in the starting environment
+        on_step (StepHook, optional): called as `on_step(step, action, environment, percept)`
+            after every action. Defaults to None.
+        max_steps (int, optional): stop the episode after this many actions. Defaults to None.
+        in_place (bool, optional): step `environment` itself rather than a clone of it.
+            Defaults to False.
+        metrics (Metrics, optional): time the agent's decisions and, set as the stepped
+            environment's `metrics`, the environment's work too. Defaults to None.
+
+    Returns:
+        EpisodeResult: the accumulated reward, number of actions and termination cause
+    """
+    if not in_place:
+        environment = environment.clone()
+    step = environment.step
+    next_action = agent.next_action
+    limit = -1 if max_steps is None else max_steps
+    total_reward = 0.0
+    steps = 0
+    action = None
+
+    if metrics is not None:
+        # measure this episode only, not the caller's later steps
+        previous_metrics = environment.metrics
+        environment.metrics = metrics
+        clock = time.perf_counter_ns
+        record = metrics.record
+        try:
+            while not percept.is_terminated and steps != limit:
+                start = clock()
+                action = next_action(percept)
+                record("decide", clock() - start)
+                percept = step(action)
+                total_reward += percept.reward
+                steps += 1
+                if on_step is not None:
+                    on_step(steps, action, environment, percept)
+        finally:
+            environment.metrics = previous_metrics
+    elif on_step is None:
+        while not percept.is_terminated and steps != limit:
+            action = next_action(percept)
+            percept = step(action)
+            total_reward += percept.reward
+            steps += 1
+    else:
+        while not percept.is_terminated and steps != limit:
+            action = next_action(percept)
+            percept = step(action)
+            total_reward += percept.reward
+            steps += 1
+            on_step(steps, action, environment, percept)
+
+    if not percept.is_terminated:
+        termination = Termination.StepLimit
+    elif action == Action.Climb:
+        termination = Termination.Escaped if environment.agent.has_gold else Termination.Climbed
+    else:
+        termination = Termination.Died
+    return EpisodeResult(total_reward, steps, termination)
 
 
 class WumpusWorld():
@@ -8,35 +121,58 @@ class WumpusWorld():
     grid_height: int = 4
     pit_prob: float = 0.2
     allow_climb_without_gold = False
-    
-    def __init__(self, grid_width: int, grid_height: int, 
+
+    def __init__(self, grid_width: int, grid_height: int,
                  pit_prob: float,
                  allow_climb_without_gold: bool) -> None:
         self.grid_width = grid_width
         self.grid_height = grid_height
         self.pit_prob = pit_prob
         self.allow_climb_without_gold = allow_climb_without_gold
-    
-    def main(self, visualize: bool = False):
-        def run_episode(env: Environment,
-                        agent: NaiveAgent,
-                        percept: Percept) -> float:
-            next_action = agent.next_action(percept)
-            (next_environment, next_percept) = env.apply_action(next_action)
-            if visualize:
-                print("Action: ", str(next_action.name), "| Agent Orientation: ", next_environment.agent.orientation.state.name)
-                print(next_environment.visualize())
-                print(next_percept.show())
-            total_reward = next_percept.reward + \
-                (run_episode(next_environment, 
-                            agent, 
-                            next_percept) if not next_percept.is_terminated else 0.0)
-            return total_reward
-                
+
+    @staticmethod
+    def print_step(step: int, action: Action, environment: Environment, percept: Percept):
+        print("Action: ", str(action.name), "| Agent Orientation: ", environment.agent.orientation.name)
+        print(environment.visualize())
+        print(percept.show())
+
+    def main(self, visualize: bool = False, record: Optional[str] = None,
+             profile: bool = False):
+        """Run one episode with a `NaiveAgent`
+
+        Args:
+            visualize (bool, optional): print the board after every action. Defaults to False.
+            record (str, optional): stream the episode into this trajectory file
+                (see `TrajectoryReader`) instead, and save its world as world 0 of the
+                world file `record + ".worlds"`, to replay it from. Defaults to None.
+            profile (bool, optional): print where the time went at the end. Defaults to False.
+
+        Raises:
+            ValueError: if asked both to visualize and to record
+        """
+        if visualize and record is not None:
+            raise ValueError("an episode is either visualized or recorded, not both")
+        metrics = Metrics() if profile else None
+        start = time.perf_counter_ns()
         (initial_env, initial_percept) = Environment.initialize(self.grid_width,
                                                                 self.grid_height,
                                                                 self.pit_prob,
                                                                 self.allow_climb_without_gold)
+        if metrics is not None:
+            metrics.record("generate", time.perf_counter_ns() - start)
         agent = NaiveAgent()
-        total_reward = run_episode(initial_env, agent, initial_percept)
-        print("Total reward: ", str(total_reward))     
+        if record is not None:
+            # saved before the episode plays in place
+            write_worlds(record + ".worlds", [initial_env])
+            with TrajectoryWriter(record) as writer:
+                writer.start_episode(0, initial_percept)
+                result = run_episode(initial_env, agent, initial_percept,
+                                     on_step=writer.recorder(0), in_place=True,
+                                     metrics=metrics)
+        else:
+            result = run_episode(initial_env, agent, initial_percept,
+                                 on_step=self.print_step if visualize else None,
+                                 in_place=True, metrics=metrics)
+        print("Total reward: ", str(result.total_reward))
+        if metrics is not None:
+            print(metrics.show())
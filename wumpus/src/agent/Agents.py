@@ -1,10 +1,20 @@
+import copy
 import random
-from wumpus.src.environment.Misc import Action, Percept
+from collections import deque
+from typing import Deque, Dict, List, Optional, Self, Tuple
+from wumpus.src.environment.Misc import Action, Percept, OrientationState
+from wumpus.src.agent.Knowledge import KnowledgeState
+from wumpus.src.agent.Probability import PitProbabilities
+from wumpus.src.agent.Planning import RoutePlanner
+from wumpus.src.agent.Rollouts import BeliefSampler, RolloutEngine, choose
 
 
 class Agent:
-    """A class representing the Agent and its base implementation
+    """A class representing the Agent and its base implementation. An agent whose
+    actions are not fully decided by its percepts, e.g. drawn from a generator,
+    sets `deterministic` to False.
     """
+    deterministic: bool = True
 
     def __init__(self) -> None:
         pass
@@ -14,9 +24,247 @@ class Agent:
 
 
 class NaiveAgent(Agent):
-    def __init__(self) -> None:
-        pass
+    rng: random.Random
+    deterministic: bool = False
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        self.rng = rng if rng is not None else random.Random()
 
     def next_action(self, percept: Percept) -> Action:
         # return Action(random.randint(int(Action.Forward), int(Action.TurnRight)))
-        return Action(random.randint(int(Action.Forward), int(Action.Climb)))
+        return Action(self.rng.randint(int(Action.Forward), int(Action.Climb)))
+
+    def action_distribution(self) -> List[Tuple[Action, float]]:
+        """The probability of each action `next_action` may return, whatever the agent
+        perceived
+        """
+        return [(action, 1 / len(Action)) for action in Action]
+
+
+
+class KnowledgeAgent(Agent):
+    """An agent keeping a `KnowledgeState` of the cave. It only walks through cells
+    it has proven safe, shoots the wumpus once it knows where it is, and takes the
+    nearest risk only when nothing safe is left to explore.
+    """
+    knowledge: KnowledgeState
+    planner: RoutePlanner
+    allow_climb_without_gold: bool = False
+    plan: Deque[Action]
+
+    def __init__(self, grid_width: int, grid_height: int,
+                 allow_climb_without_gold: bool = False) -> None:
+        self.knowledge = KnowledgeState(grid_width, grid_height)
+        self.planner = RoutePlanner(grid_width, grid_height)
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.plan = deque()
+
+    def next_action(self, percept: Percept) -> Action:
+        self.knowledge.observe(percept)
+        if not self.plan:
+            self.plan.extend(self.choose_plan())
+        action = self.plan.popleft()
+        self.knowledge.act(action)
+        return action
+
+    def clone(self) -> Self:
+        """Return a copy of the agent that can carry on a different history. The
+        planner never changes, so it is shared rather than copied.
+        """
+        new_agent = copy.copy(self)
+        new_agent.knowledge = copy.copy(self.knowledge)
+        new_agent.plan = deque(self.plan)
+        return new_agent
+
+    def memo_key(self) -> Optional[Tuple]:
+        """Everything the agent's next actions depend on besides the percepts to come,
+        so evaluators can share the work of histories leaving the agent in the same
+        situation
+        """
+        k = self.knowledge
+        return (k.key(), k.breezy, k.stenchy, k.no_pit, k.pits, k.wumpus_candidates,
+                k.last_action, tuple(self.plan))
+
+    def choose_plan(self) -> List[Action]:
+        """Pick the next sequence of actions. Cells only ever become safer, so
+        a plan stays safe to follow to its end.
+        """
+        k = self.knowledge
+        if k.has_gold:
+            return self.climb_out()
+        explore = self.route_to(k.safe & k.frontier)
+        if explore:
+            return explore
+        shot = self.plan_shot()
+        if shot:
+            return shot
+        if self.allow_climb_without_gold:
+            return self.climb_out()
+        return self.take_risk()
+
+    def climb_out(self) -> List[Action]:
+        return (self.route_to(1) or []) + [Action.Climb]
+
+    def take_risk(self) -> List[Action]:
+        k = self.knowledge
+        wumpus = k.wumpus_location
+        deadly = k.pits | (1 << wumpus if wumpus is not None and k.wumpus_alive else 0)
+        return self.route_to(k.frontier & ~deadly) or self.route_to(k.frontier) \
+            or [Action.Climb]
+
+    def plan_shot(self) -> List[Action]:
+        """Walk to a safe cell in line with the wumpus, face it and shoot, if its
+        location is known and the arrow is left
+        """
+        k = self.knowledge
+        wumpus = k.wumpus_location
+        if wumpus is None or not k.has_arrow or not k.wumpus_alive:
+            return []
+        (wy, wx) = divmod(wumpus, k.grid_width)
+        in_line = 0
+        for x in range(k.grid_width):
+            in_line |= 1 << k.cell(x, wy)
+        for y in range(k.grid_height):
+            in_line |= 1 << k.cell(wx, y)
+        route = self.find_route(in_line & k.safe)
+        if route is None:
+            return []
+        (actions, cell, heading) = route
+        (y, x) = divmod(cell, k.grid_width)
+        if x == wx:
+            facing = OrientationState.North if wy > y else OrientationState.South
+        else:
+            facing = OrientationState.East if wx > x else OrientationState.West
+        return actions + self.turns(heading, facing) + [Action.Shoot]
+
+    def route_to(self, goals: int) -> List[Action]:
+        """Actions reaching the nearest cell in the `goals` bitmap through safe cells,
+        or an empty list if there is none (or the agent is already there)
+        """
+        route = self.find_route(goals)
+        return route[0] if route is not None else []
+
+    def find_route(self, goals: int) -> Optional[Tuple[List[Action], int, int]]:
+        """Plan a route through safe cells to the nearest cell in `goals`, which need
+        not be safe itself. See `RoutePlanner.plan`.
+        """
+        k = self.knowledge
+        return self.planner.plan(k.location, k.heading, goals, k.safe)
+
+    @staticmethod
+    def turns(heading: int, facing: int) -> List[Action]:
+        difference = (facing - heading) % 4
+        if difference == 1:
+            return [Action.TurnRight]
+        if difference == 2:
+            return [Action.TurnRight, Action.TurnRight]
+        if difference == 3:
+            return [Action.TurnLeft]
+        return []
+
+
+class ProbabilisticAgent(KnowledgeAgent):
+    """A `KnowledgeAgent` that, when it has to take a risk, steps into the frontier
+    cell least likely to hold a pit or the wumpus rather than the nearest one.
+    """
+    probabilities: PitProbabilities
+
+    def __init__(self, grid_width: int, grid_height: int, pit_prob: float = 0.2,
+                 allow_climb_without_gold: bool = False) -> None:
+        super().__init__(grid_width, grid_height, allow_climb_without_gold)
+        self.probabilities = PitProbabilities(pit_prob)
+
+    def risks(self) -> Dict[int, float]:
+        """The probability of dying on entering each frontier cell
+        """
+        k = self.knowledge
+        pits = self.probabilities.update(k)
+        candidates = k.wumpus_candidates if k.wumpus_alive else 0
+        wumpus = 1 / candidates.bit_count() if candidates else 0.0
+        risks = {}
+        frontier = k.frontier
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            cell = low.bit_length() - 1
+            pit = 0.0 if k.no_pit & low else pits.get(cell, self.probabilities.pit_prob)
+            risks[cell] = 1 - (1 - pit) * (1 - (wumpus if candidates & low else 0.0))
+        return risks
+
+    def take_risk(self) -> List[Action]:
+        risks = self.risks()
+        if not risks:
+            return [Action.Climb]
+        lowest = min(risks.values())
+        # the nearest of the safest cells
+        goals = 0
+        for (cell, risk) in risks.items():
+            if risk <= lowest + 1e-9:
+                goals |= 1 << cell
+        return self.route_to(goals) or [Action.Climb]
+
+
+class MonteCarloAgent(KnowledgeAgent):
+    """A `KnowledgeAgent` that, when it has to take a risk, weighs stepping into
+    each frontier cell by rollouts in worlds drawn from its belief, see
+    `Rollouts.choose`.
+    """
+    sampler: BeliefSampler
+    engine: RolloutEngine
+    simulations: int = 2000
+    rng: random.Random
+    deterministic: bool = False
+
+    def __init__(self, grid_width: int, grid_height: int, pit_prob: float = 0.2,
+                 allow_climb_without_gold: bool = False, simulations: int = 2000,
+                 rng: Optional[random.Random] = None) -> None:
+        super().__init__(grid_width, grid_height, allow_climb_without_gold)
+        self.sampler = BeliefSampler(pit_prob)
+        self.engine = RolloutEngine(grid_width, grid_height, allow_climb_without_gold)
+        self.simulations = simulations
+        self.rng = rng if rng is not None else random.Random()
+
+    def clone(self) -> Self:
+        new_agent = super().clone()
+        new_agent.rng = random.Random()
+        new_agent.rng.setstate(self.rng.getstate())
+        return new_agent
+
+    def memo_key(self) -> Optional[Tuple]:
+        # the choices also depend on the generator
+        return None
+
+    def take_risk(self) -> List[Action]:
+        k = self.knowledge
+        options = []
+        frontier = k.frontier & ~k.pits
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            route = self.route_to(low)
+            if route:
+                options.append(route)
+        if not options:
+            return [Action.Climb]
+        (best, _) = choose(options, k, self.sampler, self.engine, self.simulations, self.rng)
+        return options[best]
+
+
+AGENTS = ("naive", "knowledge", "probabilistic", "montecarlo")
+
+
+def create_agent(name: str, grid_width: int = 4, grid_height: int = 4, pit_prob: float = 0.2,
+                 allow_climb_without_gold: bool = False,
+                 rng: Optional[random.Random] = None) -> Agent:
+    """Create a fresh agent by name, one of `AGENTS`, for one episode in the given world
+    """
+    if name == "naive":
+        return NaiveAgent(rng)
+    if name == "knowledge":
+        return KnowledgeAgent(grid_width, grid_height, allow_climb_without_gold)
+    if name == "probabilistic":
+        return ProbabilisticAgent(grid_width, grid_height, pit_prob, allow_climb_without_gold)
+    if name == "montecarlo":
+        return MonteCarloAgent(grid_width, grid_height, pit_prob, allow_climb_without_gold,
+                               rng=rng)
+    raise ValueError("unknown agent " + name + ", expected one of " + ", ".join(AGENTS))
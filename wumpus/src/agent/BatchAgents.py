@@ -0,0 +1,130 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Tuple
+from wumpus.src.environment.Misc import Action, Percept
+from wumpus.src.environment.VecEnvironments import VecEnvironment, PERCEPT_FIELDS, TERMINATED
+from wumpus.src.agent.Agents import Agent, NaiveAgent
+
+# Weight of each percept column in `Percept.to_bits`, which packs them in the same order
+_BITS = 1 << np.arange(len(PERCEPT_FIELDS))
+
+
+class BatchAgent(ABC):
+    """Decides the actions of a whole batch of environments in one call, from the
+    percept and reward arrays of a `VecEnvironment`.
+
+    The action of an environment whose episode is over is ignored by
+    `VecEnvironment.step`, and may be anything.
+    """
+    num_envs: int
+
+    def __init__(self, num_envs: int) -> None:
+        self.num_envs = num_envs
+
+    @abstractmethod
+    def next_actions(self, percepts: np.ndarray, rewards: np.ndarray) -> np.ndarray:
+        """Choose the next action of every environment
+
+        Args:
+            percepts (np.ndarray): the (num_envs, 6) boolean percepts, columns `PERCEPT_FIELDS`
+            rewards (np.ndarray): the (num_envs,) rewards of the last step
+
+        Returns:
+            np.ndarray: one `Action` value per environment
+        """
+
+    def reset(self, mask: Optional[np.ndarray] = None):
+        """Start new episodes, either in every environment or only where `mask` is
+        set, as `VecEnvironment.reset` does
+        """
+        pass
+
+
+class NaiveBatchAgent(BatchAgent):
+    """`NaiveAgent` for a batch: every action drawn uniformly at random, all
+    environments at once
+    """
+    rng: np.random.Generator
+
+    def __init__(self, num_envs: int, seed: Optional[int] = None) -> None:
+        super().__init__(num_envs)
+        self.rng = np.random.default_rng(seed)
+
+    def next_actions(self, percepts: np.ndarray, rewards: np.ndarray) -> np.ndarray:
+        return self.rng.integers(int(Action.Forward), int(Action.Climb) + 1, self.num_envs,
+                                 dtype=np.int8)
+
+
+class AgentBatch(BatchAgent):
+    """Any single-percept `Agent` for a batch: one agent per environment, each
+    asked for its action in turn. Agents of finished episodes are not asked, and
+    `reset` replaces the agents of the episodes starting anew.
+    """
+    agent_factory: Callable[[], Agent]
+    agents: List[Agent]
+
+    def __init__(self, num_envs: int, agent_factory: Callable[[], Agent]) -> None:
+        super().__init__(num_envs)
+        self.agent_factory = agent_factory
+        self.agents = [agent_factory() for _ in range(num_envs)]
+
+    def next_actions(self, percepts: np.ndarray, rewards: np.ndarray) -> np.ndarray:
+        actions = np.zeros(self.num_envs, dtype=np.int8)
+        bits = (np.asarray(percepts) @ _BITS).tolist()
+        rewards = np.asarray(rewards).tolist()
+        agents = self.agents
+        for i in np.flatnonzero(~np.asarray(percepts)[:, TERMINATED]).tolist():
+            actions[i] = agents[i].next_action(Percept.from_bits(bits[i], rewards[i]))
+        return actions
+
+    def reset(self, mask: Optional[np.ndarray] = None):
+        indices = range(self.num_envs) if mask is None else np.flatnonzero(mask).tolist()
+        for i in indices:
+            self.agents[i] = self.agent_factory()
+
+
+# Vectorized implementations by agent factory (the agent class itself), each
+# created as `cls(num_envs, seed)`
+VECTORIZED = {NaiveAgent: NaiveBatchAgent}
+
+
+def batch_agent(agent_factory: Callable[[], Agent], num_envs: int,
+                seed: Optional[int] = None) -> BatchAgent:
+    """The batched form of the agents `agent_factory` creates: its vectorized
+    implementation if it has one in `VECTORIZED`, else one agent per environment
+    in an `AgentBatch`. Pass the agent class itself, e.g. `NaiveAgent`, for its
+    vectorized implementation: no agent is created just to find it.
+
+    Args:
+        agent_factory (Callable[[], Agent]): creates an agent for one episode
+        num_envs (int): the number of environments
+        seed (int, optional): seeds a vectorized implementation. Defaults to None.
+    """
+    vectorized = VECTORIZED.get(agent_factory)
+    if vectorized is not None:
+        return vectorized(num_envs, seed)
+    return AgentBatch(num_envs, agent_factory)
+
+
+def run_batch(environments: VecEnvironment, agent: BatchAgent,
+              max_steps: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
+    """Play one episode in every environment of the batch, from fresh worlds, until
+    all are over or `max_steps` actions were taken
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the total reward and the number of actions
+        of each episode
+    """
+    percepts = environments.reset()
+    agent.reset()
+    rewards = np.zeros(environments.num_envs, dtype=np.int32)
+    totals = np.zeros(environments.num_envs, dtype=np.int64)
+    steps = np.zeros(environments.num_envs, dtype=np.int32)
+    for _ in range(max_steps):
+        live = ~percepts[:, TERMINATED]
+        if not live.any():
+            break
+        (percepts, rewards) = environments.step(agent.next_actions(percepts, rewards))
+        totals += rewards
+        steps += live
+    return (totals, steps)
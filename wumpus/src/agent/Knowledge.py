@@ -0,0 +1,189 @@
+from typing import List, Optional
+from wumpus.src.environment.Misc import Action, Percept, OrientationState
+from wumpus.src.environment.Misc import TURN_LEFT, TURN_RIGHT, FORWARD_DX, FORWARD_DY
+
+
+class KnowledgeState():
+    """What an agent knows about its own state and the cave, built only from the
+    actions it took and the percepts it received. Cells are numbered
+    `y * grid_width + x` and sets of cells are held as integer bitmaps.
+
+    Each percept only updates the cells around the agent's location (and the
+    breezy cells next to them), so an update costs the same on any grid size.
+    """
+    grid_width: int
+    grid_height: int
+    x: int = 0
+    y: int = 0
+    heading: int = OrientationState.East
+    has_gold: bool = False
+    has_arrow: bool = True
+    wumpus_alive: bool = True
+    visited: int = 0
+    safe: int = 0
+    frontier: int = 0
+    breezy: int = 0
+    stenchy: int = 0
+    no_pit: int = 0
+    pits: int = 0
+    wumpus_candidates: int = 0
+    last_action: Optional[Action] = None
+
+    def __init__(self, grid_width: int, grid_height: int) -> None:
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.x = 0
+        self.y = 0
+        self.heading = int(OrientationState.East)
+        self.has_gold = False
+        self.has_arrow = True
+        self.wumpus_alive = True
+        self.visited = 0
+        self.safe = 0
+        self.frontier = 0
+        self.breezy = 0
+        self.stenchy = 0
+        self.no_pit = 0
+        self.pits = 0
+        # the wumpus is never placed in the first row or column
+        row = ((1 << grid_width) - 1) & ~1
+        self.wumpus_candidates = 0
+        for y in range(1, grid_height):
+            self.wumpus_candidates |= row << (y * grid_width)
+        self.last_action = None
+        self._cell_bits = (grid_width * grid_height - 1).bit_length()
+
+    def cell(self, x: int, y: int) -> int:
+        return y * self.grid_width + x
+
+    @property
+    def location(self) -> int:
+        return self.y * self.grid_width + self.x
+
+    @property
+    def wumpus_location(self) -> Optional[int]:
+        """The wumpus' cell once the percepts pin it down to a single one, else None
+        """
+        candidates = self.wumpus_candidates
+        if candidates and candidates & (candidates - 1) == 0:
+            return candidates.bit_length() - 1
+        return None
+
+    def neighbors(self, cell: int) -> List[int]:
+        """The cells sharing an edge with `cell`
+        """
+        width = self.grid_width
+        (y, x) = divmod(cell, width)
+        result = []
+        if x > 0:
+            result.append(cell - 1)
+        if y > 0:
+            result.append(cell - width)
+        if y < self.grid_height - 1:
+            result.append(cell + width)
+        if x < width - 1:
+            result.append(cell + 1)
+        return result
+
+    def neighbor_mask(self, cell: int) -> int:
+        mask = 0
+        for n in self.neighbors(cell):
+            mask |= 1 << n
+        return mask
+
+    def line_of_fire(self) -> int:
+        """The bitmap of cells ahead of the agent, up to the wall
+        """
+        mask = 0
+        (x, y) = (self.x + FORWARD_DX[self.heading], self.y + FORWARD_DY[self.heading])
+        while 0 <= x < self.grid_width and 0 <= y < self.grid_height:
+            mask |= 1 << (y * self.grid_width + x)
+            (x, y) = (x + FORWARD_DX[self.heading], y + FORWARD_DY[self.heading])
+        return mask
+
+    def act(self, action: Action):
+        """Record the action the agent is about to take, applied by the next `observe`
+        """
+        self.last_action = action
+
+    def observe(self, percept: Percept):
+        """Update the state with the outcome of the last action and the percept it produced
+        """
+        action = self.last_action
+        self.last_action = None
+        if action == Action.Forward:
+            if not percept.bump:
+                self.x += FORWARD_DX[self.heading]
+                self.y += FORWARD_DY[self.heading]
+            # walking onto the gold picks it up
+            self.has_gold = self.has_gold or percept.glitter
+        elif action == Action.TurnLeft:
+            self.heading = TURN_LEFT[self.heading]
+        elif action == Action.TurnRight:
+            self.heading = TURN_RIGHT[self.heading]
+        elif action == Action.Grab:
+            self.has_gold = percept.glitter
+        elif action == Action.Shoot:
+            if percept.scream:
+                self.wumpus_alive = False
+                self.wumpus_candidates = 0
+            elif self.has_arrow and self.wumpus_alive:
+                # missed: the wumpus is nowhere the arrow flew
+                self.wumpus_candidates &= ~self.line_of_fire()
+            self.has_arrow = False
+
+        if action == Action.Forward and percept.is_terminated:
+            # walked into a pit or the wumpus
+            return
+        location = self.location
+        bit = 1 << location
+        first_visit = not self.visited & bit
+        self.visited |= bit
+        if first_visit:
+            self.frontier = (self.frontier | self.neighbor_mask(location)) & ~self.visited
+            self._infer(location, percept)
+        self.safe = self.no_pit & ~self.wumpus_candidates
+
+    def _infer(self, location: int, percept: Percept):
+        self.wumpus_candidates &= ~(1 << location)
+        self._mark_no_pit(location)
+        if percept.breeze:
+            self.breezy |= 1 << location
+            self._check_breeze(location)
+        else:
+            for n in self.neighbors(location):
+                self._mark_no_pit(n)
+        if self.wumpus_alive:
+            if percept.stench:
+                self.stenchy |= 1 << location
+                self.wumpus_candidates &= self.neighbor_mask(location)
+            else:
+                self.wumpus_candidates &= ~self.neighbor_mask(location)
+
+    def _mark_no_pit(self, cell: int):
+        bit = 1 << cell
+        if self.no_pit & bit:
+            return
+        self.no_pit |= bit
+        # a breezy neighbour may be left with a single cell its pit can be in
+        for n in self.neighbors(cell):
+            if self.breezy & (1 << n):
+                self._check_breeze(n)
+
+    def _check_breeze(self, cell: int):
+        candidates = [n for n in self.neighbors(cell) if not self.no_pit & (1 << n)]
+        if len(candidates) == 1:
+            self.pits |= 1 << candidates[0]
+
+    def key(self) -> int:
+        """Pack the knowledge state into one integer, so identical knowledge states
+        can be recognised and memoized.
+
+        From the least significant bit: heading (2 bits), has_gold, has_arrow,
+        wumpus_alive, the agent's cell, then the visited and safe bitmaps.
+        """
+        cells = self.grid_width * self.grid_height
+        key = self.heading | self.has_gold << 2 | self.has_arrow << 3 | self.wumpus_alive << 4 \
+            | self.location << 5
+        shift = 5 + self._cell_bits
+        return key | self.visited << shift | self.safe << (shift + cells)
@@ -0,0 +1,207 @@
+import heapq
+from collections import deque
+from typing import List, Optional, Tuple
+from wumpus.src.environment.Misc import Action
+from wumpus.src.environment.Misc import TURN_LEFT, TURN_RIGHT, FORWARD_DX, FORWARD_DY
+from wumpus.src.agent.Search import TranspositionTable
+
+UNREACHABLE = 1 << 30
+
+# move tables for each grid size, shared by all planners
+_moves = {}
+
+
+def moves(grid_width: int, grid_height: int) -> Tuple[List[int], List[int]]:
+    """For each state, the cell ahead of it and the cell behind it (where a forward
+    move into it came from), -1 where that is a wall
+    """
+    if (grid_width, grid_height) not in _moves:
+        ahead = []
+        for y in range(grid_height):
+            for x in range(grid_width):
+                for heading in range(4):
+                    (ax, ay) = (x + FORWARD_DX[heading], y + FORWARD_DY[heading])
+                    inside = 0 <= ax < grid_width and 0 <= ay < grid_height
+                    ahead.append(ay * grid_width + ax if inside else -1)
+        behind = [ahead[cell * 4 + (heading + 2) % 4]
+                  for cell in range(grid_width * grid_height) for heading in range(4)]
+        _moves[(grid_width, grid_height)] = (ahead, behind)
+    return _moves[(grid_width, grid_height)]
+
+
+class DistanceMap():
+    """The number of actions from every (cell, heading) state to the nearest goal
+    cell, moving only through safe cells. States are numbered `cell * 4 + heading`.
+    """
+    goals: int
+    safe: int
+    costs: List[int]
+
+    def __init__(self, goals: int, safe: int, costs: List[int]) -> None:
+        self.goals = goals
+        self.safe = safe
+        self.costs = costs
+
+
+class RoutePlanner():
+    """Plans the `Forward`/`TurnLeft`/`TurnRight` actions taking the agent to the
+    nearest of a set of goal cells through known-safe cells, every action costing 1.
+    Moving into a wall only bumps, so it is never part of a plan.
+
+    A set of goals planned for once is searched for forwards from the agent,
+    stopping at the nearest goal. Planned for again, the distances to it from every
+    state are computed backwards from the goals and cached. The safe cells only
+    ever grow, so when they do a cached map is repaired from the new cells
+    outwards instead of being computed again.
+    """
+    grid_width: int
+    grid_height: int
+    cache: TranspositionTable
+    repairs: int = 0
+
+    def __init__(self, grid_width: int, grid_height: int, capacity: int = 64) -> None:
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cache = TranspositionTable(capacity)
+        self.repairs = 0
+        # goals planned for once, whose distance map is built if they are asked for again
+        self._requested = TranspositionTable(capacity)
+        (self._ahead, self._behind) = moves(grid_width, grid_height)
+
+    def distances(self, goals: int, safe: int) -> DistanceMap:
+        """The cost to go to `goals` from every state through the cells in `safe`
+        """
+        distance_map = self.cache.get(goals)
+        if distance_map is None or safe & distance_map.safe != distance_map.safe:
+            distance_map = self._build(goals, safe)
+            self.cache.put(goals, distance_map)
+        elif safe != distance_map.safe:
+            self._repair(distance_map, safe)
+        return distance_map
+
+    def plan(self, cell: int, heading: int, goals: int,
+             safe: int) -> Optional[Tuple[List[Action], int, int]]:
+        """Plan a cheapest route from `cell`, facing `heading`, to the nearest goal cell.
+        Goal cells need not be safe, the cells on the way must be.
+
+        Returns:
+            Optional[Tuple[List[Action], int, int]]: the actions, and the cell and
+            heading they end in; None if no goal can be reached
+        """
+        if not goals:
+            return None
+        if goals not in self.cache:
+            if goals not in self._requested:
+                self._requested.put(goals, True)
+                return self._search(cell, heading, goals, safe)
+        costs = self.distances(goals, safe).costs
+        state = cell * 4 + heading
+        if costs[state] >= UNREACHABLE:
+            return None
+        ahead = self._ahead
+        actions = []
+        while costs[state]:
+            cost = costs[state] - 1
+            (cell, heading) = divmod(state, 4)
+            forward = ahead[state]
+            if forward >= 0 and costs[forward * 4 + heading] == cost:
+                actions.append(Action.Forward)
+                state = forward * 4 + heading
+            elif costs[cell * 4 + TURN_LEFT[heading]] == cost:
+                actions.append(Action.TurnLeft)
+                state = cell * 4 + TURN_LEFT[heading]
+            else:
+                actions.append(Action.TurnRight)
+                state = cell * 4 + TURN_RIGHT[heading]
+        (cell, heading) = divmod(state, 4)
+        return (actions, cell, heading)
+
+    def _search(self, cell: int, heading: int, goals: int,
+                safe: int) -> Optional[Tuple[List[Action], int, int]]:
+        """Breadth-first search forwards from the agent's state to the nearest goal
+        """
+        start = cell * 4 + heading
+        parents = {start: None}
+        queue = deque([start])
+        ahead = self._ahead
+        while queue:
+            state = queue.popleft()
+            (cell, heading) = divmod(state, 4)
+            if goals >> cell & 1:
+                actions = []
+                while parents[state] is not None:
+                    (state, action) = parents[state]
+                    actions.append(action)
+                actions.reverse()
+                return (actions, cell, heading)
+            if state != start and not safe >> cell & 1:
+                continue
+            forward = ahead[state] * 4 + heading if ahead[state] >= 0 else -1
+            for (following, action) in ((forward, Action.Forward),
+                                        (cell * 4 + TURN_LEFT[heading], Action.TurnLeft),
+                                        (cell * 4 + TURN_RIGHT[heading], Action.TurnRight)):
+                if following >= 0 and following not in parents:
+                    parents[following] = (state, action)
+                    queue.append(following)
+        return None
+
+    def _build(self, goals: int, safe: int) -> DistanceMap:
+        costs = [UNREACHABLE] * (self.grid_width * self.grid_height * 4)
+        queue = deque()
+        remaining = goals
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            cell = low.bit_length() - 1
+            for heading in range(4):
+                costs[cell * 4 + heading] = 0
+                queue.append(cell * 4 + heading)
+        passable = safe & ~goals
+        behind = self._behind
+        while queue:
+            state = queue.popleft()
+            cost = costs[state] + 1
+            (cell, heading) = divmod(state, 4)
+            for previous in (cell * 4 + TURN_RIGHT[heading], cell * 4 + TURN_LEFT[heading],
+                             behind[state] * 4 + heading if behind[state] >= 0 else -1):
+                if previous >= 0 and costs[previous] > cost and passable >> (previous >> 2) & 1:
+                    costs[previous] = cost
+                    queue.append(previous)
+        return DistanceMap(goals, safe, costs)
+
+    def _repair(self, distance_map: DistanceMap, safe: int):
+        """Lower the costs of a map after `safe` grew: only the new cells, and the
+        states whose routes get shorter through them, are visited
+        """
+        self.repairs += 1
+        costs = distance_map.costs
+        goals = distance_map.goals
+        added = safe & ~distance_map.safe & ~goals
+        distance_map.safe = safe
+        passable = safe & ~goals
+        (ahead, behind) = (self._ahead, self._behind)
+        heap = []
+        while added:
+            low = added & -added
+            added ^= low
+            cell = low.bit_length() - 1
+            for heading in range(4):
+                state = cell * 4 + heading
+                forward = ahead[state]
+                best = costs[forward * 4 + heading] if forward >= 0 else UNREACHABLE
+                best = min(best, costs[cell * 4 + TURN_LEFT[heading]],
+                           costs[cell * 4 + TURN_RIGHT[heading]]) + 1
+                if best < costs[state]:
+                    costs[state] = best
+                    heapq.heappush(heap, (best, state))
+        while heap:
+            (cost, state) = heapq.heappop(heap)
+            if cost > costs[state]:
+                continue
+            cost += 1
+            (cell, heading) = divmod(state, 4)
+            for previous in (cell * 4 + TURN_RIGHT[heading], cell * 4 + TURN_LEFT[heading],
+                             behind[state] * 4 + heading if behind[state] >= 0 else -1):
+                if previous >= 0 and costs[previous] > cost and passable >> (previous >> 2) & 1:
+                    costs[previous] = cost
+                    heapq.heappush(heap, (cost, previous))
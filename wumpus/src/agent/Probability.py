@@ -0,0 +1,206 @@
+import random
+from typing import Dict, List, Tuple
+from wumpus.src.agent.Knowledge import KnowledgeState
+from wumpus.src.agent.Search import TranspositionTable
+
+
+class PitProbabilities():
+    """Exact pit probabilities of the cells next to breezy cells, given every breeze
+    (and lack of one) observed so far.
+
+    The constraints "at least one pit around this breezy cell" only link cells
+    that share a breezy neighbour, so the unknown cells split into independent
+    components. Each component is solved on its own and its result cached on its
+    constraints: a new percept only changes the components it touches, and the
+    others are looked up rather than solved again.
+    """
+    pit_prob: float
+    cache: TranspositionTable
+
+    def __init__(self, pit_prob: float, capacity: int = 1 << 12) -> None:
+        self.pit_prob = pit_prob
+        self.cache = TranspositionTable(capacity)
+
+    def constraints(self, knowledge: KnowledgeState) -> List[int]:
+        """For each breezy cell, the bitmap of neighbours that may still hold its pit
+        """
+        result = set()
+        breezy = knowledge.breezy
+        while breezy:
+            low = breezy & -breezy
+            breezy ^= low
+            result.add(knowledge.neighbor_mask(low.bit_length() - 1) & ~knowledge.no_pit)
+        return list(result)
+
+    def components(self, constraints: List[int]) -> List[Tuple[int, ...]]:
+        """Group the constraints sharing cells, each group sorted so it can be used as a key
+        """
+        groups: List[Tuple[int, List[int]]] = []
+        for constraint in constraints:
+            cells = constraint
+            members = [constraint]
+            rest = []
+            for group in groups:
+                if group[0] & cells:
+                    cells |= group[0]
+                    members += group[1]
+                else:
+                    rest.append(group)
+            rest.append((cells, members))
+            groups = rest
+        return [tuple(sorted(members)) for (_, members) in groups]
+
+    def update(self, knowledge: KnowledgeState) -> Dict[int, float]:
+        """The pit probability of every cell some breeze constrains. Any other cell
+        not known to be pit free has the prior `pit_prob`.
+        """
+        probabilities = {}
+        for component in self.components(self.constraints(knowledge)):
+            solved = self.cache.get(component)
+            if solved is None:
+                solved = self.solve(component)
+                self.cache.put(component, solved)
+            probabilities.update(solved)
+        return probabilities
+
+    def solve(self, component: Tuple[int, ...]) -> Dict[int, float]:
+        """Pit probabilities of the cells of one component
+        """
+        cells = self.order(component)
+        total = self._weight(component, cells, None)
+        if total == 0:
+            return {cell: 0.0 for cell in cells}
+        return {cell: self._weight(component, cells, cell) / total for cell in cells}
+
+    def weight(self, component: Tuple[int, ...]) -> float:
+        """The prior probability that every constraint of a component is met
+        """
+        return self._weight(component, self.order(component), None)
+
+    @staticmethod
+    def order(component: Tuple[int, ...]) -> List[int]:
+        """The cells of a component, ordered so constraints open and close close
+        together, keeping few of them open at a time while sweeping
+        """
+        cells = []
+        seen = 0
+        pending = [component[0]]
+        remaining = list(component[1:])
+        while pending:
+            constraint = pending.pop()
+            new = constraint & ~seen
+            seen |= constraint
+            while new:
+                low = new & -new
+                new ^= low
+                cells.append(low.bit_length() - 1)
+            still = []
+            for other in remaining:
+                (pending if other & seen else still).append(other)
+            remaining = still
+        return cells
+
+    def _weight(self, component: Tuple[int, ...], cells: List[int], forced: int) -> float:
+        """Total prior probability of the pit layouts of `cells` meeting every constraint
+        (with a pit in `forced`, if given), summed cell by cell over the set of open
+        constraints already met rather than over whole layouts
+        """
+        p = self.pit_prob
+        (touching, closing) = sweep_masks(component, cells)
+        states = {0: 1.0}
+        for (i, cell) in enumerate(cells):
+            following = {}
+            met = touching[i]
+            close = closing[i]
+            for (state, weight) in states.items():
+                branches = ((state | met, weight * p),) if cell == forced else \
+                    ((state, weight * (1 - p)), (state | met, weight * p))
+                for (next_state, next_weight) in branches:
+                    if next_state & close != close:
+                        continue
+                    next_state &= ~close
+                    following[next_state] = following.get(next_state, 0.0) + next_weight
+            states = following
+        return sum(states.values())
+
+
+def sweep_masks(component: Tuple[int, ...], cells: List[int]) -> Tuple[List[int], List[int]]:
+    """For each cell in sweep order, the constraints it meets and the constraints
+    it is the last cell of, as bitmaps over the constraints' positions in `component`
+    """
+    touching = [0] * len(cells)
+    closing = [0] * len(cells)
+    for (j, constraint) in enumerate(component):
+        last = None
+        for (i, cell) in enumerate(cells):
+            if constraint >> cell & 1:
+                touching[i] |= 1 << j
+                last = i
+        if last is not None:
+            closing[last] |= 1 << j
+    return (touching, closing)
+
+
+class PitSampler():
+    """Draws pit layouts of one component exactly from their distribution given its
+    constraints, with no rejected draws.
+
+    The same sweep as `PitProbabilities._weight` is run once backwards, giving for
+    every cell and set of open constraints the weight of the layouts of the
+    remaining cells that meet them all. A draw then walks the cells forwards, each
+    one a pit with its probability given the cells drawn before it.
+    """
+    cells: List[int]
+
+    def __init__(self, component: Tuple[int, ...], pit_prob: float) -> None:
+        cells = PitProbabilities.order(component)
+        (touching, closing) = sweep_masks(component, cells)
+        p = pit_prob
+        # forwards: the open constraint sets reachable before each cell
+        reachable = [{0}]
+        for i in range(len(cells)):
+            following = set()
+            for state in reachable[i]:
+                for next_state in (state, state | touching[i]):
+                    if next_state & closing[i] == closing[i]:
+                        following.add(next_state & ~closing[i])
+            reachable.append(following)
+        # backwards: the weight of completing each of them
+        completions = {state: 1.0 for state in reachable[-1]}
+        steps = [None] * len(cells)
+        for i in range(len(cells) - 1, -1, -1):
+            weights = {}
+            table = {}
+            for state in reachable[i]:
+                branches = []
+                for (next_state, prior) in ((state | touching[i], p), (state, 1 - p)):
+                    if next_state & closing[i] == closing[i]:
+                        next_state &= ~closing[i]
+                        branches.append((next_state, prior * completions.get(next_state, 0.0)))
+                    else:
+                        branches.append((next_state, 0.0))
+                ((pit_state, pit_weight), (clear_state, clear_weight)) = branches
+                total = pit_weight + clear_weight
+                weights[state] = total
+                table[state] = (pit_weight / total if total else 0.0, pit_state, clear_state)
+            completions = weights
+            steps[i] = table
+        if not completions.get(0):
+            raise ValueError("no pit layout meets the constraints")
+        self.cells = cells
+        self._steps = list(zip([1 << cell for cell in cells], steps))
+
+    def sample(self, rng: random.Random) -> int:
+        """Draw the bitmap of pits among the component's cells
+        """
+        draw = rng.random
+        pits = 0
+        state = 0
+        for (bit, table) in self._steps:
+            (q, pit_state, clear_state) = table[state]
+            if draw() < q:
+                pits |= bit
+                state = pit_state
+            else:
+                state = clear_state
+        return pits
@@ -0,0 +1,289 @@
+import math
+import random
+from typing import List, Optional, Tuple
+from wumpus.src.environment.Misc import Action
+from wumpus.src.environment.Misc import TURN_LEFT, TURN_RIGHT
+from wumpus.src.agent.Knowledge import KnowledgeState
+from wumpus.src.agent.Planning import moves
+from wumpus.src.agent.Probability import PitProbabilities, PitSampler
+from wumpus.src.agent.Search import TranspositionTable
+
+# A complete world drawn from a belief: (pit bitmap, wumpus cell, gold cell), the
+# wumpus cell being -1 once it is dead and the gold cell -1 once the agent holds it
+Layout = Tuple[int, int, int]
+
+# The state of a rollout: (cell * 4 + heading, has_gold, has_arrow, wumpus_alive)
+RolloutState = Tuple[int, bool, bool, bool]
+
+
+class BeliefSampler():
+    """Draws complete worlds consistent with a `KnowledgeState`, following the
+    generation rules of `Environment.__init__`: a pit in each cell but the origin
+    with probability `pit_prob`, the wumpus and the gold uniformly in the cells
+    with x >= 1 and y >= 1.
+
+    Every draw is consistent with the percepts, with no rejected draws: the pits
+    of each group of cells linked by breezes come from a `PitSampler`, the other
+    unknown cells are independent and drawn by skipping ahead geometrically to the
+    next pit, the wumpus from its remaining candidates and the gold from the cells
+    not visited yet.
+    """
+    pit_prob: float
+    probabilities: PitProbabilities
+    samplers: TranspositionTable
+
+    def __init__(self, pit_prob: float, capacity: int = 1 << 12) -> None:
+        self.pit_prob = pit_prob
+        self.probabilities = PitProbabilities(pit_prob)
+        self.samplers = TranspositionTable(capacity)
+        self._skip = math.log1p(-pit_prob) if 0 < pit_prob < 1 else None
+
+    def prepare(self, knowledge: KnowledgeState):
+        """Set up drawing worlds for `knowledge`, which `sample` then does without
+        looking at it again
+        """
+        k = knowledge
+        cells = k.grid_width * k.grid_height
+        components = self.probabilities.components(self.probabilities.constraints(k))
+        self._components = []
+        constrained = 0
+        for component in components:
+            sampler = self.samplers.get(component)
+            if sampler is None:
+                sampler = PitSampler(component, self.pit_prob)
+                self.samplers.put(component, sampler)
+            self._components.append(sampler.sample)
+            for constraint in component:
+                constrained |= constraint
+        known = k.no_pit | constrained | 1
+        self._free = [cell for cell in range(cells) if not known >> cell & 1]
+        candidates = k.wumpus_candidates if k.wumpus_alive else 0
+        self._wumpus = [cell for cell in range(cells) if candidates >> cell & 1] or [-1]
+        if k.has_gold:
+            self._gold = [-1]
+        else:
+            self._gold = [k.cell(x, y) for y in range(1, k.grid_height)
+                          for x in range(1, k.grid_width) if not k.visited >> k.cell(x, y) & 1]
+
+    def sample(self, rng: random.Random) -> Layout:
+        pits = 0
+        for draw in self._components:
+            pits |= draw(rng)
+        free = self._free
+        if self._skip is not None:
+            draw = rng.random
+            skip = self._skip
+            i = -1
+            while True:
+                # the number of pit-free cells before the next pit is geometric
+                i += 1 + int(math.log(1.0 - draw()) / skip)
+                if i >= len(free):
+                    break
+                pits |= 1 << free[i]
+        elif self.pit_prob >= 1:
+            for cell in free:
+                pits |= 1 << cell
+        return (pits, rng.choice(self._wumpus), rng.choice(self._gold))
+
+
+class RolloutEngine():
+    """Steps sampled worlds forward on plain integers, with the reward rules of
+    `Environment.transition` but none of its objects, so that many rollouts can be
+    run per decision.
+    """
+    grid_width: int
+    grid_height: int
+    allow_climb_without_gold: bool = False
+    stuck_reward: int = -1000
+
+    def __init__(self, grid_width: int, grid_height: int,
+                 allow_climb_without_gold: bool = False, stuck_reward: int = -1000) -> None:
+        """
+        Args:
+            grid_width (int):
+            grid_height (int):
+            allow_climb_without_gold (bool, optional): Defaults to False.
+            stuck_reward (int, optional): the value `estimate` gives a state from which
+                the episode cannot end without more risk. Defaults to -1000, as for an
+                agent wandering until a 1000 step limit.
+        """
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.stuck_reward = stuck_reward
+        (self._ahead, _) = moves(grid_width, grid_height)
+        cells = grid_width * grid_height
+        self._all = (1 << cells) - 1
+        first_column = 0
+        last_column = 0
+        for y in range(grid_height):
+            first_column |= 1 << (y * grid_width)
+            last_column |= 1 << (y * grid_width + grid_width - 1)
+        self._not_first_column = self._all & ~first_column
+        self._not_last_column = self._all & ~last_column
+
+    def step(self, layout: Layout, state: RolloutState,
+             action: Action) -> Tuple[RolloutState, int, bool]:
+        """Apply an action of a live agent
+
+        Returns:
+            Tuple[RolloutState, int, bool]: the new state, the reward and whether the
+            episode is over
+        """
+        (position, has_gold, has_arrow, wumpus_alive) = state
+        (cell, heading) = divmod(position, 4)
+        (pits, wumpus, gold) = layout
+        if action == Action.Forward:
+            ahead = self._ahead[position]
+            if ahead < 0:
+                return (state, -1, False)
+            death = (ahead == wumpus and wumpus_alive) or pits >> ahead & 1 == 1
+            has_gold = has_gold or ahead == gold
+            return ((ahead * 4 + heading, has_gold, has_arrow, wumpus_alive),
+                    -1001 if death else -1, death)
+        if action == Action.TurnLeft:
+            return ((cell * 4 + TURN_LEFT[heading], has_gold, has_arrow, wumpus_alive), -1, False)
+        if action == Action.TurnRight:
+            return ((cell * 4 + TURN_RIGHT[heading], has_gold, has_arrow, wumpus_alive), -1, False)
+        if action == Action.Grab:
+            return ((position, has_gold or cell == gold, has_arrow, wumpus_alive), -1, False)
+        if action == Action.Climb:
+            success = has_gold and cell == 0
+            return (state, 999 if success else -1,
+                    success or (self.allow_climb_without_gold and cell == 0))
+        if action == Action.Shoot:
+            killed = has_arrow and wumpus_alive and self._in_line_of_fire(position, wumpus)
+            return ((position, has_gold, False, wumpus_alive and not killed),
+                    -11 if has_arrow else -1, False)
+        raise ValueError("unknown action " + str(action))
+
+    def _in_line_of_fire(self, position: int, target: int) -> bool:
+        ahead = self._ahead
+        cell = ahead[position]
+        heading = position & 3
+        while cell >= 0:
+            if cell == target:
+                return True
+            cell = ahead[cell * 4 + heading]
+        return False
+
+    def run(self, layout: Layout, state: RolloutState,
+            actions: List[Action]) -> Tuple[RolloutState, int, bool]:
+        """Apply actions in turn, stopping once the episode is over
+
+        Returns:
+            Tuple[RolloutState, int, bool]: the last state, the total reward and whether
+            the episode is over
+        """
+        step = self.step
+        total = 0
+        for action in actions:
+            (state, reward, over) = step(layout, state, action)
+            total += reward
+            if over:
+                return (state, total, True)
+        return (state, total, False)
+
+    def distance(self, source: int, target: int, passable: int) -> Optional[int]:
+        """The fewest forward moves from cell `source` to cell `target` through the
+        cells in `passable`, turns not counted, or None if it cannot be reached
+        """
+        if source == target:
+            return 0
+        width = self.grid_width
+        not_first = self._not_first_column
+        not_last = self._not_last_column
+        goal = 1 << target
+        reached = 1 << source
+        steps = 0
+        while True:
+            grown = ((reached << 1) & not_first | (reached >> 1) & not_last
+                     | reached << width | reached >> width) & passable & ~reached
+            if not grown:
+                return None
+            steps += 1
+            if grown & goal:
+                return steps
+            reached |= grown
+
+    def estimate(self, layout: Layout, state: RolloutState) -> int:
+        """The return of finishing the episode in the sampled world as if it were
+        fully known: fetch the gold if it can be reached without dying and climb
+        out. Turns are not counted, so this is slightly optimistic.
+        """
+        (position, has_gold, _, wumpus_alive) = state
+        cell = position >> 2
+        (pits, wumpus, gold) = layout
+        passable = self._all & ~pits
+        if wumpus_alive and wumpus >= 0:
+            passable &= ~(1 << wumpus)
+        if has_gold:
+            home = self.distance(cell, 0, passable)
+            return self.stuck_reward if home is None else 999 - home
+        if gold >= 0:
+            to_gold = self.distance(cell, gold, passable)
+            if to_gold is not None:
+                home = self.distance(gold, 0, passable)
+                if home is not None:
+                    return 999 - to_gold - home
+        if self.allow_climb_without_gold:
+            home = self.distance(cell, 0, passable)
+            if home is not None:
+                return -1 - home
+        return self.stuck_reward
+
+    def simulate(self, layout: Layout, state: RolloutState, actions: List[Action]) -> int:
+        """The return of one rollout: `actions` stepped in the sampled world, then
+        the episode finished as by `estimate`
+        """
+        (state, total, over) = self.run(layout, state, actions)
+        return total if over else total + self.estimate(layout, state)
+
+
+def rollout_state(knowledge: KnowledgeState) -> RolloutState:
+    """The agent's current state, as known to it, as a rollout state
+    """
+    k = knowledge
+    return (k.location * 4 + k.heading, k.has_gold, k.has_arrow, k.wumpus_alive)
+
+
+def choose(options: List[List[Action]], knowledge: KnowledgeState, sampler: BeliefSampler,
+           engine: RolloutEngine, simulations: int, rng: random.Random,
+           exploration: float = 1.0) -> Tuple[int, List[float]]:
+    """Pick among sequences of actions by rollouts in worlds drawn from the belief,
+    spreading the simulations over them with UCB1
+
+    Args:
+        options (List[List[Action]]): the candidate action sequences
+        knowledge (KnowledgeState): what the agent knows
+        sampler (BeliefSampler): draws the worlds
+        engine (RolloutEngine): runs the rollouts
+        simulations (int): the total number of rollouts
+        rng (random.Random): the generator drawing the worlds
+        exploration (float, optional): the UCB1 exploration constant, in units of the
+            2000 point spread between dying and escaping with the gold. Defaults to 1.0.
+
+    Returns:
+        Tuple[int, List[float]]: the index of the option with the best mean return,
+        and the mean return of every option
+    """
+    if not options:
+        raise ValueError("no options to choose from")
+    sampler.prepare(knowledge)
+    state = rollout_state(knowledge)
+    sample = sampler.sample
+    simulate = engine.simulate
+    counts = [0] * len(options)
+    totals = [0.0] * len(options)
+    scale = exploration * 2000
+    for n in range(simulations):
+        if n < len(options):
+            i = n
+        else:
+            log_n = math.log(n)
+            i = max(range(len(options)), key=lambda o: totals[o] / counts[o]
+                    + scale * math.sqrt(log_n / counts[o]))
+        totals[i] += simulate(sample(rng), state, options[i])
+        counts[i] += 1
+    means = [totals[i] / counts[i] if counts[i] else -math.inf for i in range(len(options))]
+    return (max(range(len(options)), key=means.__getitem__), means)
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TranspositionTable():
+    """A bounded cache of values for search states, keyed on packed state keys
+    (see `Environment.state_key` and `KnowledgeState.key`). Once full, the least
+    recently used entry is evicted to make room for a new one.
+    """
+    capacity: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value stored for `key`, marking it as recently used
+        """
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key: Hashable, value: Any):
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[key] = value
+
+    def clear(self):
+        self._entries.clear()
@@ -1,38 +1,98 @@
-import copy
+from .Misc import Action
 from .Misc import OrientationState
 from .Misc import Orientation
 from .Misc import Coords
-from typing import Self
+from .Misc import TURN_LEFT, TURN_RIGHT, FORWARD_DX, FORWARD_DY
+from typing import Self, Union
 
+ORIGIN = Coords(0, 0)
 
 
 class Agent():
+    """The physical state of the agent in the cave. Agents are immutable values:
+    moving, turning etc. return a new `Agent`, so an earlier state can be kept
+    (or shared between environments) without copying it.
+    """
+    __slots__ = ('location', 'heading', 'has_gold', 'has_arrow', 'is_alive')
     location: Coords
-    orientation: Orientation = Orientation(OrientationState.North)
-    has_gold: bool = False
-    has_arrow: bool = True
-    is_alive: bool = True
+    heading: int
+    has_gold: bool
+    has_arrow: bool
+    is_alive: bool
 
-    def __init__(self, location: Coords = Coords(0,0), 
-                 orientation: Orientation = Orientation(OrientationState.East), 
+    def __init__(self, location: Coords = ORIGIN,
+                 orientation: Union[Orientation, OrientationState, int] = OrientationState.East,
                  has_gold: bool = False, has_arrow: bool = True, is_alive: bool = True):
-        self.location = location
-        self.orientation = orientation
-        self.has_gold = has_gold
-        self.has_arrow = has_arrow
-        self.is_alive = is_alive
-    
-    
-    def forward(self, grid_width: int, grid_height: int) -> Self:        
-        if self.orientation.state == OrientationState.West:
-            new_location = Coords(max(0, self.location.x - 1), self.location.y)
-        elif self.orientation.state == OrientationState.East:
-            new_location = Coords(min(grid_width - 1, self.location.x + 1), self.location.y)
-        elif self.orientation.state == OrientationState.North:
-            new_location = Coords(self.location.x, min(grid_height - 1, self.location.y+1))
-        elif self.orientation.state == OrientationState.South:
-            new_location = Coords(self.location.x, max(0, self.location.y - 1))
-            
-        new_agent = copy.copy(self)
-        new_agent.location = new_location
-        return new_agent
\ No newline at end of file
+        if type(orientation) is not int:
+            orientation = int(orientation.state if isinstance(orientation, Orientation) else orientation)
+        _set_location(self, location)
+        _set_heading(self, orientation)
+        _set_has_gold(self, has_gold)
+        _set_has_arrow(self, has_arrow)
+        _set_is_alive(self, is_alive)
+
+    def __setattr__(self, name: str, value: object):
+        raise AttributeError("Agent is immutable, use replace() to derive a new one")
+
+    def __copy__(self) -> Self:
+        return self
+
+    def __deepcopy__(self, memo) -> Self:
+        return self
+
+    def __reduce__(self):
+        return (Agent, (self.location, self.heading, self.has_gold, self.has_arrow, self.is_alive))
+
+    def __eq__(self, __o: object) -> bool:
+        if not isinstance(__o, Agent):
+            return NotImplemented
+        return self.location == __o.location and self.heading == __o.heading \
+            and self.has_gold == __o.has_gold and self.has_arrow == __o.has_arrow \
+            and self.is_alive == __o.is_alive
+
+    def __hash__(self) -> int:
+        return hash((self.location, self.heading, self.has_gold, self.has_arrow, self.is_alive))
+
+    @property
+    def orientation(self) -> OrientationState:
+        """The agent's heading as an `OrientationState`; turn the agent with `turn`
+        """
+        return OrientationState(self.heading)
+
+    def replace(self, location: Coords = None,
+                orientation: Union[Orientation, OrientationState, int] = None,
+                has_gold: bool = None, has_arrow: bool = None, is_alive: bool = None) -> Self:
+        """Return a copy of the agent with the given attributes changed
+        """
+        return Agent(self.location if location is None else location,
+                     self.heading if orientation is None else orientation,
+                     self.has_gold if has_gold is None else has_gold,
+                     self.has_arrow if has_arrow is None else has_arrow,
+                     self.is_alive if is_alive is None else is_alive)
+
+    def next_location(self, grid_width: int, grid_height: int) -> Coords:
+        """The location one step ahead, or the current one when that would leave the grid
+        """
+        location = self.location
+        dx = FORWARD_DX[self.heading]
+        if dx:
+            x = min(grid_width - 1, max(0, location.x + dx))
+            return location if x == location.x else Coords(x, location.y)
+        y = min(grid_height - 1, max(0, location.y + FORWARD_DY[self.heading]))
+        return location if y == location.y else Coords(location.x, y)
+
+    def forward(self, grid_width: int, grid_height: int) -> Self:
+        return Agent(self.next_location(grid_width, grid_height), self.heading,
+                     self.has_gold, self.has_arrow, self.is_alive)
+
+    def turn(self, action: Action) -> Self:
+        heading = TURN_LEFT[self.heading] if action == Action.TurnLeft else TURN_RIGHT[self.heading]
+        return Agent(self.location, heading, self.has_gold, self.has_arrow, self.is_alive)
+
+
+# Slot setters bypassing Agent.__setattr__, used only while constructing an Agent
+_set_location = Agent.location.__set__
+_set_heading = Agent.heading.__set__
+_set_has_gold = Agent.has_gold.__set__
+_set_has_arrow = Agent.has_arrow.__set__
+_set_is_alive = Agent.is_alive.__set__
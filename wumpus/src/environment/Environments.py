@@ -1,12 +1,48 @@
+import array
 import copy
 import random
-from typing import Self, Tuple
+import time
+from typing import Iterable, Optional, Self, Tuple
 from typing import List
 from wumpus.src.environment.Misc import Percept
 from wumpus.src.environment.Misc import Action
 from wumpus.src.environment.Misc import OrientationState
-from wumpus.src.environment.Agent import Agent
+from wumpus.src.environment.Agent import Agent, ORIGIN
 from wumpus.src.environment.Misc import Coords
+from wumpus.src.environment.Misc import CoordsList
+from wumpus.src.environment.Rendering import BoardRenderer
+from wumpus.src.environment.Metrics import Metrics
+
+class SequenceResult():
+    """The outcome of a sequence of actions run with `Environment.step_actions`
+    """
+    environment: "Environment"
+    percept: Percept
+    total_reward: int = 0
+    steps: int = 0
+    percept_bits: Optional[array.array] = None
+    rewards: Optional[array.array] = None
+
+    def __init__(self, environment: "Environment", percept: Percept, total_reward: int,
+                 steps: int, percept_bits: Optional[array.array] = None,
+                 rewards: Optional[array.array] = None):
+        """
+        Args:
+            environment (Environment): the environment after the actions
+            percept (Percept): the percept sensed after the last action taken
+            total_reward (int): the sum of the rewards of the actions taken
+            steps (int): the number of actions taken, fewer than given if the episode ended
+            percept_bits (array.array, optional): per action taken, its percept packed as
+                by `Percept.to_bits` (unsigned bytes)
+            rewards (array.array, optional): per action taken, its reward (signed shorts)
+        """
+        self.environment = environment
+        self.percept = percept
+        self.total_reward = total_reward
+        self.steps = steps
+        self.percept_bits = percept_bits
+        self.rewards = rewards
+
 
 class Environment():
     """A class to hold the environment configuration including methods for simulating 
@@ -16,44 +52,133 @@ class Environment():
     grid_height: int = 4
     pit_prob: float = 0.2
     allow_climb_without_gold: bool = False
-    agent: Agent = Agent()
-    pit_locations: List[Coords] = []
+    agent: Agent
+    _pit_locations: CoordsList
     terminated: bool = False
-    wumpus_location: Coords
+    _wumpus_location: Coords
+    _breeze_map: bytearray
+    _breeze_version: int = -1
+    _stench_map: bytearray
     wumpus_alive: bool = True
     gold_location: Coords
+    undo_log: List[Tuple] = None
+    metrics: Optional[Metrics] = None
     
     @classmethod
     def initialize(self, grid_width: int = 4, grid_height: int = 4, 
-                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False) -> Tuple[Self, Percept]:
-        e = Environment(grid_width, grid_height, pit_prob, allow_climb_without_gold)
-        percept = Percept(e.is_stench(), e.is_breeze(),
-                          False, False, False, False, 0)
-        return (e,percept)
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                 rng: Optional[random.Random] = None) -> Tuple[Self, Percept]:
+        e = Environment(grid_width, grid_height, pit_prob, allow_climb_without_gold, rng)
+        return (e, e.initial_percept())
+
+    def initial_percept(self) -> Percept:
+        """The percept sensed by the agent before its first action
+        """
+        return Percept(self.is_stench(), self.is_breeze(),
+                       False, False, False, False, 0)
     
+    @classmethod
+    def from_layout(cls, grid_width: int, grid_height: int, pit_locations: List[Coords],
+                    wumpus_location: Coords, gold_location: Coords,
+                    allow_climb_without_gold: bool = False, pit_prob: float = 0.2) -> Self:
+        """Build an environment with a given layout instead of a randomly generated one,
+        with the agent at the origin facing East
+        """
+        e = cls.__new__(cls)
+        e.grid_width = grid_width
+        e.grid_height = grid_height
+        e.pit_prob = pit_prob
+        e.allow_climb_without_gold = allow_climb_without_gold
+        e.pit_locations = pit_locations
+        e.agent = Agent()
+        e.wumpus_location = wumpus_location
+        e.gold_location = gold_location
+        return e
+
     def __init__(self, grid_width: int = 4, grid_height: int = 4, 
-                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False) -> None:
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                 rng: Optional[random.Random] = None) -> None:
+        """Generate a random world
+
+        Args:
+            grid_width (int, optional): Defaults to 4.
+            grid_height (int, optional): Defaults to 4.
+            pit_prob (float, optional): probability of a pit in each cell but the origin. Defaults to 0.2.
+            allow_climb_without_gold (bool, optional): Defaults to False.
+            rng (random.Random, optional): the generator drawing the world, so worlds can be
+                reproduced. Defaults to None, meaning the global `random` generator.
+        """
+        if rng is None:
+            rng = random
         self.grid_height = grid_height
         self.grid_width = grid_width
         self.pit_prob = pit_prob
         self.allow_climb_without_gold = allow_climb_without_gold
         
         def random_location_except_origin() -> Coords:
-            x = random.randint(1, self.grid_width - 1)
-            y = random.randint(1, self.grid_height - 1)
+            x = rng.randint(1, self.grid_width - 1)
+            y = rng.randint(1, self.grid_height - 1)
             return Coords(x, y)
         
         generate_pit_locations = lambda w, h : [Coords(x, y) for x in range(0, w)
                             for y in range(0, h) if (x != 0 or y != 0)
-                            and random.random() < self.pit_prob]
+                            and rng.random() < self.pit_prob]
         self.pit_locations = generate_pit_locations(self.grid_width, self.grid_height)
         
         self.agent = Agent()
         self.wumpus_location = random_location_except_origin()
         self.gold_location = random_location_except_origin()
 
+    @property
+    def pit_locations(self) -> CoordsList:
+        return self._pit_locations
+
+    @pit_locations.setter
+    def pit_locations(self, pit_locations: List[Coords]):
+        self._pit_locations = pit_locations if isinstance(pit_locations, CoordsList) \
+            else CoordsList(pit_locations)
+        # built now rather than on first sense, so that clones share one map
+        self.breeze_map()
+
+    @property
+    def wumpus_location(self) -> Coords:
+        return self._wumpus_location
+
+    @wumpus_location.setter
+    def wumpus_location(self, wumpus_location: Coords):
+        self._wumpus_location = wumpus_location
+        # the wumpus only moves when placed, so a full rebuild here is cheap
+        stench_map = bytearray(self.grid_width * self.grid_height)
+        for c in self.adjacent_cells(wumpus_location):
+            stench_map[c.y * self.grid_width + c.x] = 1
+        self._stench_map = stench_map
+
+    def breeze_map(self) -> bytearray:
+        """Return the number of in-grid pits adjacent to each cell, indexed by
+        `y * grid_width + x`. The map is rebuilt only if the pit locations changed.
+        """
+        pit_locations = self._pit_locations
+        if self._breeze_version != pit_locations.version:
+            width = self.grid_width
+            breeze_map = bytearray(width * self.grid_height)
+            for p in pit_locations:
+                for c in self.adjacent_cells(p):
+                    breeze_map[c.y * width + c.x] += 1
+            self._breeze_map = breeze_map
+            self._breeze_version = pit_locations.version
+        return self._breeze_map
+
+    def stench_map(self) -> bytearray:
+        """Return 1 for each cell adjacent to the wumpus and 0 elsewhere,
+        indexed by `y * grid_width + x`
+        """
+        return self._stench_map
+
+    def in_grid(self, coords: Coords) -> bool:
+        return 0 <= coords.x < self.grid_width and 0 <= coords.y < self.grid_height
+
     def is_pit_at(self, coords: Coords) -> bool:
-        return coords in self.pit_locations
+        return coords in self._pit_locations
 
     def is_wumpus_at(self, coords: Coords) -> bool:
         return coords == self.wumpus_location
@@ -68,136 +193,257 @@ class Environment():
         return coords == self.gold_location
 
     def wumpus_in_line_of_fire(self):
-        if self.agent.orientation.state == OrientationState.West:
-            return self.agent.location.x > self.wumpus_location.x and self.agent.location.y == self.wumpus_location.y
-        elif self.agent.orientation.state == OrientationState.East:
-            return self.agent.location.x < self.wumpus_location.x and self.agent.location.y == self.wumpus_location.y
-        elif self.agent.orientation.state == OrientationState.North:
-            return self.agent.location.x == self.wumpus_location.x and self.agent.location.y < self.wumpus_location.y
-        elif self.agent.orientation.state == OrientationState.South:
-            return self.agent.location.x == self.wumpus_location.x and self.agent.location.y > self.wumpus_location.y                                                
+        heading = self.agent.heading
+        location = self.agent.location
+        if heading == OrientationState.West:
+            return location.x > self.wumpus_location.x and location.y == self.wumpus_location.y
+        elif heading == OrientationState.East:
+            return location.x < self.wumpus_location.x and location.y == self.wumpus_location.y
+        elif heading == OrientationState.North:
+            return location.x == self.wumpus_location.x and location.y < self.wumpus_location.y
+        elif heading == OrientationState.South:
+            return location.x == self.wumpus_location.x and location.y > self.wumpus_location.y
     
     def kill_attempt_successful(self) -> bool:        
         return self.agent.has_arrow and self.wumpus_alive and self.wumpus_in_line_of_fire()
     
     def adjacent_cells(self, coords: Coords) -> List[Coords]:
-        neighbors = lambda x, y : [Coords(x2, y2) for x2 in range(x-1, x+2)
-                                    for y2 in range(y-1, y+2)
-                                    if (-1 < x < self.grid_width and
-                                        -1 < y < self.grid_height and
-                                        (x != x2 or y != y2) and
-                                        (x == x2 or y == y2) and
-                                        (0 <= x2 < self.grid_width) and
-                                        (0 <= y2 < self.grid_height))]
-        return neighbors(coords.x, coords.y)
+        x, y = coords.x, coords.y
+        if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+            return []
+        neighbors = []
+        if x > 0:
+            neighbors.append(Coords(x - 1, y))
+        if y > 0:
+            neighbors.append(Coords(x, y - 1))
+        if y < self.grid_height - 1:
+            neighbors.append(Coords(x, y + 1))
+        if x < self.grid_width - 1:
+            neighbors.append(Coords(x + 1, y))
+        return neighbors
     
     def is_pit_adjacent(self, coords: Coords) -> bool:
-        for p in self.pit_locations:
-            if p in self.adjacent_cells(coords):
-                return True
-        return False
+        return self.in_grid(coords) and \
+            self.breeze_map()[coords.y * self.grid_width + coords.x] > 0
     
     def is_wumpus_adjacent(self, coords: Coords) -> bool:
-        if self.wumpus_location in self.adjacent_cells(coords):
-            return True
-        return False
+        return self.in_grid(coords) and \
+            self._stench_map[coords.y * self.grid_width + coords.x] > 0
     
     def is_breeze(self) -> bool:
-        return self.is_pit_adjacent(self.agent.location)
+        location = self.agent.location
+        return self.breeze_map()[location.y * self.grid_width + location.x] > 0
     
     def is_stench(self) -> bool:
-        return self.is_wumpus_adjacent(self.agent.location)    
-    
-    def apply_action(self, action: Action) -> Tuple[Self, Percept]:
+        location = self.agent.location
+        return self._stench_map[location.y * self.grid_width + location.x] > 0
+
+    def state_key(self) -> int:
+        """Pack the dynamic state of the environment into one integer, equal for
+        two states of the same world exactly when the states are the same.
+
+        From the least significant bit: heading (2 bits), has_gold, has_arrow,
+        wumpus_alive, is_alive, terminated, then the agent's cell index
+        `y * grid_width + x`.
+        """
+        agent = self.agent
+        return agent.heading | agent.has_gold << 2 | agent.has_arrow << 3 \
+            | self.wumpus_alive << 4 | agent.is_alive << 5 | self.terminated << 6 \
+            | (agent.location.y * self.grid_width + agent.location.x) << 7
+
+    def clone(self) -> Self:
+        """Return a copy of the environment that can be stepped independently.
+
+        Pits never change during an episode and agents are immutable, so both
+        are shared rather than copied; only the per-step state is duplicated.
+        """
+        new_environment = copy.copy(self)
+        new_environment.undo_log = None
+        return new_environment
+
+    def snapshot(self) -> Tuple:
+        """Capture the mutable state of the environment in O(1), to be passed
+        back to `restore`
+        """
+        return (self.agent, self.gold_location, self.wumpus_alive, self.terminated)
+
+    def restore(self, snapshot: Tuple) -> None:
+        """Return the environment to the state captured by `snapshot`
+        """
+        (self.agent, self.gold_location, self.wumpus_alive, self.terminated) = snapshot
+
+    def enable_undo(self) -> None:
+        """Start recording a snapshot before every `step`, so that steps can be
+        taken back with `undo`
+        """
+        self.undo_log = []
+
+    def undo(self) -> None:
+        """Take back the most recent `step`
+        """
+        self.restore(self.undo_log.pop())
+
+    def step(self, action: Action) -> Percept:
+        """Apply an action to this environment in place, without copying it.
+
+        Args:
+            action (Action): the action taken by the agent
+
+        Returns:
+            Percept: the percept sensed after the action, identical to the one
+            `apply_action` returns for the same action
+        """
+        if self.undo_log is not None:
+            self.undo_log.append(self.snapshot())
         if self.terminated:
-            return (
-                self,
-                Percept(False, False, False, False, False, True, 0)
-            )
-        
+            return Percept(False, False, False, False, False, True, 0)
+        if self.metrics is not None:
+            return self._measured_step(action)
+        (bump, scream, reward) = self.transition(action)
+        return Percept(self.is_stench(), self.is_breeze(), self.is_glitter(),
+                       bump, scream, self.terminated, reward)
+
+    def _measured_step(self, action: Action) -> Percept:
+        clock = time.perf_counter_ns
+        start = clock()
+        (bump, scream, reward) = self.transition(action)
+        moved = clock()
+        percept = Percept(self.is_stench(), self.is_breeze(), self.is_glitter(),
+                          bump, scream, self.terminated, reward)
+        self.metrics.record("percept", clock() - moved)
+        self.metrics.record_action(action, moved - start)
+        return percept
+
+    def transition(self, action: Action) -> Tuple[bool, bool, int]:
+        """Update the state for an action of a live agent. The stench, breeze, glitter
+        and termination parts of the percept are read off the new state.
+
+        Returns:
+            Tuple[bool, bool, int]: the bump and scream parts of the percept, and the reward
+        """
+        agent = self.agent
         if action == Action.Forward:
-            new_agent = self.agent.forward(self.grid_width, self.grid_height)
-            death = (self.is_wumpus_at(new_agent.location) and self.wumpus_alive) \
-                    or self.is_pit_at(new_agent.location) 
+            new_location = agent.next_location(self.grid_width, self.grid_height)
+            death = (self.is_wumpus_at(new_location) and self.wumpus_alive) \
+                    or self.is_pit_at(new_location)
             # update environment/ agent
-            new_agent.is_alive = not death
-            new_agent.has_gold = self.agent.has_gold or self.gold_location == new_agent.location
-            
-            new_environment = copy.deepcopy(self)
-            new_environment.agent = new_agent
-            new_environment.gold_location = new_agent.location if new_agent.has_gold else new_environment.gold_location
-            
-            return (
-                new_environment,
-                Percept(new_environment.is_stench(), new_environment.is_breeze(), 
-                        new_environment.is_glitter(), new_agent.location == self.agent.location, 
-                        False, not new_agent.is_alive, 
-                        -1 if new_agent.is_alive else -1001)
-            )
-        elif action == Action.TurnLeft or action == Action.TurnRight:
-            self.agent.orientation.turn(action)
-            return (
-                self,
-                Percept(self.is_stench(), self.is_breeze(), 
-                           self.is_glitter(), False, 
-                           False, False, 
-                           -1)
-            )
-        elif action == Action.Grab:
-            new_agent = copy.copy(self.agent)
-            new_agent.has_gold = self.is_glitter()
-            new_environment = copy.deepcopy(self)
-            new_environment.gold_location = new_agent.location if new_agent.has_gold else self.gold_location
-            new_environment.agent = new_agent
+            has_gold = agent.has_gold or self.gold_location == new_location
+            self.agent = Agent(new_location, agent.heading, has_gold, agent.has_arrow, not death)
+            if has_gold:
+                self.gold_location = new_location
+            self.terminated = death
+            return (new_location == agent.location, False, -1001 if death else -1)
+        if action == Action.TurnLeft or action == Action.TurnRight:
+            self.agent = agent.turn(action)
+            return (False, False, -1)
+        if action == Action.Grab:
+            glitter = self.is_glitter()
+            self.agent = Agent(agent.location, agent.heading, glitter,
+                               agent.has_arrow, agent.is_alive)
+            if glitter:
+                self.gold_location = agent.location
+            return (False, False, -1)
+        if action == Action.Climb:
+            at_start_location = agent.location == ORIGIN
+            success = agent.has_gold and at_start_location
+            self.terminated = success or (self.allow_climb_without_gold and at_start_location)
+            return (False, False, 999 if success else -1)
+        if action == Action.Shoot:
+            had_arrow = agent.has_arrow
+            wumpus_killed = self.kill_attempt_successful()
+            self.agent = Agent(agent.location, agent.heading, agent.has_gold, False, agent.is_alive)
+            self.wumpus_alive = self.wumpus_alive and not wumpus_killed
+            return (False, wumpus_killed, -11 if had_arrow else -1)
+        raise ValueError("unknown action " + str(action))
+
+    def step_actions(self, actions: Iterable[Action], per_step: bool = False) -> SequenceResult:
+        """Apply a sequence of actions to this environment in place, stopping early
+        once the episode ends. No `Percept` is built for the intermediate steps.
+
+        Args:
+            actions (Iterable[Action]): the actions, in order
+            per_step (bool, optional): also return every step's percept bits and reward
+                as compact arrays. Defaults to False.
+
+        Returns:
+            SequenceResult: this environment, the last percept and the total reward
+        """
+        percept_bits = array.array("B") if per_step else None
+        rewards = array.array("h") if per_step else None
+        if self.metrics is not None or self.undo_log is not None:
+            # keep measuring/ logging each step
+            return self._step_actions_one_by_one(actions, percept_bits, rewards)
+        if self.terminated:
+            return SequenceResult(self, Percept(False, False, False, False, False, True, 0),
+                                  0, 0, percept_bits, rewards)
+        transition = self.transition
+        total_reward = 0
+        steps = 0
+        (bump, scream, reward) = (False, False, 0)
+        for action in actions:
+            (bump, scream, reward) = transition(action)
+            total_reward += reward
+            steps += 1
+            if per_step:
+                percept_bits.append(self.is_stench() | self.is_breeze() << 1
+                                    | self.is_glitter() << 2 | bump << 3 | scream << 4
+                                    | self.terminated << 5)
+                rewards.append(reward)
+            if self.terminated:
+                break
+        percept = Percept(self.is_stench(), self.is_breeze(), self.is_glitter(),
+                          bump, scream, self.terminated, reward)
+        return SequenceResult(self, percept, total_reward, steps, percept_bits, rewards)
+
+    def _step_actions_one_by_one(self, actions: Iterable[Action], percept_bits: array.array,
+                                 rewards: array.array) -> SequenceResult:
+        percept = Percept(False, False, False, False, False, True, 0) if self.terminated \
+            else Percept(self.is_stench(), self.is_breeze(), self.is_glitter(), False, False,
+                         False, 0)
+        total_reward = 0
+        steps = 0
+        for action in actions:
+            if self.terminated:
+                break
+            percept = self.step(action)
+            total_reward += percept.reward
+            steps += 1
+            if percept_bits is not None:
+                percept_bits.append(percept.to_bits())
+                rewards.append(percept.reward)
+        return SequenceResult(self, percept, total_reward, steps, percept_bits, rewards)
+
+    def apply_actions(self, actions: Iterable[Action], per_step: bool = False) -> SequenceResult:
+        """Apply a sequence of actions to a copy of this environment, leaving this one
+        untouched. Only one copy is made, however many actions there are. See `step_actions`.
+        """
+        if self.terminated:
+            return self.step_actions(actions, per_step)
+        return self.clone().step_actions(actions, per_step)
+
+    def apply_action(self, action: Action) -> Tuple[Self, Percept]:
+        """Apply an action to a copy of this environment, leaving this one untouched.
+
+        Args:
+            action (Action): the action taken by the agent
+
+        Returns:
+            Tuple[Self, Percept]: the environment after the action and the percept sensed in it
+        """
+        if self.terminated:
             return (
-                new_environment,
-                Percept(self.is_stench(), self.is_breeze(), 
-                           self.is_glitter(), False, 
-                           False, False, 
-                           -1)                
-            )
-        elif action == Action.Climb:
-            at_start_location = self.agent.location == Coords(0,0)
-            success = self.agent.has_gold and at_start_location
-            is_terminated = success or (self.allow_climb_without_gold and at_start_location)
-            return(
                 self,
-                Percept(self.is_stench(), self.is_breeze(), self.is_glitter(), False, False, is_terminated, 
-                        999 if success else -1)
-            )
-        elif action == Action.Shoot:
-            had_arrow = self.agent.has_arrow
-            wumpus_killed = self.kill_attempt_successful()
-            new_agent = copy.copy(self.agent)
-            new_agent.has_arrow = False
-            
-            new_environment = copy.deepcopy(self)
-            new_environment.agent = new_agent
-            new_environment.wumpus_alive = new_environment.wumpus_alive and not wumpus_killed
-            return(
-                new_environment,
-                Percept(self.is_stench(), self.is_breeze(), self.is_glitter(), False,
-                        wumpus_killed, False, -11 if had_arrow else -1)
+                Percept(False, False, False, False, False, True, 0)
             )
-    
+        if self.metrics is not None:
+            start = time.perf_counter_ns()
+            new_environment = self.clone()
+            self.metrics.record("copy", time.perf_counter_ns() - start)
+        else:
+            new_environment = self.clone()
+        return (new_environment, new_environment.step(action))
+
     def visualize(self) -> str:
-        wumpus_symbol = "W" if self.wumpus_alive else "w"
-        
-        board = ""
-        board += '  ---------------------\n'
-        for y in range(self.grid_height-1 , -1, -1):
-            board += str(y + 1).zfill(2) + "|"
-            for x in range(0, self.grid_width):
-                posn = Coords(x, y)
-                isA = "A" if self.is_agent_at(posn) else " "
-                isP = "P" if self.is_pit_at(posn) else " "
-                isG = "G" if self.is_gold_at(posn) else " "
-                isW = wumpus_symbol if self.is_wumpus_at(posn) else " "
-                sym =  isA + isP + isG + isW
-                board += sym
-                board += "|"
-            board += "\n"
-        board += '  ---------------------'
-        colsIdx = [str(x+1).zfill(2) for x in range(0, self.grid_width)]
-        board += '\n    ' + '   '.join(colsIdx)
-        return board
\ No newline at end of file
+        """Draw the board as text, see `BoardRenderer`
+        """
+        return BoardRenderer.for_grid(self.grid_width, self.grid_height).render(self)
@@ -0,0 +1,104 @@
+import array
+import random
+from typing import MutableSequence, Optional
+from wumpus.src.environment.Environments import Environment
+
+# Entries of the observation buffer written by `GymEnvironment`
+STENCH = 0
+BREEZE = 1
+GLITTER = 2
+BUMP = 3
+SCREAM = 4
+DONE = 5
+REWARD = 6
+OBSERVATION_SIZE = 7
+
+
+class GymEnvironment():
+    """A `reset()`/`step()` interface to `Environment` for training loops. Rather
+    than returning a new `Percept` each step, the observation (stench, breeze,
+    glitter, bump, scream, done, reward) is written into one buffer, given by the
+    caller or allocated once, and the same buffer is returned every time.
+
+    The buffer may be anything indexable and writable with at least
+    `OBSERVATION_SIZE` entries, e.g. a row of a NumPy array or an `array.array`.
+    """
+    grid_width: int = 4
+    grid_height: int = 4
+    pit_prob: float = 0.2
+    allow_climb_without_gold: bool = False
+    environment: Environment = None
+    observation: MutableSequence[int]
+
+    def __init__(self, grid_width: int = 4, grid_height: int = 4, pit_prob: float = 0.2,
+                 allow_climb_without_gold: bool = False, seed: Optional[int] = None,
+                 observation: Optional[MutableSequence[int]] = None) -> None:
+        if observation is None:
+            observation = array.array("i", bytes(4 * OBSERVATION_SIZE))
+        elif len(observation) < OBSERVATION_SIZE:
+            raise ValueError("observation buffer needs " + str(OBSERVATION_SIZE) + " entries")
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pit_prob = pit_prob
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.rng = random.Random(seed)
+        self.observation = observation
+        self.environment = None
+
+    def reset(self, seed: Optional[int] = None,
+              environment: Optional[Environment] = None) -> MutableSequence[int]:
+        """Start a new episode in a new random world, or in a copy of `environment`
+
+        Args:
+            seed (int, optional): reseed the world generator first. Defaults to None.
+            environment (Environment, optional): a world to play (left untouched)
+                instead of generating one. Defaults to None.
+
+        Returns:
+            MutableSequence[int]: the observation buffer, holding the initial observation
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        if environment is None:
+            environment = Environment(self.grid_width, self.grid_height, self.pit_prob,
+                                      self.allow_climb_without_gold, self.rng)
+        else:
+            environment = environment.clone()
+        self.environment = environment
+        observation = self.observation
+        observation[STENCH] = environment.is_stench()
+        observation[BREEZE] = environment.is_breeze()
+        observation[GLITTER] = 0
+        observation[BUMP] = 0
+        observation[SCREAM] = 0
+        observation[DONE] = 0
+        observation[REWARD] = 0
+        return observation
+
+    def step(self, action: int) -> MutableSequence[int]:
+        """Apply an action (an `Action` or its value) to the current episode
+
+        Returns:
+            MutableSequence[int]: the observation buffer, overwritten with the observation
+            after the action. Once the episode is done, every step observes only done
+            with no reward.
+        """
+        environment = self.environment
+        if environment is None:
+            raise AttributeError("reset() must be called before step()")
+        observation = self.observation
+        if environment.terminated:
+            observation[STENCH] = observation[BREEZE] = observation[GLITTER] = 0
+            observation[BUMP] = observation[SCREAM] = 0
+            observation[DONE] = 1
+            observation[REWARD] = 0
+            return observation
+        (bump, scream, reward) = environment.transition(action)
+        observation[STENCH] = environment.is_stench()
+        observation[BREEZE] = environment.is_breeze()
+        observation[GLITTER] = environment.is_glitter()
+        observation[BUMP] = bump
+        observation[SCREAM] = scream
+        observation[DONE] = environment.terminated
+        observation[REWARD] = reward
+        return observation
@@ -0,0 +1,193 @@
+import math
+import random
+from collections import OrderedDict
+from typing import Iterator
+from wumpus.src.environment.Agent import Agent
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.Misc import Coords, CoordsList
+
+
+class PitChunks():
+    """The pits of a grid, drawn a square chunk of cells at a time as they are
+    looked up. Each chunk's pits are derived from the seed and the chunk's
+    position alone, so a chunk evicted to make room is drawn again identically
+    when it is next needed. At most `capacity` chunks are held, the least
+    recently used being evicted first, so memory follows the region looked at
+    rather than the size of the grid.
+
+    Supports `in` with `Coords`, like the `CoordsList` of an `Environment`.
+    """
+    grid_width: int
+    grid_height: int
+    pit_prob: float
+    seed: int
+    chunk_size: int
+    capacity: int
+    version: int
+    generated: int = 0
+    evictions: int = 0
+
+    def __init__(self, grid_width: int, grid_height: int, pit_prob: float, seed: int = 0,
+                 chunk_size: int = 64, capacity: int = 256) -> None:
+        if chunk_size < 1 or capacity < 1:
+            raise ValueError("chunk_size and capacity must be at least 1")
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pit_prob = pit_prob
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.capacity = capacity
+        # the pits never change, so neither does the version
+        self.version = CoordsList().version
+        self.generated = 0
+        self.evictions = 0
+        self._across = -(-grid_width // chunk_size)
+        self._chunks = OrderedDict()
+        self._last = (None, None)
+
+    def __len__(self) -> int:
+        """The number of chunks held
+        """
+        return len(self._chunks)
+
+    def chunk(self, cx: int, cy: int) -> bytearray:
+        """The pits of chunk (cx, cy), one byte per cell indexed
+        `(y % chunk_size) * chunk_size + x % chunk_size`
+        """
+        key = cy * self._across + cx
+        (last_key, last_chunk) = self._last
+        if key == last_key:
+            return last_chunk
+        chunks = self._chunks
+        chunk = chunks.get(key)
+        if chunk is None:
+            if len(chunks) >= self.capacity:
+                chunks.popitem(last=False)
+                self.evictions += 1
+            chunk = chunks[key] = self._generate(cx, cy, key)
+        else:
+            chunks.move_to_end(key)
+        self._last = (key, chunk)
+        return chunk
+
+    def _generate(self, cx: int, cy: int, key: int) -> bytearray:
+        size = self.chunk_size
+        chunk = bytearray(size * size)
+        p = self.pit_prob
+        width = min(size, self.grid_width - cx * size)
+        cells = width * min(size, self.grid_height - cy * size)
+        if p > 0:
+            # the generator depends only on the seed and the chunk
+            draw = random.Random(self.seed << 64 | key).random
+            skip = math.log1p(-p) if p < 1 else None
+            i = -1
+            while True:
+                # the number of pit-free cells before the next pit is geometric
+                i += 1 if skip is None else 1 + int(math.log(1.0 - draw()) / skip)
+                if i >= cells:
+                    break
+                (y, x) = divmod(i, width)
+                chunk[y * size + x] = 1
+        if key == 0:
+            # never a pit at the origin
+            chunk[0] = 0
+        self.generated += 1
+        return chunk
+
+    def is_pit(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+            return False
+        size = self.chunk_size
+        (cx, px) = divmod(x, size)
+        (cy, py) = divmod(y, size)
+        return self.chunk(cx, cy)[py * size + px] == 1
+
+    def __contains__(self, coords: Coords) -> bool:
+        return self.is_pit(coords.x, coords.y)
+
+    def __iter__(self) -> Iterator[Coords]:
+        """Every pit on the grid, which draws every chunk: only sensible for small grids
+        """
+        for y in range(self.grid_height):
+            for x in range(self.grid_width):
+                if self.is_pit(x, y):
+                    yield Coords(x, y)
+
+
+class LazyEnvironment(Environment):
+    """An `Environment` for very large grids, whose pits are drawn lazily by a
+    `PitChunks` instead of listed up front. Percepts only look at the cells
+    around the agent, and no full breeze or stench map is ever built, so a
+    10,000x10,000 world starts at once and holds only the chunks the agent
+    came near.
+
+    The wumpus and gold are placed as `Environment.__init__` places them, from
+    a generator seeded with `seed`. The pits are drawn with the same
+    probability per cell, but not from the same random stream, so a lazy world
+    differs from the eager world of the same seed.
+    """
+    seed: int = 0
+
+    def __init__(self, grid_width: int = 4, grid_height: int = 4,
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                 seed: int = 0, chunk_size: int = 64, max_chunks: int = 256) -> None:
+        """Generate a random world lazily
+
+        Args:
+            grid_width (int, optional): Defaults to 4.
+            grid_height (int, optional): Defaults to 4.
+            pit_prob (float, optional): probability of a pit in each cell but the origin. Defaults to 0.2.
+            allow_climb_without_gold (bool, optional): Defaults to False.
+            seed (int, optional): the world's seed. Defaults to 0.
+            chunk_size (int, optional): width and height of a chunk of cells. Defaults to 64.
+            max_chunks (int, optional): chunks held before the coldest is evicted. Defaults to 256.
+        """
+        rng = random.Random(seed)
+        self.grid_height = grid_height
+        self.grid_width = grid_width
+        self.pit_prob = pit_prob
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.seed = seed
+        self._pit_locations = PitChunks(grid_width, grid_height, pit_prob, seed,
+                                        chunk_size, max_chunks)
+        self.agent = Agent()
+        self.wumpus_location = Coords(rng.randint(1, grid_width - 1),
+                                      rng.randint(1, grid_height - 1))
+        self.gold_location = Coords(rng.randint(1, grid_width - 1),
+                                    rng.randint(1, grid_height - 1))
+
+    @property
+    def pit_locations(self) -> PitChunks:
+        return self._pit_locations
+
+    @property
+    def wumpus_location(self) -> Coords:
+        return self._wumpus_location
+
+    @wumpus_location.setter
+    def wumpus_location(self, wumpus_location: Coords):
+        self._wumpus_location = wumpus_location
+
+    def breeze_map(self) -> bytearray:
+        raise ValueError("a lazy environment has no breeze map, use is_pit_adjacent")
+
+    def stench_map(self) -> bytearray:
+        raise ValueError("a lazy environment has no stench map, use is_wumpus_adjacent")
+
+    def is_pit_adjacent(self, coords: Coords) -> bool:
+        if not self.in_grid(coords):
+            return False
+        (x, y) = (coords.x, coords.y)
+        is_pit = self._pit_locations.is_pit
+        return is_pit(x - 1, y) or is_pit(x + 1, y) or is_pit(x, y - 1) or is_pit(x, y + 1)
+
+    def is_wumpus_adjacent(self, coords: Coords) -> bool:
+        wumpus = self._wumpus_location
+        return self.in_grid(coords) and \
+            abs(coords.x - wumpus.x) + abs(coords.y - wumpus.y) == 1
+
+    def is_breeze(self) -> bool:
+        return self.is_pit_adjacent(self.agent.location)
+
+    def is_stench(self) -> bool:
+        return self.is_wumpus_adjacent(self.agent.location)
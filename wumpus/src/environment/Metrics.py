@@ -0,0 +1,112 @@
+from typing import Dict, List, Self
+
+# Histogram buckets: bucket i counts durations of [2**(i-1), 2**i) nanoseconds
+BUCKETS = 64
+
+
+class Histogram():
+    """Durations counted in power-of-two nanosecond buckets, so adding one is a
+    couple of integer operations however many are recorded
+    """
+    buckets: List[int]
+    count: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    def __init__(self) -> None:
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int):
+        self.buckets[min(ns.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def merge(self, other: Self) -> Self:
+        for (i, n) in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        return self
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> int:
+        """An upper bound on the `q` quantile: the top of the bucket it falls in
+        """
+        wanted = q * self.count
+        seen = 0
+        for (i, n) in enumerate(self.buckets):
+            seen += n
+            if n and seen >= wanted:
+                return min(1 << i, self.max_ns)
+        return 0
+
+
+class Metrics():
+    """Counters and timing histograms collected from an instrumented run.
+
+    Timings are kept by name: "generate" (world generation), "decide" (the
+    agent choosing an action), "copy" (cloning in `apply_action`), "percept"
+    (building the percept) and "transition.<action>" (updating the state for
+    each action type). Set as `Environment.metrics` or passed to `run_episode`;
+    while it is None nothing is measured.
+    """
+    histograms: Dict[str, Histogram]
+    actions: Dict[str, int]
+
+    def __init__(self) -> None:
+        self.histograms = {}
+        self.actions = {}
+
+    def record(self, name: str, ns: int):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(ns)
+
+    def record_action(self, action, ns: int):
+        """Count an action and record how long its state transition took
+        """
+        name = action.name
+        self.actions[name] = self.actions.get(name, 0) + 1
+        self.record("transition." + name, ns)
+
+    def merge(self, other: Self) -> Self:
+        for (name, histogram) in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+            else:
+                self.histograms[name] = Histogram().merge(histogram)
+        for (name, count) in other.actions.items():
+            self.actions[name] = self.actions.get(name, 0) + count
+        return self
+
+    def summary(self) -> Dict:
+        """The metrics as plain data, e.g. to be written out as JSON
+        """
+        return {
+            "actions": dict(self.actions),
+            "timings": {name: {"count": h.count, "total_ns": h.total_ns, "mean_ns": h.mean_ns,
+                               "p50_ns": h.quantile(0.5), "p99_ns": h.quantile(0.99),
+                               "max_ns": h.max_ns, "buckets": list(h.buckets)}
+                        for (name, h) in sorted(self.histograms.items())},
+        }
+
+    def show(self) -> str:
+        lines = ["| Actions: " + ", ".join(name + " " + str(count)
+                                          for (name, count) in sorted(self.actions.items()))]
+        for (name, h) in sorted(self.histograms.items()):
+            lines.append("| " + name.ljust(22) + "| Count: " + str(h.count).rjust(9)
+                         + "| Total ms: " + format(h.total_ns / 1e6, "10.2f")
+                         + "| Mean ns: " + format(h.mean_ns, "10.0f")
+                         + "| p50 ns <= " + str(h.quantile(0.5)).rjust(9)
+                         + "| p99 ns <= " + str(h.quantile(0.99)).rjust(9))
+        return "\n".join(lines)
@@ -1,3 +1,4 @@
+import itertools
 from enum import IntEnum
 
 class Action(IntEnum):
@@ -38,6 +39,20 @@ class Percept():
         self.reward = reward
         return
 
+    def to_bits(self) -> int:
+        """Pack the boolean parts of the percept (not the reward) into the low 6 bits
+        of an int: stench, breeze, glitter, bump, scream, is_terminated from bit 0 up
+        """
+        return self.stench | self.breeze << 1 | self.glitter << 2 | self.bump << 3 \
+            | self.scream << 4 | self.is_terminated << 5
+
+    @classmethod
+    def from_bits(cls, bits: int, reward: int = 0):
+        """The percept packed by `to_bits`, with the given reward
+        """
+        return cls(bool(bits & 1), bool(bits & 2), bool(bits & 4), bool(bits & 8),
+                   bool(bits & 16), bool(bits & 32), reward)
+
     def show(self) -> str:
         return "| Stench: " + str(self.stench) + "| Breeze: " + str(self.breeze) \
             + "| Glitter: " + str(self.glitter) + "| Bump: " + str(self.bump) \
@@ -46,19 +61,129 @@ class Percept():
 
 
 class Coords():
-    x: int = 0
-    y: int = 0
+    """An immutable grid position, usable as a set member or dict key
+    """
+    __slots__ = ('x', 'y', '_hash')
+    x: int
+    y: int
 
     def __init__(self, x: int, y: int):
-        self.x = x
-        self.y = y
+        _set_x(self, x)
+        _set_y(self, y)
+        _set_hash(self, hash((x, y)))
+
+    def __setattr__(self, name: str, value: object):
+        raise AttributeError("Coords is immutable")
 
     def __eq__(self, __o: object) -> bool:
+        if not isinstance(__o, Coords):
+            return NotImplemented
         return self.x == __o.x and self.y == __o.y
-    
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return (Coords, (self.x, self.y))
+
     def __str__(self) -> str:
         return "(x: " + str(self.x) + ", y: " + str(self.y) +")"
 
+    def __repr__(self) -> str:
+        return "Coords(" + str(self.x) + ", " + str(self.y) + ")"
+
+
+# Slot setters bypassing Coords.__setattr__, used only while constructing a Coords
+_set_x = Coords.x.__set__
+_set_y = Coords.y.__set__
+_set_hash = Coords._hash.__set__
+
+_versions = itertools.count()
+
+
+class CoordsList(list):
+    """A list of `Coords` that keeps a hash index of its members, so that
+    membership checks are O(1) instead of a linear scan of the list.
+
+    `version` changes on every modification (and is unique across lists), so
+    data derived from the list can be cached and cheaply checked for staleness.
+    """
+    __slots__ = ('_counts', 'version')
+
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self._counts = {}
+        for c in self:
+            self._counts[c] = self._counts.get(c, 0) + 1
+        self.version = next(_versions)
+
+    def __reduce__(self):
+        return (CoordsList, (list(self),))
+
+    def __contains__(self, c: object) -> bool:
+        return c in self._counts
+
+    def _added(self, c: Coords):
+        self._counts[c] = self._counts.get(c, 0) + 1
+        self.version = next(_versions)
+
+    def _removed(self, c: Coords):
+        count = self._counts[c] - 1
+        if count:
+            self._counts[c] = count
+        else:
+            del self._counts[c]
+        self.version = next(_versions)
+
+    def _reindex(self):
+        self._counts = {}
+        for c in self:
+            self._counts[c] = self._counts.get(c, 0) + 1
+        self.version = next(_versions)
+
+    def append(self, c: Coords):
+        super().append(c)
+        self._added(c)
+
+    def insert(self, i: int, c: Coords):
+        super().insert(i, c)
+        self._added(c)
+
+    def extend(self, iterable):
+        for c in iterable:
+            self.append(c)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def __imul__(self, n: int):
+        super().__imul__(n)
+        self._reindex()
+        return self
+
+    def remove(self, c: Coords):
+        super().remove(c)
+        self._removed(c)
+
+    def pop(self, i: int = -1) -> Coords:
+        c = super().pop(i)
+        self._removed(c)
+        return c
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, i, value):
+        super().__setitem__(i, value)
+        self._reindex()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._reindex()
+
+
 #########################
 # Orientation Classes
 #########################
@@ -75,12 +200,25 @@ class OrientationState(IntEnum):
     West = 3
 
 
+# Heading after turning left/right, and the move made by going forward,
+# indexed by `OrientationState` value
+TURN_LEFT = (3, 0, 1, 2)
+TURN_RIGHT = (1, 2, 3, 0)
+FORWARD_DX = (0, 1, 0, -1)
+FORWARD_DY = (1, 0, -1, 0)
+
+
 class Orientation:
     state = OrientationState.East
 
     def __init__(self, orientation: OrientationState) -> None:
         self.state = orientation
 
+    def __eq__(self, __o: object) -> bool:
+        if not isinstance(__o, Orientation):
+            return NotImplemented
+        return self.state == __o.state
+
     def turn(self, action: Action):
         if action == Action.TurnLeft:
             self.turn_left()
@@ -88,9 +226,7 @@ class Orientation:
             self.turn_right()
 
     def turn_left(self):
-        new_orientation_index = (self.state.value - 1) % 4
-        self.state = OrientationState(new_orientation_index)
+        self.state = OrientationState(TURN_LEFT[self.state])
 
     def turn_right(self):
-        new_orientation_index = (self.state.value + 1) % 4
-        self.state = OrientationState(new_orientation_index)
+        self.state = OrientationState(TURN_RIGHT[self.state])
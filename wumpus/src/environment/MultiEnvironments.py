@@ -0,0 +1,267 @@
+import random
+from bisect import bisect_left, bisect_right
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Self, Tuple
+from wumpus.src.environment.Agent import Agent
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.Misc import Action, Coords, OrientationState
+
+
+class LineIndex():
+    """A fixed set of cells indexed by row and by column, each row holding the sorted
+    x coordinates of its cells and each column the sorted y coordinates, so that
+    the first cell along a line from any location is found by bisection.
+    """
+    rows: Dict[int, List[int]]
+    columns: Dict[int, List[int]]
+
+    def __init__(self, locations: Iterable[Coords]) -> None:
+        self._cells = frozenset(locations)
+        self.rows = {}
+        self.columns = {}
+        for c in self._cells:
+            self.rows.setdefault(c.y, []).append(c.x)
+            self.columns.setdefault(c.x, []).append(c.y)
+        for line in self.rows.values():
+            line.sort()
+        for line in self.columns.values():
+            line.sort()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __iter__(self) -> Iterator[Coords]:
+        return iter(self._cells)
+
+    def __contains__(self, coords: Coords) -> bool:
+        return coords in self._cells
+
+    def first_along(self, location: Coords, heading: int,
+                    skip: FrozenSet[Coords] = frozenset()) -> Optional[Coords]:
+        """The nearest cell strictly ahead of `location` facing `heading`, passing
+        over the cells in `skip`, or None if there is none.
+
+        Finding the first cell is O(log n) in the cells of the line; each skipped
+        cell costs one more step.
+        """
+        (x, y) = (location.x, location.y)
+        if heading == OrientationState.East or heading == OrientationState.West:
+            line = self.rows.get(y)
+            if line is None:
+                return None
+            if heading == OrientationState.East:
+                candidates = range(bisect_right(line, x), len(line))
+            else:
+                candidates = range(bisect_left(line, x) - 1, -1, -1)
+            for i in candidates:
+                if Coords(line[i], y) not in skip:
+                    return Coords(line[i], y)
+            return None
+        line = self.columns.get(x)
+        if line is None:
+            return None
+        if heading == OrientationState.North:
+            candidates = range(bisect_right(line, y), len(line))
+        else:
+            candidates = range(bisect_left(line, y) - 1, -1, -1)
+        for i in candidates:
+            if Coords(x, line[i]) not in skip:
+                return Coords(x, line[i])
+        return None
+
+
+class MultiEnvironment(Environment):
+    """An `Environment` with any number of wumpuses and gold pieces.
+
+    Each wumpus fills the cells next to it with stench, dead or alive, as the
+    single wumpus does; the stench counts are built once, so sensing is O(1)
+    however many wumpuses there are. An arrow flies until it hits the first
+    living wumpus along the agent's facing, found through a `LineIndex`, and
+    kills only that one. Walking onto (or grabbing) a gold piece picks it up,
+    and climbing out at the origin carrying any gold scores as with one piece.
+
+    The wumpuses killed and the gold picked up are held as frozen sets replaced on
+    every change, so `clone` and `snapshot` stay O(1). `wumpus_location` and
+    `gold_location` give the first wumpus and the first gold piece left (or the
+    carried gold), so code written for one of each keeps working; the board is
+    drawn with those only.
+    """
+    _wumpuses: LineIndex
+    _golds: Tuple[Coords, ...]
+    killed: FrozenSet[Coords] = frozenset()
+    collected: FrozenSet[Coords] = frozenset()
+
+    @classmethod
+    def from_entities(cls, grid_width: int, grid_height: int, pit_locations: List[Coords],
+                      wumpus_locations: List[Coords], gold_locations: List[Coords],
+                      allow_climb_without_gold: bool = False, pit_prob: float = 0.2) -> Self:
+        """Build an environment with a given layout, with the agent at the origin facing East
+        """
+        e = cls.__new__(cls)
+        e.grid_width = grid_width
+        e.grid_height = grid_height
+        e.pit_prob = pit_prob
+        e.allow_climb_without_gold = allow_climb_without_gold
+        e.pit_locations = pit_locations
+        e.agent = Agent()
+        e.wumpus_locations = wumpus_locations
+        e.gold_locations = gold_locations
+        return e
+
+    def __init__(self, grid_width: int = 4, grid_height: int = 4,
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                 wumpus_count: int = 1, gold_count: int = 1,
+                 rng: Optional[random.Random] = None) -> None:
+        """Generate a random world, the wumpuses in distinct cells and the gold pieces
+        in distinct cells, all with x >= 1 and y >= 1
+
+        Args:
+            grid_width (int, optional): Defaults to 4.
+            grid_height (int, optional): Defaults to 4.
+            pit_prob (float, optional): probability of a pit in each cell but the origin. Defaults to 0.2.
+            allow_climb_without_gold (bool, optional): Defaults to False.
+            wumpus_count (int, optional): Defaults to 1.
+            gold_count (int, optional): Defaults to 1.
+            rng (random.Random, optional): the generator drawing the world. Defaults to None,
+                meaning the global `random` generator.
+        """
+        if rng is None:
+            rng = random
+        cells = [Coords(x, y) for y in range(1, grid_height) for x in range(1, grid_width)]
+        if not 1 <= wumpus_count <= len(cells) or not 1 <= gold_count <= len(cells):
+            raise ValueError("between 1 and " + str(len(cells))
+                             + " wumpuses and gold pieces fit on the grid")
+        self.grid_height = grid_height
+        self.grid_width = grid_width
+        self.pit_prob = pit_prob
+        self.allow_climb_without_gold = allow_climb_without_gold
+        self.pit_locations = [Coords(x, y) for x in range(grid_width) for y in range(grid_height)
+                              if (x != 0 or y != 0) and rng.random() < pit_prob]
+        self.agent = Agent()
+        self.wumpus_locations = rng.sample(cells, wumpus_count)
+        self.gold_locations = rng.sample(cells, gold_count)
+
+    @property
+    def wumpus_locations(self) -> List[Coords]:
+        """Every wumpus, dead or alive
+        """
+        return list(self._wumpus_list)
+
+    @wumpus_locations.setter
+    def wumpus_locations(self, wumpus_locations: List[Coords]):
+        self._wumpus_list = tuple(dict.fromkeys(wumpus_locations))
+        self._wumpuses = LineIndex(self._wumpus_list)
+        # the wumpuses never move, so the stench counts are built once
+        stench_map = bytearray(self.grid_width * self.grid_height)
+        for w in self._wumpus_list:
+            for c in self.adjacent_cells(w):
+                stench_map[c.y * self.grid_width + c.x] += 1
+        self._stench_map = stench_map
+        self.killed = frozenset()
+
+    @property
+    def wumpus_location(self) -> Coords:
+        return self._wumpus_list[0]
+
+    @wumpus_location.setter
+    def wumpus_location(self, wumpus_location: Coords):
+        self.wumpus_locations = [wumpus_location]
+
+    @property
+    def wumpus_alive(self) -> bool:
+        """True while any wumpus is alive
+        """
+        return len(self.killed) < len(self._wumpuses)
+
+    @property
+    def gold_locations(self) -> List[Coords]:
+        """The gold pieces not picked up yet
+        """
+        return [g for g in self._golds if g not in self.collected]
+
+    @gold_locations.setter
+    def gold_locations(self, gold_locations: List[Coords]):
+        self._golds = tuple(dict.fromkeys(gold_locations))
+        self._gold_cells = frozenset(self._golds)
+        self.collected = frozenset()
+
+    @property
+    def gold_location(self) -> Coords:
+        if self.agent.has_gold:
+            # carried gold moves with the agent
+            return self.agent.location
+        left = self.gold_locations
+        return left[0] if left else self._golds[0]
+
+    @gold_location.setter
+    def gold_location(self, gold_location: Coords):
+        self.gold_locations = [gold_location]
+
+    def is_wumpus_at(self, coords: Coords) -> bool:
+        return coords in self._wumpuses
+
+    def is_gold_at(self, coords: Coords) -> bool:
+        return coords in self._gold_cells and coords not in self.collected
+
+    def is_glitter(self) -> bool:
+        return self.agent.has_gold or self.is_gold_at(self.agent.location)
+
+    def wumpus_in_line_of_fire(self) -> bool:
+        return self.target() is not None
+
+    def target(self) -> Optional[Coords]:
+        """The first living wumpus along the agent's facing, if any
+        """
+        return self._wumpuses.first_along(self.agent.location, self.agent.heading,
+                                          self.killed)
+
+    def state_key(self) -> int:
+        """The key of `Environment.state_key` (its wumpus_alive bit set while any
+        wumpus is alive), followed by one bit per wumpus, set once killed, then one
+        bit per gold piece, set once picked up, in the order they were given
+        """
+        key = super().state_key()
+        shift = 7 + (self.grid_width * self.grid_height - 1).bit_length()
+        for w in self._wumpus_list:
+            key |= (w in self.killed) << shift
+            shift += 1
+        for g in self._golds:
+            key |= (g in self.collected) << shift
+            shift += 1
+        return key
+
+    def snapshot(self) -> Tuple:
+        return (self.agent, self.killed, self.collected, self.terminated)
+
+    def restore(self, snapshot: Tuple) -> None:
+        (self.agent, self.killed, self.collected, self.terminated) = snapshot
+
+    def transition(self, action: Action) -> Tuple[bool, bool, int]:
+        agent = self.agent
+        if action == Action.Forward:
+            new_location = agent.next_location(self.grid_width, self.grid_height)
+            death = (new_location in self._wumpuses and new_location not in self.killed) \
+                or self.is_pit_at(new_location)
+            # walking onto a gold piece picks it up
+            found = self.is_gold_at(new_location)
+            if found:
+                self.collected = self.collected | {new_location}
+            self.agent = Agent(new_location, agent.heading, agent.has_gold or found,
+                               agent.has_arrow, not death)
+            self.terminated = death
+            return (new_location == agent.location, False, -1001 if death else -1)
+        if action == Action.Grab:
+            glitter = self.is_glitter()
+            if self.is_gold_at(agent.location):
+                self.collected = self.collected | {agent.location}
+            self.agent = Agent(agent.location, agent.heading, glitter,
+                               agent.has_arrow, agent.is_alive)
+            return (False, False, -1)
+        if action == Action.Shoot:
+            had_arrow = agent.has_arrow
+            target = self.target() if had_arrow else None
+            if target is not None:
+                self.killed = self.killed | {target}
+            self.agent = Agent(agent.location, agent.heading, agent.has_gold, False,
+                               agent.is_alive)
+            return (False, target is not None, -11 if had_arrow else -1)
+        return super().transition(action)
@@ -0,0 +1,117 @@
+from typing import Iterable, Iterator, Optional, Self
+
+# Position of each symbol within a cell, which is 4 characters wide plus a "|"
+AGENT = 0
+PIT = 1
+GOLD = 2
+WUMPUS = 3
+CELL_WIDTH = 5
+
+
+class BoardRenderer():
+    """Renders environments of one grid size as text boards, as `Environment.visualize`.
+
+    The borders, labels and pits of a board are drawn once into a template. A
+    frame is a copy of the template with the agent, gold and wumpus written at
+    precomputed offsets, so it costs one buffer copy rather than a string built
+    cell by cell. The pit layer is only redrawn when the pits change.
+    """
+    grid_width: int
+    grid_height: int
+
+    _renderers = {}
+
+    def __init__(self, grid_width: int, grid_height: int) -> None:
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        label_width = max(2, len(str(grid_height)))
+        # each row: label, "|", then the cells
+        self._line = label_width + 1 + CELL_WIDTH * grid_width + 1
+        border = (" " * label_width + "-" * (CELL_WIDTH * grid_width + 1)).encode()
+        rows = []
+        for y in range(grid_height - 1, -1, -1):
+            rows.append((str(y + 1).zfill(label_width) + "|"
+                         + "    |" * grid_width).encode())
+        columns = "".join(str(x + 1).zfill(2).ljust(CELL_WIDTH) for x in range(grid_width))
+        self._blank = bytearray(b"\n".join([border] + rows + [border])
+                                + b"\n" + (" " * (label_width + 2) + columns.rstrip()).encode())
+        self._first_cell = self._line + label_width + 1
+        self._template = self._blank
+        self._pits = None
+        self._pits_version = None
+
+    @classmethod
+    def for_grid(cls, grid_width: int, grid_height: int) -> Self:
+        """A renderer shared by every environment of this grid size
+        """
+        key = (grid_width, grid_height)
+        if key not in cls._renderers:
+            cls._renderers[key] = cls(grid_width, grid_height)
+        return cls._renderers[key]
+
+    def offset(self, x: int, y: int) -> int:
+        """Position of the cell (x, y) in a frame
+        """
+        return self._first_cell + (self.grid_height - 1 - y) * self._line + CELL_WIDTH * x
+
+    def _draw_pits(self, pit_locations):
+        template = bytearray(self._blank)
+        for p in pit_locations:
+            if 0 <= p.x < self.grid_width and 0 <= p.y < self.grid_height:
+                template[self.offset(p.x, p.y) + PIT] = ord("P")
+        self._template = template
+        self._pits = pit_locations
+        self._pits_version = getattr(pit_locations, "version", None)
+
+    def frame(self, environment) -> bytearray:
+        """The board for `environment` as ASCII bytes
+        """
+        pits = environment.pit_locations
+        if pits is not self._pits or self._pits_version != getattr(pits, "version", None):
+            self._draw_pits(pits)
+        frame = bytearray(self._template)
+        width = self.grid_width
+        height = self.grid_height
+        for (location, position, symbol) in (
+                (environment.agent.location, AGENT, "A"),
+                (environment.gold_location, GOLD, "G"),
+                (environment.wumpus_location, WUMPUS, "W" if environment.wumpus_alive else "w")):
+            if 0 <= location.x < width and 0 <= location.y < height:
+                frame[self.offset(location.x, location.y) + position] = ord(symbol)
+        return frame
+
+    def render(self, environment) -> str:
+        return self.frame(environment).decode("ascii")
+
+
+def replay_frames(environment, actions: Iterable[Optional[int]],
+                  frame_skip: int = 1) -> Iterator[str]:
+    """Step a copy of `environment` through recorded actions and render every
+    `frame_skip`-th board, plus the last one. Skipped steps are not rendered at all.
+
+    Args:
+        environment (Environment): the world the actions were taken in, as it started
+        actions (Iterable[Optional[int]]): the actions, e.g. from `TrajectoryReader.episodes`.
+            None entries (the initial percept) are passed over.
+        frame_skip (int, optional): render one board out of this many steps. Defaults to 1.
+
+    Returns:
+        Iterator[str]: the boards, starting with the initial one
+    """
+    if frame_skip < 1:
+        raise ValueError("frame_skip must be at least 1")
+    environment = environment.clone()
+    renderer = BoardRenderer.for_grid(environment.grid_width, environment.grid_height)
+    yield renderer.render(environment)
+    step = 0
+    rendered = 0
+    for action in actions:
+        if action is None:
+            continue
+        environment.step(action)
+        step += 1
+        if step % frame_skip == 0:
+            rendered = step
+            yield renderer.render(environment)
+    if rendered != step:
+        yield renderer.render(environment)
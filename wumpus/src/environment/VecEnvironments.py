@@ -0,0 +1,214 @@
+import numpy as np
+from typing import List, Optional, Self, Tuple
+from wumpus.src.environment.Misc import Action
+from wumpus.src.environment.Environments import Environment
+
+# Columns of the percept arrays returned by `VecEnvironment`
+STENCH = 0
+BREEZE = 1
+GLITTER = 2
+BUMP = 3
+SCREAM = 4
+TERMINATED = 5
+PERCEPT_FIELDS = ("stench", "breeze", "glitter", "bump", "scream", "is_terminated")
+
+# Forward move per `OrientationState` (North, East, South, West)
+_DX = np.array([0, 1, 0, -1], dtype=np.int32)
+_DY = np.array([1, 0, -1, 0], dtype=np.int32)
+
+
+class VecEnvironment():
+    """A batch of independent environments of the same grid size, held in NumPy
+    arrays and stepped together. Each world follows the same rules (and rewards)
+    as `Environment.apply_action`.
+    """
+    num_envs: int
+    grid_width: int = 4
+    grid_height: int = 4
+    pit_prob: float = 0.2
+    allow_climb_without_gold: np.ndarray
+
+    def __init__(self, num_envs: int, grid_width: int = 4, grid_height: int = 4,
+                 pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                 seed: Optional[int] = None) -> None:
+        self.num_envs = num_envs
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pit_prob = pit_prob
+        self.rng = np.random.default_rng(seed)
+
+        n = num_envs
+        self.pits = np.zeros((n, grid_height, grid_width), dtype=bool)
+        self.breeze = np.zeros((n, grid_height, grid_width), dtype=bool)
+        self.wumpus_x = np.zeros(n, dtype=np.int32)
+        self.wumpus_y = np.zeros(n, dtype=np.int32)
+        self.gold_x = np.zeros(n, dtype=np.int32)
+        self.gold_y = np.zeros(n, dtype=np.int32)
+        self.agent_x = np.zeros(n, dtype=np.int32)
+        self.agent_y = np.zeros(n, dtype=np.int32)
+        self.heading = np.zeros(n, dtype=np.int32)
+        self.has_gold = np.zeros(n, dtype=bool)
+        self.has_arrow = np.zeros(n, dtype=bool)
+        self.is_alive = np.zeros(n, dtype=bool)
+        self.wumpus_alive = np.zeros(n, dtype=bool)
+        self.terminated = np.zeros(n, dtype=bool)
+        self.allow_climb_without_gold = np.full(n, allow_climb_without_gold, dtype=bool)
+        self._index = np.arange(n)
+        self.reset()
+
+    @classmethod
+    def from_environments(cls, environments: List[Environment]) -> Self:
+        """Build a batch holding the current state of each given environment
+
+        Args:
+            environments (List[Environment]): environments that all share one grid size
+
+        Returns:
+            VecEnvironment: the batched copy of the environments
+        """
+        first = environments[0]
+        v = cls(0, first.grid_width, first.grid_height, first.pit_prob)
+        n = len(environments)
+        v.num_envs = n
+        v._index = np.arange(n)
+        v.pits = np.zeros((n, v.grid_height, v.grid_width), dtype=bool)
+        for (i, e) in enumerate(environments):
+            if e.grid_width != v.grid_width or e.grid_height != v.grid_height:
+                raise ValueError("All environments in a batch must share a grid size")
+            for p in e.pit_locations:
+                if e.in_grid(p):
+                    v.pits[i, p.y, p.x] = True
+        v.wumpus_x = np.array([e.wumpus_location.x for e in environments], dtype=np.int32)
+        v.wumpus_y = np.array([e.wumpus_location.y for e in environments], dtype=np.int32)
+        v.gold_x = np.array([e.gold_location.x for e in environments], dtype=np.int32)
+        v.gold_y = np.array([e.gold_location.y for e in environments], dtype=np.int32)
+        v.agent_x = np.array([e.agent.location.x for e in environments], dtype=np.int32)
+        v.agent_y = np.array([e.agent.location.y for e in environments], dtype=np.int32)
+        v.heading = np.array([e.agent.heading for e in environments], dtype=np.int32)
+        v.has_gold = np.array([e.agent.has_gold for e in environments], dtype=bool)
+        v.has_arrow = np.array([e.agent.has_arrow for e in environments], dtype=bool)
+        v.is_alive = np.array([e.agent.is_alive for e in environments], dtype=bool)
+        v.wumpus_alive = np.array([e.wumpus_alive for e in environments], dtype=bool)
+        v.terminated = np.array([e.terminated for e in environments], dtype=bool)
+        v.allow_climb_without_gold = np.array([e.allow_climb_without_gold for e in environments],
+                                              dtype=bool)
+        v.breeze = v._breeze_from_pits(v.pits)
+        return v
+
+    @staticmethod
+    def _breeze_from_pits(pits: np.ndarray) -> np.ndarray:
+        breeze = np.zeros_like(pits)
+        breeze[:, 1:, :] |= pits[:, :-1, :]
+        breeze[:, :-1, :] |= pits[:, 1:, :]
+        breeze[:, :, 1:] |= pits[:, :, :-1]
+        breeze[:, :, :-1] |= pits[:, :, 1:]
+        return breeze
+
+    def reset(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Generate fresh worlds, either for the whole batch or only where `mask` is set
+
+        Args:
+            mask (np.ndarray, optional): boolean array selecting the worlds to regenerate.
+                Defaults to None, meaning every world.
+
+        Returns:
+            np.ndarray: the (num_envs, 6) percept array sensed in the current worlds
+        """
+        idx = self._index if mask is None else np.nonzero(mask)[0]
+        k = len(idx)
+        w, h = self.grid_width, self.grid_height
+        pits = self.rng.random((k, h, w)) < self.pit_prob
+        pits[:, 0, 0] = False
+        self.pits[idx] = pits
+        self.breeze[idx] = self._breeze_from_pits(pits)
+        self.wumpus_x[idx] = self.rng.integers(1, w, k)
+        self.wumpus_y[idx] = self.rng.integers(1, h, k)
+        self.gold_x[idx] = self.rng.integers(1, w, k)
+        self.gold_y[idx] = self.rng.integers(1, h, k)
+        self.agent_x[idx] = 0
+        self.agent_y[idx] = 0
+        self.heading[idx] = 1
+        self.has_gold[idx] = False
+        self.has_arrow[idx] = True
+        self.is_alive[idx] = True
+        self.wumpus_alive[idx] = True
+        self.terminated[idx] = False
+
+        percepts = np.zeros((self.num_envs, len(PERCEPT_FIELDS)), dtype=bool)
+        self._sense(percepts, ~self.terminated)
+        percepts[:, TERMINATED] = self.terminated
+        return percepts
+
+    def _sense(self, percepts: np.ndarray, live: np.ndarray):
+        ax, ay = self.agent_x, self.agent_y
+        percepts[:, STENCH] = live & (np.abs(ax - self.wumpus_x) + np.abs(ay - self.wumpus_y) == 1)
+        percepts[:, BREEZE] = live & self.breeze[self._index, ay, ax]
+        percepts[:, GLITTER] = live & (ax == self.gold_x) & (ay == self.gold_y)
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Apply one action in every world of the batch
+
+        Args:
+            actions (np.ndarray): one `Action` value per world
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: a (num_envs, 6) boolean percept array with
+            columns `PERCEPT_FIELDS`, and the (num_envs,) integer rewards
+        """
+        actions = np.asarray(actions)
+        live = ~self.terminated
+        rewards = np.where(live, -1, 0).astype(np.int32)
+        percepts = np.zeros((self.num_envs, len(PERCEPT_FIELDS)), dtype=bool)
+        ax, ay = self.agent_x, self.agent_y
+
+        forward = live & (actions == Action.Forward)
+        if forward.any():
+            nx = np.where(forward, np.clip(ax + _DX[self.heading], 0, self.grid_width - 1), ax)
+            ny = np.where(forward, np.clip(ay + _DY[self.heading], 0, self.grid_height - 1), ay)
+            percepts[:, BUMP] = forward & (nx == ax) & (ny == ay)
+            death = forward & (((nx == self.wumpus_x) & (ny == self.wumpus_y) & self.wumpus_alive)
+                               | self.pits[self._index, ny, nx])
+            ax[:] = nx
+            ay[:] = ny
+            self.is_alive &= ~death
+            self.has_gold |= forward & (nx == self.gold_x) & (ny == self.gold_y)
+            carried = forward & self.has_gold
+            self.gold_x[carried] = nx[carried]
+            self.gold_y[carried] = ny[carried]
+            self.terminated |= death
+            rewards[death] = -1001
+
+        turn_left = live & (actions == Action.TurnLeft)
+        turn_right = live & (actions == Action.TurnRight)
+        self.heading[turn_left] = (self.heading[turn_left] + 3) % 4
+        self.heading[turn_right] = (self.heading[turn_right] + 1) % 4
+
+        grab = live & (actions == Action.Grab)
+        if grab.any():
+            glitter = (ax == self.gold_x) & (ay == self.gold_y)
+            self.has_gold[grab] = glitter[grab]
+            # the gold is already at the agent's location whenever it is picked up
+
+        climb = live & (actions == Action.Climb)
+        if climb.any():
+            at_start = climb & (ax == 0) & (ay == 0)
+            success = at_start & self.has_gold
+            self.terminated |= success | (at_start & self.allow_climb_without_gold)
+            rewards[success] = 999
+
+        shoot = live & (actions == Action.Shoot)
+        if shoot.any():
+            wx, wy, heading = self.wumpus_x, self.wumpus_y, self.heading
+            in_line = ((heading == 0) & (ax == wx) & (ay < wy)) \
+                | ((heading == 1) & (ay == wy) & (ax < wx)) \
+                | ((heading == 2) & (ax == wx) & (ay > wy)) \
+                | ((heading == 3) & (ay == wy) & (ax > wx))
+            killed = shoot & self.has_arrow & self.wumpus_alive & in_line
+            rewards[shoot & self.has_arrow] = -11
+            self.has_arrow &= ~shoot
+            self.wumpus_alive &= ~killed
+            percepts[:, SCREAM] = killed
+
+        self._sense(percepts, live)
+        percepts[:, TERMINATED] = self.terminated
+        return (percepts, rewards)
@@ -0,0 +1,180 @@
+import mmap
+import random
+import struct
+from typing import Iterable, Iterator, List, Tuple
+from wumpus.src.environment.Environments import Environment
+from wumpus.src.environment.Misc import Coords
+
+# A world file is a header followed by fixed-size records, one per world:
+#   header: magic, format version, grid width, grid height, pit probability, world count
+#   record: wumpus x, wumpus y, gold x, gold y, flags, then the pit bitmap with
+#           bit (y * grid_width + x) set for a pit at (x, y)
+MAGIC = b"WMPW"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHfI")
+RECORD = struct.Struct("<HHHHB")
+FLAG_ALLOW_CLIMB_WITHOUT_GOLD = 1
+
+
+def bitmap_size(grid_width: int, grid_height: int) -> int:
+    return (grid_width * grid_height + 7) // 8
+
+
+def record_size(grid_width: int, grid_height: int) -> int:
+    return RECORD.size + bitmap_size(grid_width, grid_height)
+
+
+def pack_world(environment: Environment) -> bytes:
+    """Pack the layout of an environment (not the agent's state) into a record
+
+    Args:
+        environment (Environment): the world to pack
+
+    Returns:
+        bytes: the record, `record_size(grid_width, grid_height)` bytes long
+    """
+    width = environment.grid_width
+    pits = 0
+    for p in environment.pit_locations:
+        if environment.in_grid(p):
+            pits |= 1 << (p.y * width + p.x)
+    flags = FLAG_ALLOW_CLIMB_WITHOUT_GOLD if environment.allow_climb_without_gold else 0
+    return RECORD.pack(environment.wumpus_location.x, environment.wumpus_location.y,
+                       environment.gold_location.x, environment.gold_location.y, flags) \
+        + pits.to_bytes(bitmap_size(width, environment.grid_height), "little")
+
+
+def unpack_world(buffer, offset: int, grid_width: int, grid_height: int,
+                 pit_prob: float = 0.2) -> Environment:
+    """Build an environment from the record starting at `offset` in `buffer`
+
+    Args:
+        buffer: any object supporting the buffer protocol (bytes, memoryview, mmap, ...)
+        offset (int): position of the record in `buffer`
+        grid_width (int): width of the packed world
+        grid_height (int): height of the packed world
+        pit_prob (float, optional): pit probability the world was drawn with. Defaults to 0.2.
+
+    Returns:
+        Environment: a fresh environment with the packed layout
+    """
+    (wumpus_x, wumpus_y, gold_x, gold_y, flags) = RECORD.unpack_from(buffer, offset)
+    start = offset + RECORD.size
+    pits = int.from_bytes(buffer[start:start + bitmap_size(grid_width, grid_height)], "little")
+    pit_locations = []
+    while pits:
+        lowest = pits & -pits
+        i = lowest.bit_length() - 1
+        pit_locations.append(Coords(i % grid_width, i // grid_width))
+        pits ^= lowest
+    return Environment.from_layout(grid_width, grid_height, pit_locations,
+                                   Coords(wumpus_x, wumpus_y), Coords(gold_x, gold_y),
+                                   bool(flags & FLAG_ALLOW_CLIMB_WITHOUT_GOLD), pit_prob)
+
+
+def generate_worlds(count: int, grid_width: int = 4, grid_height: int = 4,
+                    pit_prob: float = 0.2, allow_climb_without_gold: bool = False,
+                    seed: int = 0) -> List[Environment]:
+    """Generate `count` worlds from a single seeded RNG, so the same seed always
+    gives the same worlds
+    """
+    rng = random.Random(seed)
+    return [Environment(grid_width, grid_height, pit_prob, allow_climb_without_gold, rng)
+            for _ in range(count)]
+
+
+def write_worlds(path: str, environments: Iterable[Environment]):
+    """Write worlds sharing one grid size to a world file
+
+    Args:
+        path (str): file to write
+        environments (Iterable[Environment]): the worlds, all with the same grid size
+    """
+    environments = list(environments)
+    if not environments:
+        raise ValueError("Cannot write an empty world file")
+    first = environments[0]
+    records = []
+    for e in environments:
+        if e.grid_width != first.grid_width or e.grid_height != first.grid_height:
+            raise ValueError("All worlds in a file must share a grid size")
+        records.append(pack_world(e))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, first.grid_width, first.grid_height,
+                            first.pit_prob, len(environments)))
+        f.write(b"".join(records))
+
+
+def read_header(buffer) -> Tuple[int, int, float, int]:
+    """Return `(grid_width, grid_height, pit_prob, count)` from a world file header
+    """
+    (magic, version, grid_width, grid_height, pit_prob, count) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version " + str(VERSION) + " world file")
+    # the probability is stored as a float32, so drop the digits it adds
+    return (grid_width, grid_height, round(pit_prob, 6), count)
+
+
+def read_worlds(path: str) -> List[Environment]:
+    """Read every world of a world file with a single read
+
+    Args:
+        path (str): file to read
+
+    Returns:
+        List[Environment]: the worlds, in the order they were written
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    (grid_width, grid_height, pit_prob, count) = read_header(data)
+    size = record_size(grid_width, grid_height)
+    return [unpack_world(data, HEADER.size + i * size, grid_width, grid_height, pit_prob)
+            for i in range(count)]
+
+
+class WorldCorpus():
+    """A read-only, memory-mapped world file. Worlds are decoded one at a time on
+    access, so opening a corpus costs nothing however many worlds it holds, and
+    processes opening the same file share its pages through the OS page cache.
+    """
+    path: str
+    grid_width: int
+    grid_height: int
+    pit_prob: float
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (self.grid_width, self.grid_height, self.pit_prob, self._count) = read_header(self._buffer)
+        self._record_size = record_size(self.grid_width, self.grid_height)
+        if len(self._buffer) < HEADER.size + self._count * self._record_size:
+            raise ValueError("World file " + path + " is truncated")
+
+    def __reduce__(self):
+        # reopen (and map) the file in the receiving process rather than pickling its content
+        return (WorldCorpus, (self.path,))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> Environment:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("world index out of range")
+        return unpack_world(self._buffer, HEADER.size + i * self._record_size,
+                            self.grid_width, self.grid_height, self.pit_prob)
+
+    def __iter__(self) -> Iterator[Environment]:
+        for i in range(self._count):
+            yield self[i]
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,12 +1,43 @@
 # from wumpus.src.environments import Environment
+import asyncio
+import contextlib
 import copy
+import io
+import os
+import pickle
+import random
+import tempfile
 import unittest
-from wumpus.src.agent.Agents import NaiveAgent
+import numpy as np
+from wumpus.src.agent.Agents import KnowledgeAgent, NaiveAgent, ProbabilisticAgent
+from wumpus.src.agent.Agents import create_agent
+from wumpus.src.agent.BatchAgents import AgentBatch, BatchAgent, NaiveBatchAgent
+from wumpus.src.agent.BatchAgents import batch_agent, run_batch
 from wumpus.src.environment.Misc import Action, OrientationState, Percept
+from wumpus.src.environment.Misc import CoordsList
 from wumpus.src.environment.Agent import Agent
 from wumpus.src.environment.Environments import Coords
 from wumpus.src.environment.Environments import Environment
 from wumpus.src.environment.Misc import Orientation
+from wumpus.src.environment.Worlds import generate_worlds, pack_world, unpack_world
+from wumpus.src.environment.Worlds import read_worlds, write_worlds, WorldCorpus
+from wumpus.src.environment.VecEnvironments import VecEnvironment, PERCEPT_FIELDS
+from wumpus.src.environment.LazyEnvironments import LazyEnvironment, PitChunks
+from wumpus.src.environment.MultiEnvironments import LineIndex, MultiEnvironment
+from wumpus.src.environment.GymEnvironments import GymEnvironment, DONE, REWARD
+from wumpus.src.environment.Rendering import BoardRenderer, replay_frames
+from wumpus.src.environment.Metrics import Histogram, Metrics
+from wumpus.src.agent.Knowledge import KnowledgeState
+from wumpus.src.agent.Search import TranspositionTable
+from wumpus.src.agent.Probability import PitProbabilities, PitSampler
+from wumpus.src.agent.Rollouts import BeliefSampler, RolloutEngine, choose, rollout_state
+from wumpus.src.agent.Planning import RoutePlanner
+from wumpus.src.WumpusWorld import Termination, WumpusWorld, run_episode
+from wumpus.src.Evaluation import EvaluationSummary, evaluate
+from wumpus.src.Trajectories import TrajectoryReader, TrajectoryWriter
+from wumpus.src import Benchmarks
+from wumpus.src.Tournament import HELLO, WELCOME, MESSAGE, TournamentServer, run_client
+from wumpus.src.ExactEvaluation import ExactEvaluator
 
 
 class TestEnvironment(unittest.TestCase):
@@ -24,6 +55,26 @@ class TestEnvironment(unittest.TestCase):
         d = Coords(2, 2)
         assert (c != d)
 
+    def test_coords_hashable_and_immutable(self):
+        cells = {Coords(1, 2), Coords(1, 2), Coords(2, 1)}
+        assert (len(cells) == 2)
+        assert ({Coords(1, 2): True}[Coords(1, 2)])
+        with self.assertRaises(AttributeError):
+            Coords(1, 2).x = 3
+
+    def test_coords_list_index(self):
+        pits = CoordsList([Coords(1, 1)])
+        pits.append(Coords(2, 2))
+        pits.append(Coords(2, 2))
+        assert (Coords(2, 2) in pits)
+        pits.remove(Coords(2, 2))
+        assert (Coords(2, 2) in pits)
+        pits.pop()
+        assert (Coords(2, 2) not in pits)
+        pits[0] = Coords(3, 3)
+        assert (Coords(1, 1) not in pits and Coords(3, 3) in pits)
+        assert (Coords(3, 3) in copy.deepcopy(pits))
+
     def test_environment_pit_locations(self):
         e = Environment()
         p1 = Coords(4, 2)
@@ -52,7 +103,7 @@ class TestEnvironment(unittest.TestCase):
     def test_environment_agent_location(self):
         e = Environment()
         e.agent = Agent()
-        e.agent.location = Coords(4, 2)
+        e.agent = e.agent.replace(location=Coords(4, 2))
 
         false_potential_loc = Coords(3, 3)
         true_potential_loc = Coords(4, 2)
@@ -63,9 +114,9 @@ class TestEnvironment(unittest.TestCase):
     def test_environment_glitter(self):
         e = Environment()
         e.gold_location = Coords(4, 2)
-        e.agent.location = Coords(4, 2)
+        e.agent = e.agent.replace(location=Coords(4, 2))
         assert (e.is_glitter() == True)
-        e.agent.location = Coords(4, 3)
+        e.agent = e.agent.replace(location=Coords(4, 3))
         assert (e.is_glitter() == False)
 
     def test_environment_gold_location(self):
@@ -79,27 +130,27 @@ class TestEnvironment(unittest.TestCase):
         
     def test_environment_terminated(self):
         e = Environment()
-        e.agent.location = e.wumpus_location
+        e.agent = e.agent.replace(location=e.wumpus_location)
         assert(e.agent.location == e.wumpus_location)
 
     def test_environment_kill_attempt_successful(self):
         e = Environment()
         e.wumpus_location = Coords(1,2)
-        e.agent.location = Coords(1, 1)
+        e.agent = e.agent.replace(location=Coords(1, 1))
         
         # in line of sight TRUE
-        e.agent.orientation.state = OrientationState.North
+        e.agent = e.agent.replace(orientation=OrientationState.North)
         assert(e.wumpus_in_line_of_fire())
         # not in line of sight FALSE
-        e.agent.orientation.state = OrientationState.South
+        e.agent = e.agent.replace(orientation=OrientationState.South)
         assert(e.wumpus_in_line_of_fire() == False)
         # no arrow - can't kill
-        e.agent.has_arrow = False
-        e.agent.orientation.state = OrientationState.North
+        e.agent = e.agent.replace(has_arrow=False)
+        e.agent = e.agent.replace(orientation=OrientationState.North)
         assert(e.kill_attempt_successful() == False)
         # arrow and in line of sight 
-        e.agent.has_arrow = True
-        e.agent.orientation.state = OrientationState.North
+        e.agent = e.agent.replace(has_arrow=True)
+        e.agent = e.agent.replace(orientation=OrientationState.North)
         assert(e.kill_attempt_successful())    
         
     def test_adjacent_cells(self):
@@ -142,32 +193,57 @@ class TestEnvironment(unittest.TestCase):
         
     def test_is_breeze(self):
         e = Environment()
-        e.agent.location = Coords(0, 0)
+        e.agent = e.agent.replace(location=Coords(0, 0))
 
         # add wumpus next to agent
         e.pit_locations = [Coords(1,0)]
         assert(e.is_breeze())
         
         # move agent
-        e.agent.location = Coords(3,2)
+        e.agent = e.agent.replace(location=Coords(3,2))
         assert(e.is_breeze() == False)  
 
+    def test_breeze_map_follows_pit_changes(self):
+        e = Environment(4, 4, 0, False)
+        e.agent = e.agent.replace(location=Coords(0, 0))
+        assert(e.is_breeze() == False)
+        e.pit_locations.append(Coords(0, 1))
+        assert(e.is_breeze())
+        assert(e.breeze_map()[1 * 4 + 1] == 1)
+        e.pit_locations.remove(Coords(0, 1))
+        assert(e.is_breeze() == False)
+
+    def test_clone_shares_breeze_map(self):
+        e = Environment.from_layout(4, 4, [Coords(2, 2)], Coords(3, 3), Coords(1, 2))
+        clone = e.clone()
+        assert(clone.breeze_map() is e.breeze_map())
+        assert(clone.clone().breeze_map() is e.breeze_map())
+
+    def test_stench_map_follows_wumpus(self):
+        e = Environment(4, 4, 0, False)
+        e.wumpus_location = Coords(2, 2)
+        assert(sum(e.stench_map()) == 4)
+        e.wumpus_location = Coords(3, 3)
+        assert(sum(e.stench_map()) == 2)
+        assert(e.is_wumpus_adjacent(Coords(2, 3)))
+        assert(e.is_wumpus_adjacent(Coords(2, 1)) == False)
+
     def test_is_stench(self):
         e = Environment()
-        e.agent.location = Coords(1, 2)
+        e.agent = e.agent.replace(location=Coords(1, 2))
 
         # add wumpus next to agent
         e.wumpus_location = Coords(1,3)
         assert(e.is_stench())
         
         # move agent
-        e.agent.location = Coords(3,2)
+        e.agent = e.agent.replace(location=Coords(3,2))
         assert(e.is_stench() == False)             
         
         
     def test_visualize(self):
         e = Environment()     
-        e.agent.location = Coords(0, 0)
+        e.agent = e.agent.replace(location=Coords(0, 0))
         e.gold_location = Coords(1,3)
         e.pit_locations = []
 
@@ -218,7 +294,7 @@ class TestOrientation(unittest.TestCase):
         e.agent = a
         
         new_env = copy.deepcopy(e)
-        a.is_alive = not a.is_alive
+        e.agent = a.replace(is_alive=not a.is_alive)
         assert(new_env.agent.is_alive != e.agent.is_alive)
 
 class TestAgent(unittest.TestCase):
@@ -230,13 +306,40 @@ class TestAgent(unittest.TestCase):
 
     def test_copy_agent(self):
         a = Agent()
-        a.orientation = Orientation(OrientationState.West)
-        a.has_arrow = True
+        a = a.replace(orientation=Orientation(OrientationState.West), has_arrow=True)
         
         b = copy.copy(a)
         assert(a.orientation == b.orientation)
-        a.orientation = Orientation(OrientationState.East)
+        a = a.replace(orientation=Orientation(OrientationState.East))
         assert(a.orientation != b.orientation)
+
+    def test_agent_is_immutable(self):
+        a = Agent()
+        with self.assertRaises(AttributeError):
+            a.has_gold = True
+        # the orientation is a plain state, so it cannot be turned in place
+        with self.assertRaises(AttributeError):
+            a.orientation.turn_left()
+        assert(a.orientation == OrientationState.East)
+
+    def test_agent_turn_and_forward(self):
+        a = Agent(Coords(1, 1), OrientationState.North)
+        left = a.turn(Action.TurnLeft)
+        assert(left.heading == OrientationState.West and a.heading == OrientationState.North)
+        assert(a.turn(Action.TurnRight).heading == OrientationState.East)
+        assert(a.forward(4, 4).location == Coords(1, 2))
+        assert(left.forward(4, 4).forward(4, 4).location == Coords(0, 1))
+        assert(a.location == Coords(1, 1))
+
+    def test_snapshots_are_not_aliased(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.wumpus_location = Coords(3, 3)
+        before = env.agent
+        (after, _) = env.apply_action(Action.TurnLeft)
+        (after, _) = after.apply_action(Action.Forward)
+        assert(env.agent is before)
+        assert(env.agent.heading == OrientationState.East)
+        assert(after.agent.location == Coords(0, 1))
         
         
 class TestWumpusWorld(unittest.TestCase):
@@ -282,5 +385,1065 @@ class TestWumpusWorld(unittest.TestCase):
         # print(next_percept.reward)
         assert(next_percept.reward == 999)
 
+    def test_run_episode_escapes_with_gold(self):
+        (initial_env, initial_percept) = Environment.initialize(4, 4, 0, False)
+        initial_env.agent = Agent()
+        initial_env.gold_location = Coords(1, 0)
+        initial_env.wumpus_location = Coords(3, 3)
+        agent = ScriptedAgent([Action.Forward, Action.TurnLeft, Action.TurnLeft,
+                               Action.Forward, Action.Climb])
+
+        result = run_episode(initial_env, agent, initial_percept)
+        assert(result.termination == Termination.Escaped)
+        assert(result.steps == 5)
+        assert(result.total_reward == 995)
+
+    def test_run_episode_dies(self):
+        (initial_env, initial_percept) = Environment.initialize(4, 4, 0, False)
+        initial_env.agent = Agent()
+        initial_env.wumpus_location = Coords(1, 0)
+        steps = []
+        result = run_episode(initial_env, ScriptedAgent([Action.Forward]), initial_percept,
+                             on_step=lambda step, action, env, percept: steps.append(step))
+        assert(result.termination == Termination.Died)
+        assert(result.total_reward == -1001)
+        assert(steps == [1])
+
+    def test_run_episode_long_episode_is_not_recursive(self):
+        (initial_env, initial_percept) = Environment.initialize(4, 4, 0, False)
+        agent = ScriptedAgent([Action.TurnLeft] * 5000)
+        result = run_episode(initial_env, agent, initial_percept, max_steps=5000)
+        assert(result.termination == Termination.StepLimit)
+        assert(result.steps == 5000)
+        assert(result.total_reward == -5000)
+
+
+class TestInPlaceStepping(unittest.TestCase):
+    """Class for testing `Environment.step` and snapshot/restore
+    """
+
+    def show_all(self, percepts):
+        return [p.show() for p in percepts]
+
+    def test_step_matches_apply_action(self):
+        for seed in range(20):
+            random.seed(seed)
+            (env, _) = Environment.initialize(4, 4, 0.2, False)
+            env.agent = Agent()
+            in_place = env.clone()
+            actions = [Action(random.randint(1, 6)) for _ in range(40)]
+
+            functional = []
+            for action in actions:
+                (env, percept) = env.apply_action(action)
+                functional.append(percept)
+            stepped = [in_place.step(action) for action in actions]
+            assert(self.show_all(functional) == self.show_all(stepped))
+
+    def test_apply_action_leaves_environment_untouched(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.agent = Agent()
+        (turned, _) = env.apply_action(Action.TurnLeft)
+        assert(env.agent.orientation == OrientationState.East)
+        assert(turned.agent.orientation == OrientationState.North)
+
+    def test_snapshot_restore_and_undo(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.agent = Agent()
+        env.wumpus_location = Coords(3, 3)
+        snapshot = env.snapshot()
+        env.enable_undo()
+        env.step(Action.Forward)
+        env.step(Action.TurnLeft)
+        env.step(Action.Shoot)
+        assert(env.agent.location == Coords(1, 0))
+        assert(env.agent.has_arrow == False)
+
+        env.undo()
+        assert(env.agent.has_arrow)
+        assert(env.agent.orientation == OrientationState.North)
+        env.restore(snapshot)
+        assert(env.agent.location == Coords(0, 0))
+        assert(env.agent.orientation == OrientationState.East)
+
+    def test_terminated_after_death(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.agent = Agent()
+        env.wumpus_location = Coords(1, 0)
+        percept = env.step(Action.Forward)
+        assert(percept.is_terminated and percept.reward == -1001)
+        percept = env.step(Action.TurnLeft)
+        assert(percept.is_terminated and percept.reward == 0)
+
+
+class TestVecEnvironment(unittest.TestCase):
+    """Class for testing `src.environment.VecEnvironments.VecEnvironment`
+    """
+
+    def test_matches_environment(self):
+        random.seed(3)
+        envs = []
+        for i in range(50):
+            e = Environment(5, 4, 0.2, i % 2 == 0)
+            e.agent = Agent()
+            envs.append(e)
+        vec = VecEnvironment.from_environments(envs)
+
+        for _ in range(60):
+            actions = [random.randint(1, 6) for _ in envs]
+            (percepts, rewards) = vec.step(actions)
+            for (i, e) in enumerate(envs):
+                p = e.step(Action(actions[i]))
+                assert([bool(b) for b in percepts[i]] == [getattr(p, f) for f in PERCEPT_FIELDS])
+                assert(rewards[i] == p.reward)
+
+    def test_reset_only_masked_worlds(self):
+        vec = VecEnvironment(8, 4, 4, 0.2, False, seed=0)
+        vec.step([1] * 8)
+        moved = vec.agent_x.copy()
+        mask = [True] + [False] * 7
+        vec.reset(mask)
+        assert(vec.agent_x[0] == 0)
+        assert((vec.agent_x[1:] == moved[1:]).all())
+
+
+class TestBatchAgents(unittest.TestCase):
+    """Class for testing `src.agent.BatchAgents`
+    """
+
+    def test_wrapped_agents_match_single_agents(self):
+        random.seed(4)
+        envs = [Environment(4, 4, 0.2, False) for _ in range(30)]
+        singles = [KnowledgeAgent(4, 4) for _ in envs]
+        vec = VecEnvironment.from_environments(envs)
+        batch = batch_agent(lambda: KnowledgeAgent(4, 4), len(envs))
+        assert(isinstance(batch, AgentBatch))
+        single_percepts = [e.initial_percept() for e in envs]
+        percepts = np.array([[getattr(p, f) for f in PERCEPT_FIELDS] for p in single_percepts])
+        rewards = np.zeros(len(envs), dtype=np.int32)
+        for _ in range(40):
+            actions = batch.next_actions(percepts, rewards)
+            (percepts, rewards) = vec.step(actions)
+            for (i, e) in enumerate(envs):
+                if e.terminated:
+                    continue
+                action = singles[i].next_action(single_percepts[i])
+                assert(actions[i] == action)
+                single_percepts[i] = e.step(action)
+                assert(rewards[i] == single_percepts[i].reward)
+
+    def test_naive_is_vectorized(self):
+        batch = batch_agent(NaiveAgent, 1000, seed=0)
+        assert(isinstance(batch, NaiveBatchAgent))
+        actions = batch.next_actions(np.zeros((1000, 6), dtype=bool), np.zeros(1000))
+        assert(sorted(set(actions.tolist())) == [int(a) for a in Action])
+        # a subclass deciding differently is wrapped instead
+        assert(isinstance(batch_agent(lambda: ScriptedAgent([]), 10), AgentBatch))
+        # the factory is only called for the agents actually used
+        created = []
+        batch_agent(lambda: created.append(1) or KnowledgeAgent(4, 4), 10)
+        assert(len(created) == 10)
+        with self.assertRaises(TypeError):
+            BatchAgent(10)
+
+    def test_run_batch(self):
+        vec = VecEnvironment(50, 4, 4, 0.2, False, seed=1)
+        (totals, steps) = run_batch(vec, batch_agent(NaiveAgent, 50, seed=1), max_steps=200)
+        assert(vec.terminated.all() or steps.max() == 200)
+        # every step costs at least 1, and only escaping with the gold scores
+        assert((totals <= 999 - steps + 1).all() and (totals >= -1001 - 11 - steps).all())
+        batch = batch_agent(lambda: create_agent("probabilistic"), 50)
+        (totals, steps) = run_batch(vec, batch, max_steps=200)
+        assert(totals.mean() > -1000)
+
+
+class TestEvaluation(unittest.TestCase):
+    """Class for testing `src.Evaluation`
+    """
+
+    def test_seeded_world_generation(self):
+        a = Environment(6, 6, 0.3, False, random.Random(5))
+        b = Environment(6, 6, 0.3, False, random.Random(5))
+        assert(list(a.pit_locations) == list(b.pit_locations))
+        assert(a.wumpus_location == b.wumpus_location)
+        assert(a.gold_location == b.gold_location)
+
+    def test_results_do_not_depend_on_workers(self):
+        serial = evaluate(200, seed=11, workers=1, chunk_size=50)
+        parallel = evaluate(200, seed=11, workers=2, chunk_size=50)
+        assert(serial.episodes == parallel.episodes == 200)
+        assert(serial.mean_reward == parallel.mean_reward)
+        assert(serial.reward_variance == parallel.reward_variance)
+        assert(serial.success_rate == parallel.success_rate)
+        assert(serial.successes + serial.deaths == 200)
+
+    def test_merge_matches_single_summary(self):
+        rewards = [-1001.0, 995.0, -1020.0, -1003.0, 990.0]
+        whole = EvaluationSummary()
+        left = EvaluationSummary()
+        right = EvaluationSummary()
+        for (i, r) in enumerate(rewards):
+            whole.add(r, 1, Termination.Died)
+            (left if i < 2 else right).add(r, 1, Termination.Died)
+        left.merge(right)
+        assert(abs(left.mean_reward - whole.mean_reward) < 1e-9)
+        assert(abs(left.reward_variance - whole.reward_variance) < 1e-6)
+
+
+class TestWorlds(unittest.TestCase):
+    """Class for testing `src.environment.Worlds`
+    """
+
+    def assert_same_layout(self, a: Environment, b: Environment):
+        assert(set(a.pit_locations) == set(b.pit_locations))
+        assert(a.wumpus_location == b.wumpus_location)
+        assert(a.gold_location == b.gold_location)
+        assert(a.allow_climb_without_gold == b.allow_climb_without_gold)
+
+    def test_generate_worlds_is_reproducible(self):
+        for (a, b) in zip(generate_worlds(20, 5, 5, 0.3, seed=9), generate_worlds(20, 5, 5, 0.3, seed=9)):
+            self.assert_same_layout(a, b)
+
+    def test_pack_round_trip(self):
+        e = Environment.from_layout(5, 3, [Coords(1, 1), Coords(4, 2)], Coords(2, 1), Coords(3, 2), True)
+        record = pack_world(e)
+        assert(len(record) == 9 + 2)
+        self.assert_same_layout(e, unpack_world(record, 0, 5, 3))
+
+    def test_write_and_read_worlds(self):
+        worlds = generate_worlds(100, 4, 4, 0.2, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "worlds.bin")
+            write_worlds(path, worlds)
+            loaded = read_worlds(path)
+        assert(len(loaded) == 100)
+        assert(loaded[0].pit_prob == 0.2)
+        for (a, b) in zip(worlds, loaded):
+            self.assert_same_layout(a, b)
+
+    def test_world_corpus_random_access(self):
+        worlds = generate_worlds(50, 6, 5, 0.2, seed=2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "corpus.bin")
+            write_worlds(path, worlds)
+            with WorldCorpus(path) as corpus:
+                assert(len(corpus) == 50)
+                self.assert_same_layout(corpus[17], worlds[17])
+                self.assert_same_layout(corpus[-1], worlds[49])
+                with self.assertRaises(IndexError):
+                    corpus[50]
+                reopened = pickle.loads(pickle.dumps(corpus))
+                self.assert_same_layout(reopened[3], worlds[3])
+                reopened.close()
+
+            serial = evaluate(120, seed=4, workers=1, chunk_size=40, corpus_path=path)
+            parallel = evaluate(120, seed=4, workers=2, chunk_size=40, corpus_path=path)
+            # a corpus rewritten at the same path is read afresh
+            write_worlds(path, generate_worlds(50, 4, 4, 0.5, False, seed=9))
+            rewritten = evaluate(120, seed=4, workers=1, chunk_size=40, corpus_path=path)
+            other = os.path.join(os.path.dirname(path), "other.bin")
+            write_worlds(other, generate_worlds(50, 4, 4, 0.5, False, seed=9))
+            fresh = evaluate(120, seed=4, workers=1, chunk_size=40, corpus_path=other)
+        assert(serial.mean_reward == parallel.mean_reward)
+        assert(rewritten.mean_reward == fresh.mean_reward)
+
+
+class TestStateKeys(unittest.TestCase):
+    """Class for testing packed state keys and `src.agent.Search.TranspositionTable`
+    """
+
+    def test_environment_state_key(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.wumpus_location = Coords(3, 3)
+        start = env.state_key()
+        for _ in range(4):
+            env.step(Action.TurnLeft)
+        assert(env.state_key() == start)
+        env.step(Action.Forward)
+        moved = env.state_key()
+        assert(moved != start)
+        env.step(Action.Shoot)
+        assert(env.state_key() not in (start, moved))
+
+    def test_knowledge_state_follows_environment(self):
+        (env, percept) = Environment.initialize(4, 4, 0, False)
+        env.wumpus_location = Coords(3, 3)
+        env.gold_location = Coords(2, 2)
+        knowledge = KnowledgeState(4, 4)
+        knowledge.observe(percept)
+        for action in [Action.Forward, Action.Forward, Action.Forward, Action.Forward,
+                       Action.TurnLeft, Action.Forward, Action.Shoot]:
+            knowledge.act(action)
+            knowledge.observe(env.step(action))
+        assert((knowledge.x, knowledge.y) == (env.agent.location.x, env.agent.location.y))
+        assert(knowledge.heading == env.agent.heading)
+        assert(knowledge.has_arrow == False)
+        assert(knowledge.visited == 0b10001111)
+        assert(knowledge.safe & knowledge.visited == knowledge.visited)
+
+    def test_knowledge_key_distinguishes_visited_cells(self):
+        a = KnowledgeState(4, 4)
+        b = KnowledgeState(4, 4)
+        quiet = Percept(False, False, False, False, False, False, 0)
+        a.observe(quiet)
+        b.observe(quiet)
+        assert(a.key() == b.key())
+        b.visited |= 1 << 5
+        assert(a.key() != b.key())
+
+    def test_transposition_table_evicts_least_recently_used(self):
+        table = TranspositionTable(2)
+        table.put(1, "a")
+        table.put(2, "b")
+        assert(table.get(1) == "a")
+        table.put(3, "c")
+        assert(2 not in table and 1 in table and 3 in table)
+        assert(table.get(2) is None)
+        assert((table.hits, table.misses, table.evictions) == (1, 1, 1))
+
+
+class TestKnowledgeAgent(unittest.TestCase):
+    """Class for testing `src.agent.Knowledge` inference and `src.agent.Agents.KnowledgeAgent`
+    """
+
+    def test_breeze_pins_down_pit(self):
+        # breeze at (1,0), none at (0,1): the pit can only be at (2,0)
+        knowledge = KnowledgeState(4, 4)
+        knowledge.observe(Percept(False, False, False, False, False, False, 0))
+        knowledge.act(Action.Forward)
+        knowledge.observe(Percept(False, True, False, False, False, False, -1))
+        assert(knowledge.pits == 0)
+        knowledge.act(Action.TurnLeft)
+        knowledge.observe(Percept(False, True, False, False, False, False, -1))
+        knowledge.act(Action.Forward)
+        knowledge.observe(Percept(False, False, False, False, False, False, -1))
+        assert(knowledge.location == knowledge.cell(1, 1))
+        assert(knowledge.pits == 1 << knowledge.cell(2, 0))
+        assert(knowledge.safe & (1 << knowledge.cell(2, 0)) == 0)
+
+    def test_stench_pins_down_wumpus(self):
+        # the wumpus is never in the first row or column, so a stench at (1,0) means (1,1)
+        knowledge = KnowledgeState(4, 4)
+        knowledge.observe(Percept(False, False, False, False, False, False, 0))
+        knowledge.act(Action.Forward)
+        knowledge.observe(Percept(True, False, False, False, False, False, -1))
+        assert(knowledge.wumpus_location == knowledge.cell(1, 1))
+        knowledge.act(Action.TurnLeft)
+        knowledge.observe(Percept(True, False, False, False, False, False, -1))
+        knowledge.act(Action.Shoot)
+        knowledge.observe(Percept(True, False, False, False, True, False, -11))
+        assert(not knowledge.wumpus_alive and knowledge.wumpus_location is None)
+        assert(knowledge.safe & (1 << knowledge.cell(1, 1)))
+
+    def test_agent_escapes_with_gold(self):
+        env = Environment.from_layout(6, 6, [Coords(3, 0), Coords(0, 4)], Coords(1, 3),
+                                      Coords(4, 4))
+        result = run_episode(env, KnowledgeAgent(6, 6), env.initial_percept(), max_steps=500)
+        assert(result.termination == Termination.Escaped)
+
+    def test_agent_never_dies_when_a_safe_path_exists(self):
+        # no pits: every cell can be proven safe, or the wumpus shot
+        rng = random.Random(11)
+        for _ in range(50):
+            (env, percept) = Environment.initialize(8, 8, 0, False, rng)
+            result = run_episode(env, KnowledgeAgent(8, 8), percept, max_steps=2000)
+            assert(result.termination == Termination.Escaped)
+
+
+class TestPitProbabilities(unittest.TestCase):
+    """Class for testing `src.agent.Probability.PitProbabilities`
+    """
+
+    def breezy_corner(self) -> KnowledgeState:
+        # visit (0,0), (1,0) and (0,1), feeling a breeze in both of the latter
+        knowledge = KnowledgeState(4, 4)
+        quiet = Percept(False, False, False, False, False, False, 0)
+        breeze = Percept(False, True, False, False, False, False, -1)
+        knowledge.observe(quiet)
+        for (action, percept) in [(Action.Forward, breeze), (Action.TurnLeft, breeze),
+                                  (Action.TurnLeft, breeze), (Action.Forward, quiet),
+                                  (Action.TurnRight, quiet), (Action.Forward, breeze)]:
+            knowledge.act(action)
+            knowledge.observe(percept)
+        return knowledge
+
+    def test_textbook_probabilities(self):
+        knowledge = self.breezy_corner()
+        probabilities = PitProbabilities(0.2).update(knowledge)
+        assert(set(probabilities) == {knowledge.cell(2, 0), knowledge.cell(1, 1),
+                                      knowledge.cell(0, 2)})
+        assert(abs(probabilities[knowledge.cell(1, 1)] - 0.86) < 0.01)
+        assert(abs(probabilities[knowledge.cell(2, 0)] - 0.31) < 0.01)
+        assert(abs(probabilities[knowledge.cell(0, 2)] - 0.31) < 0.01)
+
+    def test_components_are_cached(self):
+        # two breezes far apart form two components; changing one reuses the other
+        probabilities = PitProbabilities(0.2)
+        a = (1 << 1) | (1 << 2)
+        b = (1 << 20) | (1 << 21)
+        assert(len(probabilities.components([a, b])) == 2)
+        assert(len(probabilities.components([a, b, (1 << 2) | (1 << 20)])) == 1)
+        knowledge = KnowledgeState(8, 8)
+        knowledge.breezy = (1 << 9) | (1 << 54)
+        knowledge.no_pit = (1 << 9) | (1 << 54) | (1 << 1) | (1 << 8)
+        probabilities.update(knowledge)
+        assert(probabilities.cache.misses == 2)
+        knowledge.no_pit |= 1 << 10
+        probabilities.update(knowledge)
+        assert((probabilities.cache.hits, probabilities.cache.misses) == (1, 3))
+
+    def test_agent_avoids_likely_pit(self):
+        # (1,1) is far more likely a pit than (2,0) or (0,2)
+        agent = ProbabilisticAgent(4, 4)
+        agent.knowledge = self.breezy_corner()
+        risks = agent.risks()
+        assert(min(risks, key=risks.get) != agent.knowledge.cell(1, 1))
+        assert(agent.take_risk()[-1] == Action.Forward)
+
+
+class TestRoutePlanner(unittest.TestCase):
+    """Class for testing `src.agent.Planning.RoutePlanner`
+    """
+
+    def test_plan_counts_turns(self):
+        planner = RoutePlanner(4, 4)
+        every = (1 << 16) - 1
+        # facing East at (0,0), (3,0) is three moves away and (0,2) needs a turn too
+        (actions, cell, heading) = planner.plan(0, OrientationState.East, 1 << 3, every)
+        assert(actions == [Action.Forward] * 3 and cell == 3)
+        (actions, cell, heading) = planner.plan(0, OrientationState.East, 1 << 8, every)
+        assert(actions == [Action.TurnLeft, Action.Forward, Action.Forward])
+        assert((cell, heading) == (8, OrientationState.North))
+        assert(planner.plan(0, OrientationState.East, 0, every) is None)
+
+    def test_plan_only_crosses_safe_cells(self):
+        planner = RoutePlanner(4, 4)
+        # the goal (2,0) is unsafe and may be entered, but not crossed to reach (3,0)
+        safe = (1 << 0) | (1 << 1)
+        (actions, cell, _) = planner.plan(0, OrientationState.East, 1 << 2, safe)
+        assert(actions == [Action.Forward, Action.Forward] and cell == 2)
+        assert(planner.plan(0, OrientationState.East, 1 << 3, safe) is None)
+
+    def test_repaired_map_matches_rebuilt_map(self):
+        rng = random.Random(3)
+        planner = RoutePlanner(8, 8)
+        goal = 1 << 63
+        safe = 1
+        for _ in range(40):
+            safe |= 1 << rng.randrange(64)
+            repaired = planner.distances(goal, safe).costs
+            assert(repaired == RoutePlanner(8, 8).distances(goal, safe).costs)
+        assert(planner.repairs > 0 and planner.cache.hits > 0)
+
+    def test_repeated_goals_use_the_cache(self):
+        planner = RoutePlanner(4, 4)
+        every = (1 << 16) - 1
+        first = planner.plan(15, OrientationState.West, 1, every)
+        second = planner.plan(15, OrientationState.West, 1, every)
+        assert(first == second and len(planner.cache) == 1)
+
+
+class TestGymEnvironment(unittest.TestCase):
+    """Class for testing `src.environment.GymEnvironments.GymEnvironment`
+    """
+
+    def test_observations_match_percepts(self):
+        rng = random.Random(5)
+        gym = GymEnvironment(4, 4, 0.2, False, seed=9)
+        for _ in range(100):
+            (env, percept) = Environment.initialize(4, 4, 0.2, False, rng)
+            observation = gym.reset(environment=env)
+            assert(list(observation) == [percept.stench, percept.breeze, 0, 0, 0, 0, 0])
+            for _ in range(30):
+                action = rng.choice(list(Action))
+                percept = env.step(action)
+                observation = gym.step(action)
+                assert(list(observation) == [percept.stench, percept.breeze, percept.glitter,
+                                             percept.bump, percept.scream,
+                                             percept.is_terminated, percept.reward])
+
+    def test_writes_into_given_buffer(self):
+        buffers = np.zeros((2, 7), dtype=np.int32)
+        gym = GymEnvironment(4, 4, 0, False, seed=1, observation=buffers[1])
+        observation = gym.reset()
+        assert(gym.step(Action.Climb) is observation)
+        assert(buffers[1, REWARD] == -1 and buffers[1, DONE] == 0)
+        assert(not buffers[0].any())
+        self.assertRaises(ValueError, GymEnvironment, observation=[0, 0])
+
+    def test_reset_seed_reproduces_worlds(self):
+        gym = GymEnvironment(6, 6, 0.3, False)
+        gym.reset(seed=4)
+        first = gym.environment
+        gym.reset(seed=4)
+        assert(gym.environment.pit_locations == first.pit_locations)
+        assert(gym.environment.wumpus_location == first.wumpus_location)
+
+    def test_steps_lazy_environment(self):
+        rng = random.Random(2)
+        lazy = LazyEnvironment(500, 500, 0.2, False, seed=6, chunk_size=8, max_chunks=4)
+        env = lazy.clone()
+        gym = GymEnvironment(500, 500, 0.2, False)
+        gym.reset(environment=lazy)
+        for _ in range(100):
+            action = rng.choice([Action.Forward, Action.TurnLeft, Action.TurnRight])
+            percept = env.step(action)
+            observation = gym.step(action)
+            assert(list(observation[:5]) == [percept.stench, percept.breeze, percept.glitter,
+                                             percept.bump, percept.scream])
+
+
+class TestTrajectories(unittest.TestCase):
+    """Class for testing `src.Trajectories` recording and replay
+    """
+
+    def test_percept_bits_round_trip(self):
+        percept = Percept(True, False, True, False, True, False, -11)
+        assert(percept.to_bits() == 0b10101)
+        restored = Percept.from_bits(percept.to_bits(), percept.reward)
+        assert(restored.show() == percept.show())
+
+    def test_recorded_episodes_replay(self):
+        rng = random.Random(8)
+        expected = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trajectories.bin")
+            # a tiny chunk, so records are written out many times over
+            with TrajectoryWriter(path, chunk_records=3) as writer:
+                for world_id in range(20):
+                    (env, percept) = Environment.initialize(4, 4, 0.2, False, rng)
+                    steps = [(None, percept.show())]
+                    record = writer.recorder(world_id)
+
+                    def on_step(step, action, environment, percept):
+                        record(step, action, environment, percept)
+                        steps.append((action, percept.show()))
+                    writer.start_episode(world_id, percept)
+                    run_episode(env, NaiveAgent(rng), percept, max_steps=50, on_step=on_step)
+                    expected.append((world_id, steps))
+            replayed = [(world_id, list(zip(actions, [p.show() for p in percepts])))
+                        for (world_id, actions, percepts) in TrajectoryReader(path).episodes()]
+            assert(replayed == expected)
+            assert(len(list(TrajectoryReader(path))) == writer.records)
+
+    def test_evaluate_records_every_episode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run")
+            summary = evaluate(30, seed=2, workers=1, chunk_size=20, record_path=path)
+            episodes = list(TrajectoryReader(path + ".0").episodes()) \
+                + list(TrajectoryReader(path + ".20").episodes())
+            assert([e[0] for e in episodes] == list(range(30)))
+            assert(sum(len(e[1]) - 1 for e in episodes) == summary.total_steps)
+
+    def test_single_run_saves_its_world(self):
+        random.seed(13)
+        world = WumpusWorld(4, 4, 0.2, False)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "episode.bin")
+            with contextlib.redirect_stdout(io.StringIO()):
+                world.main(record=path)
+            [env] = read_worlds(path + ".worlds")
+            [(world_id, actions, percepts)] = list(TrajectoryReader(path).episodes())
+            assert(world_id == 0)
+            assert(percepts[0].show() == env.initial_percept().show())
+            for (action, percept) in zip(actions[1:], percepts[1:]):
+                assert(env.step(action).show() == percept.show())
+        self.assertRaises(ValueError, world.main, True, path)
+
+
+class TestRendering(unittest.TestCase):
+    """Class for testing `src.environment.Rendering`
+    """
+
+    def test_borders_scale_with_grid(self):
+        e = Environment.from_layout(6, 2, [Coords(5, 1)], Coords(2, 1), Coords(0, 1))
+        board = e.visualize()
+        assert(board == '  -------------------------------\n'
+                        '02|  G |    |   W|    |    | P  |\n'
+                        '01|A   |    |    |    |    |    |\n'
+                        '  -------------------------------\n'
+                        '    01   02   03   04   05   06')
+        lines = Environment.from_layout(3, 120, [], Coords(1, 1), Coords(2, 2)).visualize() \
+            .split("\n")
+        assert(lines[0] == "   " + "-" * 16 and lines[1].startswith("120|"))
+
+    def test_pit_layer_follows_pit_changes(self):
+        e = Environment.from_layout(4, 4, [Coords(3, 3)], Coords(1, 1), Coords(2, 2))
+        assert(e.visualize().split("\n")[1] == "04|    |    |    | P  |")
+        e.pit_locations.append(Coords(0, 3))
+        assert(e.visualize().split("\n")[1] == "04| P  |    |    | P  |")
+        e.pit_locations = []
+        assert(e.visualize().split("\n")[1] == "04|    |    |    |    |")
+
+    def test_replay_skips_frames(self):
+        e = Environment.from_layout(4, 4, [], Coords(3, 3), Coords(2, 0))
+        actions = [None] + [Action.Forward] * 5
+        frames = list(replay_frames(e, actions, frame_skip=2))
+        # initial board, after steps 2 and 4, then the last one
+        assert(len(frames) == 4)
+        renderer = BoardRenderer.for_grid(4, 4)
+        moved = e.clone()
+        for _ in range(5):
+            moved.step(Action.Forward)
+        assert(frames[-1] == renderer.render(moved) and frames[0] == e.visualize())
+        assert(e.agent.location == Coords(0, 0))
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Class for testing `src.Benchmarks`
+    """
+
+    def test_run_covers_every_case(self):
+        results = Benchmarks.run_benchmarks([4], [0.2], min_time=0.001, repeat=1)
+        names = {key.split("/")[0] for key in results["results"]}
+        assert(names == {"construct", "adjacent_cells", "is_breeze", "is_stench", "episode"}
+               | {"apply_action." + action.name for action in Action})
+        assert(all(value > 0 for value in results["results"].values()))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            Benchmarks.save(results, path)
+            assert(Benchmarks.load(path) == results)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"a": 100.0, "b": 100.0, "c": 100.0}}
+        results = {"results": {"a": 110.0, "b": 150.0, "d": 1.0}}
+        assert(Benchmarks.compare(results, baseline) == [("b", 1.5)])
+        assert(Benchmarks.compare(results, baseline, tolerance=0.05) == [("a", 1.1), ("b", 1.5)])
+
+
+class TestMetrics(unittest.TestCase):
+    """Class for testing `src.environment.Metrics` and the instrumented step loop
+    """
+
+    def test_histogram_buckets(self):
+        h = Histogram()
+        for ns in [1, 3, 3, 100, 5000]:
+            h.add(ns)
+        assert((h.buckets[1], h.buckets[2], h.buckets[7], h.buckets[13]) == (1, 2, 1, 1))
+        assert(h.quantile(0.5) == 4 and h.quantile(1.0) == 5000)
+        h.merge(h)
+        assert(h.count == 10 and h.total_ns == 2 * 5107 and h.max_ns == 5000)
+
+    def test_episode_metrics(self):
+        metrics = Metrics()
+        actions = [Action.TurnLeft, Action.Forward, Action.Shoot, Action.Climb,
+                   Action.TurnLeft, Action.TurnLeft, Action.Forward, Action.Climb]
+        (env, percept) = Environment.initialize(4, 4, 0, True)
+        result = run_episode(env, ScriptedAgent(actions), percept, metrics=metrics)
+        assert(metrics.actions == {"TurnLeft": 3, "Forward": 2, "Shoot": 1, "Climb": 2})
+        assert(metrics.histograms["decide"].count == result.steps == 8)
+        assert(metrics.histograms["percept"].count == 8)
+        assert(metrics.summary()["timings"]["transition.Forward"]["count"] == 2)
+        # stepped in place, the environment stops recording once the episode is over
+        (env, percept) = Environment.initialize(4, 4, 0, False)
+        run_episode(env, ScriptedAgent([Action.TurnLeft]), percept, max_steps=1,
+                    in_place=True, metrics=metrics)
+        assert(env.metrics is None)
+        env.step(Action.TurnLeft)
+        assert(metrics.actions["TurnLeft"] == 4)
+        # without metrics the environment is left alone
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.apply_action(Action.Forward)
+        assert(env.metrics is None)
+        env.metrics = metrics
+        env.apply_action(Action.Forward)
+        assert(metrics.histograms["copy"].count == 1 and metrics.actions["Forward"] == 3)
+
+    def test_evaluate_merges_metrics(self):
+        summary = evaluate(50, seed=1, workers=1, chunk_size=20, max_steps=30, profile=True)
+        assert(sum(summary.metrics.actions.values()) == summary.total_steps)
+        assert(summary.metrics.histograms["generate"].count == 50)
+        assert(evaluate(10, seed=1, workers=1).metrics is None)
+
+
+class TestActionSequences(unittest.TestCase):
+    """Class for testing `Environment.step_actions` and `Environment.apply_actions`
+    """
+
+    def test_matches_single_actions(self):
+        rng = random.Random(12)
+        for _ in range(200):
+            (env, _) = Environment.initialize(5, 5, 0.2, False, rng)
+            actions = [rng.choice(list(Action)) for _ in range(rng.randint(1, 20))]
+            result = env.apply_actions(actions, per_step=True)
+            current = env
+            percepts = []
+            for action in actions:
+                if current.terminated:
+                    break
+                (current, percept) = current.apply_action(action)
+                percepts.append(percept)
+            assert(result.steps == len(percepts))
+            assert(result.total_reward == sum(p.reward for p in percepts))
+            assert(list(result.percept_bits) == [p.to_bits() for p in percepts])
+            assert(list(result.rewards) == [p.reward for p in percepts])
+            assert(result.percept.show() == percepts[-1].show())
+            assert(result.environment.agent == current.agent)
+            assert(env.agent == Agent() and env is not result.environment)
+
+    def test_stops_at_death(self):
+        env = Environment.from_layout(4, 4, [Coords(2, 0)], Coords(3, 3), Coords(1, 2))
+        result = env.step_actions([Action.Forward] * 4 + [Action.Climb])
+        assert(result.environment is env and env.terminated)
+        assert((result.steps, result.total_reward) == (2, -1002))
+        assert(result.percept.is_terminated and result.percept_bits is None)
+        assert(env.step_actions([Action.Climb]).steps == 0)
+
+    def test_undo_log_sees_every_step(self):
+        (env, _) = Environment.initialize(4, 4, 0, False)
+        env.enable_undo()
+        env.step_actions([Action.TurnLeft, Action.Forward, Action.Forward])
+        for _ in range(3):
+            env.undo()
+        assert(env.agent == Agent())
+
+
+class TestTournament(unittest.TestCase):
+    """Class for testing `src.Tournament` sessions over a Unix socket
+    """
+
+    def run_sessions(self, server, clients):
+        """Serve on a temporary socket while the `clients` coroutines, each given the
+        socket path, run to completion
+        """
+        async def main(path):
+            listener = await server.start_unix(path)
+            try:
+                return await asyncio.gather(*[client(path) for client in clients])
+            finally:
+                listener.close()
+        with tempfile.TemporaryDirectory() as directory:
+            return asyncio.run(main(os.path.join(directory, "wumpus.sock")))
+
+    def test_sessions_play_the_same_worlds(self):
+        server = TournamentServer(episodes=8, seed=3)
+
+        def factory(w, h, p, allow):
+            return KnowledgeAgent(w, h, allow)
+        (first, second) = self.run_sessions(server, [
+            lambda path: run_client(factory, "knowledge", path),
+            lambda path: run_client(factory, "knowledge", path)])
+        assert(len(first) == 8)
+        assert(first == second)
+        summary = server.leaderboard.summaries["knowledge"]
+        assert(server.leaderboard.sessions["knowledge"] == 2)
+        assert(summary.episodes == 16)
+        assert(abs(summary.mean_reward - sum(first) / 8) < 1e-9)
+        assert(server.active_sessions == 0)
+
+    def test_bad_clients_are_dropped(self):
+        server = TournamentServer(episodes=2, seed=1, step_timeout=0.05)
+
+        async def send_action(path, action, delay=0.0):
+            (reader, writer) = await asyncio.open_unix_connection(path)
+            writer.write(HELLO.pack(3) + b"bad")
+            await reader.readexactly(WELCOME.size + MESSAGE.size)
+            await asyncio.sleep(delay)
+            writer.write(bytes((action,)))
+            await reader.read()
+            writer.close()
+        self.run_sessions(server, [
+            lambda path: send_action(path, 99),
+            lambda path: send_action(path, int(Action.Forward), delay=0.3)])
+        assert(server.leaderboard.errors["bad"] == 1)
+        assert(server.leaderboard.timeouts["bad"] == 1)
+        assert(server.leaderboard.summaries["bad"].episodes == 0)
+        assert(server.active_sessions == 0)
+
+
+class TestRollouts(unittest.TestCase):
+    """Class for testing `src.agent.Rollouts` belief sampling and rollouts
+    """
+
+    def test_pit_sampler_matches_probabilities(self):
+        knowledge = TestPitProbabilities.breezy_corner(self)
+        probabilities = PitProbabilities(0.2)
+        (component,) = probabilities.components(probabilities.constraints(knowledge))
+        sampler = PitSampler(component, 0.2)
+        rng = random.Random(0)
+        counts = {cell: 0 for cell in sampler.cells}
+        draws = 20000
+        for _ in range(draws):
+            pits = sampler.sample(rng)
+            # every breeze has its pit
+            assert(all(pits & constraint for constraint in component))
+            for cell in counts:
+                counts[cell] += pits >> cell & 1
+        for (cell, probability) in probabilities.solve(component).items():
+            assert(abs(counts[cell] / draws - probability) < 0.02)
+
+    def test_samples_match_percepts(self):
+        rng = random.Random(4)
+        for _ in range(20):
+            (env, percept) = Environment.initialize(5, 5, 0.2, False, rng)
+            agent = KnowledgeAgent(5, 5)
+            for _ in range(15):
+                percept = env.step(agent.next_action(percept))
+                if percept.is_terminated:
+                    break
+            k = agent.knowledge
+            k.observe(percept)
+            if percept.is_terminated:
+                continue
+            sampler = BeliefSampler(0.2)
+            sampler.prepare(k)
+            for _ in range(50):
+                (pits, wumpus, gold) = sampler.sample(rng)
+                assert(pits & k.no_pit == 0)
+                assert(pits & k.pits == k.pits)
+                for cell in range(25):
+                    if k.breezy >> cell & 1:
+                        assert(pits & k.neighbor_mask(cell))
+                assert(k.wumpus_candidates >> wumpus & 1 if k.wumpus_alive else wumpus == -1)
+                if k.has_gold:
+                    assert(gold == -1)
+                else:
+                    assert(not k.visited >> gold & 1 and gold % 5 >= 1 and gold // 5 >= 1)
+
+    def test_engine_matches_environment(self):
+        rng = random.Random(6)
+        engine = RolloutEngine(4, 4)
+        sampler = BeliefSampler(0.2)
+        knowledge = KnowledgeState(4, 4)
+        knowledge.observe(Percept(False, False, False, False, False, False, 0))
+        sampler.prepare(knowledge)
+        for _ in range(300):
+            layout = sampler.sample(rng)
+            (pits, wumpus, gold) = layout
+            env = Environment.from_layout(
+                4, 4, [Coords(cell % 4, cell // 4) for cell in range(16) if pits >> cell & 1],
+                Coords(wumpus % 4, wumpus // 4), Coords(gold % 4, gold // 4))
+            state = rollout_state(knowledge)
+            for _ in range(30):
+                action = Action(rng.randint(int(Action.Forward), int(Action.Climb)))
+                (state, reward, over) = engine.step(layout, state, action)
+                percept = env.step(action)
+                assert((reward, over) == (percept.reward, percept.is_terminated))
+                agent = env.agent
+                location = agent.location.y * 4 + agent.location.x
+                assert(state == (location * 4 + agent.heading, agent.has_gold,
+                                 agent.has_arrow, env.wumpus_alive))
+                if over:
+                    break
+
+    def test_missed_shot_rules_out_wumpus(self):
+        knowledge = KnowledgeState(4, 4)
+        knowledge.observe(Percept(False, False, False, False, False, False, 0))
+        knowledge.act(Action.Shoot)
+        knowledge.observe(Percept(False, False, False, False, False, False, -11))
+        assert(knowledge.wumpus_candidates & knowledge.line_of_fire() == 0)
+        assert(not knowledge.has_arrow and knowledge.wumpus_alive)
+
+    def test_rollouts_avoid_likely_pit(self):
+        knowledge = TestPitProbabilities.breezy_corner(self)
+        # facing North at (0,1): ahead is (0,2), to the right (1,1), likely a pit
+        assert(knowledge.location == knowledge.cell(0, 1))
+        assert(knowledge.heading == OrientationState.North)
+        options = [[Action.TurnRight, Action.Forward], [Action.Forward]]
+        (best, means) = choose(options, knowledge, BeliefSampler(0.2), RolloutEngine(4, 4),
+                               2000, random.Random(0))
+        assert(best == 1 and means[1] > means[0])
+
+    def test_agent_plays_episodes(self):
+        rng = random.Random(2)
+        for _ in range(10):
+            (env, percept) = Environment.initialize(4, 4, 0.2, False, rng)
+            agent = create_agent("montecarlo", 4, 4, 0.2, rng=random.Random(0))
+            result = run_episode(env, agent, percept, max_steps=200)
+            assert(result.steps <= 200)
+
+
+class TestLazyEnvironment(unittest.TestCase):
+    """Class for testing `src.environment.LazyEnvironments`
+    """
+
+    def test_chunks_are_redrawn_identically(self):
+        held = PitChunks(100, 70, 0.3, seed=5, chunk_size=16, capacity=2)
+        everything = PitChunks(100, 70, 0.3, seed=5, chunk_size=16, capacity=1000)
+        rng = random.Random(0)
+        for _ in range(2000):
+            (x, y) = (rng.randrange(100), rng.randrange(70))
+            assert(held.is_pit(x, y) == everything.is_pit(x, y))
+        assert(len(held) == 2 and held.evictions > 0)
+        assert(not everything.is_pit(0, 0))
+        # about pit_prob of the cells, edge chunks included
+        pits = sum(1 for _ in everything)
+        assert(abs(pits / (100 * 70 - 1) - 0.3) < 0.03)
+
+    def test_matches_eager_environment(self):
+        rng = random.Random(1)
+        for seed in range(20):
+            lazy = LazyEnvironment(7, 5, 0.2, False, seed, chunk_size=3, max_chunks=2)
+            eager = Environment.from_layout(7, 5, list(lazy.pit_locations),
+                                            lazy.wumpus_location, lazy.gold_location)
+            assert(lazy.initial_percept().show() == eager.initial_percept().show())
+            for _ in range(40):
+                action = Action(rng.randint(int(Action.Forward), int(Action.Climb)))
+                assert(lazy.step(action).show() == eager.step(action).show())
+            assert(lazy.visualize() == eager.visualize())
+
+    def test_huge_grid_holds_few_chunks(self):
+        env = LazyEnvironment(10000, 10000, 0.2, False, seed=3, max_chunks=4)
+        env.initial_percept()
+        env.agent = env.agent.replace(location=Coords(5000, 5000))
+        for _ in range(200):
+            env.step(Action.Forward)
+            if env.terminated:
+                break
+        assert(len(env.pit_locations) <= 4)
+        with self.assertRaises(ValueError):
+            env.breeze_map()
+
+    def test_evaluate_lazy(self):
+        summary = evaluate(20, 1000, 1000, seed=1, workers=1, max_steps=100, lazy=True)
+        assert(summary.episodes == 20)
+
+
+class TestMultiEnvironment(unittest.TestCase):
+    """Class for testing `src.environment.MultiEnvironments`
+    """
+
+    def test_line_index(self):
+        index = LineIndex([Coords(1, 2), Coords(4, 2), Coords(6, 2), Coords(4, 0), Coords(4, 5)])
+        assert(index.first_along(Coords(0, 2), OrientationState.East) == Coords(1, 2))
+        assert(index.first_along(Coords(4, 2), OrientationState.East) == Coords(6, 2))
+        assert(index.first_along(Coords(5, 2), OrientationState.West) == Coords(4, 2))
+        assert(index.first_along(Coords(1, 2), OrientationState.West) is None)
+        assert(index.first_along(Coords(4, 2), OrientationState.North) == Coords(4, 5))
+        assert(index.first_along(Coords(4, 2), OrientationState.South) == Coords(4, 0))
+        assert(index.first_along(Coords(3, 3), OrientationState.North) is None)
+        assert(index.first_along(Coords(0, 2), OrientationState.East,
+                                 frozenset([Coords(1, 2)])) == Coords(4, 2))
+
+    def test_matches_environment_with_one_of_each(self):
+        rng = random.Random(2)
+        for i in range(30):
+            single = Environment(5, 4, 0.2, i % 2 == 0, rng)
+            multi = MultiEnvironment.from_entities(5, 4, list(single.pit_locations),
+                                                   [single.wumpus_location],
+                                                   [single.gold_location], i % 2 == 0)
+            assert(multi.initial_percept().show() == single.initial_percept().show())
+            for _ in range(60):
+                action = Action(rng.randint(int(Action.Forward), int(Action.Climb)))
+                assert(multi.step(action).show() == single.step(action).show())
+                assert(multi.state_key() == single.state_key())
+                assert(multi.gold_location == single.gold_location)
+            assert(multi.visualize() == single.visualize())
+
+    def test_arrow_kills_first_wumpus(self):
+        wumpuses = [Coords(3, 0), Coords(2, 0), Coords(2, 2)]
+        env = MultiEnvironment.from_entities(4, 3, [], wumpuses, [Coords(1, 1)])
+        assert(not env.initial_percept().stench)
+        percept = env.step(Action.Shoot)
+        assert(percept.scream and percept.reward == -11)
+        assert(env.killed == frozenset([Coords(2, 0)]) and env.wumpus_alive)
+        # the dead wumpus still smells, the one behind it still kills
+        assert(env.step(Action.Forward).stench)
+        percept = env.step(Action.Forward)
+        assert(percept.stench and not percept.is_terminated)
+        assert(env.step(Action.Forward).is_terminated and not env.agent.is_alive)
+
+    def test_gold_pieces(self):
+        golds = [Coords(1, 0), Coords(2, 0)]
+        env = MultiEnvironment.from_entities(3, 2, [], [Coords(2, 1)], golds)
+        snapshot = env.snapshot()
+        key = env.state_key()
+        percept = env.step(Action.Forward)
+        assert(percept.glitter and env.agent.has_gold)
+        assert(env.gold_locations == [Coords(2, 0)])
+        clone = env.clone()
+        clone.step(Action.Forward)
+        assert(clone.gold_locations == [] and env.gold_locations == [Coords(2, 0)])
+        env.restore(snapshot)
+        assert(env.state_key() == key and len(env.gold_locations) == 2)
+
+    def test_evaluate_dense_worlds(self):
+        summary = evaluate(200, 8, 8, seed=3, workers=1, max_steps=200, wumpus_count=12,
+                           gold_count=5)
+        assert(summary.episodes == 200)
+        with self.assertRaises(ValueError):
+            MultiEnvironment(3, 3, 0.2, False, wumpus_count=5)
+
+
+class TestExactEvaluation(unittest.TestCase):
+    """Class for testing `src.ExactEvaluation`
+    """
+
+    @staticmethod
+    def worlds(grid_width, grid_height, pit_prob):
+        """Every world of a tiny grid with its probability"""
+        cells = [Coords(x, y) for y in range(grid_height) for x in range(grid_width)][1:]
+        placed = [Coords(x, y) for y in range(1, grid_height) for x in range(1, grid_width)]
+        for pits in range(1 << len(cells)):
+            chosen = [c for (i, c) in enumerate(cells) if pits >> i & 1]
+            p = pit_prob ** len(chosen) * (1 - pit_prob) ** (len(cells) - len(chosen))
+            for wumpus in placed:
+                for gold in placed:
+                    yield (p / len(placed) ** 2, chosen, wumpus, gold)
+
+    def test_agent_value_matches_every_world(self):
+        for (name, allow) in (("knowledge", False), ("probabilistic", True)):
+            expected = 0.0
+            for (p, pits, wumpus, gold) in self.worlds(3, 3, 0.3):
+                env = Environment.from_layout(3, 3, pits, wumpus, gold, allow, 0.3)
+                agent = create_agent(name, 3, 3, 0.3, allow)
+                result = run_episode(env, agent, env.initial_percept(), max_steps=30)
+                expected += p * result.total_reward
+            evaluator = ExactEvaluator(3, 3, 0.3, allow, horizon=30)
+            value = evaluator.agent_value(lambda: create_agent(name, 3, 3, 0.3, allow))
+            assert(abs(value - expected) < 1e-9)
+
+    def test_naive_value_matches_every_world(self):
+        def value(env, steps):
+            if steps == 0:
+                return 0.0
+            total = 0.0
+            for action in Action:
+                child = env.clone()
+                percept = child.step(action)
+                total += percept.reward
+                if not percept.is_terminated:
+                    total += value(child, steps - 1)
+            return total / len(Action)
+        expected = 0.0
+        for (p, pits, wumpus, gold) in self.worlds(2, 3, 0.2):
+            env = Environment.from_layout(2, 3, pits, wumpus, gold)
+            env.initial_percept()
+            expected += p * value(env, 4)
+        evaluator = ExactEvaluator(2, 3, 0.2, horizon=4)
+        assert(abs(evaluator.agent_value(NaiveAgent) - expected) < 1e-9)
+
+    def test_random_agents_are_refused(self):
+        evaluator = ExactEvaluator(3, 3, 0.2, horizon=10)
+        with self.assertRaises(ValueError):
+            evaluator.agent_value(lambda: create_agent("montecarlo", 3, 3, 0.2))
+
+    def test_optimal_value(self):
+        evaluator = ExactEvaluator(3, 3, 0.2, horizon=40)
+        optimal = evaluator.optimal_value()
+        for name in ("knowledge", "probabilistic"):
+            value = ExactEvaluator(3, 3, 0.2, horizon=40).agent_value(
+                lambda: create_agent(name, 3, 3, 0.2))
+            assert(value <= optimal + 1e-9)
+        bounded = ExactEvaluator(3, 3, 0.2, horizon=12)
+        value = bounded.agent_value(lambda: create_agent("knowledge", 3, 3, 0.2))
+        assert(value <= bounded.optimal_value(bounded=True) + 1e-9)
+        assert(abs(ExactEvaluator(4, 4, 0.2, horizon=8).optimal_value(bounded=True)
+                   - 32.454320987654) < 1e-6)
+
+
+class ScriptedAgent(NaiveAgent):
+    """An agent replaying a fixed list of actions, used for deterministic tests
+    """
+
+    def __init__(self, actions) -> None:
+        self.actions = list(actions)
+        self.index = 0
+
+    def next_action(self, percept: Percept) -> Action:
+        action = self.actions[self.index]
+        self.index += 1
+        return action
+
 if __name__ == '__main__':
     unittest.main()